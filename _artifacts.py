@@ -0,0 +1,157 @@
+# Copyright (c) 2022 https://github.com/ping/
+#
+# This software is released under the GNU General Public License v3.0
+# https://opensource.org/licenses/GPL-3.0
+
+# Content-addressed store for generated books, persisted in meta/ between runs
+# so that cached books can be restored locally instead of downloaded
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+artifacts_folder_name = "artifacts"
+default_max_store_size = 50 * 1024 * 1024  # bytes, uploaded with meta/ on every run
+hash_chunk_size = 1024 * 1024
+
+logger = logging.getLogger(__file__)
+
+
+def hash_file(file_path: Path) -> str:
+    """
+    sha256 hex digest of a file.
+
+    :param file_path:
+    :return:
+    """
+    digest = hashlib.sha256()
+    with file_path.open("rb") as f:
+        for chunk in iter(lambda: f.read(hash_chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _link_or_copy(source: Path, target: Path) -> None:
+    if target.exists():
+        target.unlink()
+    try:
+        os.link(source, target)
+    except OSError:
+        # e.g. different file systems
+        shutil.copyfile(source, target)
+
+
+class ArtifactStore:
+    """
+    Files keyed by their sha256 digest, evicted least recently used first
+    when the store exceeds max_size.
+    """
+
+    def __init__(self, folder: Path, max_size: int = default_max_store_size):
+        self.folder = folder
+        self.max_size = max_size
+        self.index_path = folder.joinpath("index.json")
+        self.objects: Dict[str, Dict] = {}  # digest: {"size": int, "last_used": float}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self) -> "ArtifactStore":
+        """
+        Load the store index, ignoring objects that are missing from the folder.
+
+        :return:
+        """
+        try:
+            with self.index_path.open("r", encoding="utf-8") as f:
+                objects = json.load(f)
+        except (OSError, ValueError):
+            objects = {}
+        self.objects = {
+            digest: info
+            for digest, info in objects.items()
+            if self._object_path(digest).exists()
+        }
+        return self
+
+    def save(self) -> None:
+        self.folder.mkdir(parents=True, exist_ok=True)
+        with self.index_path.open("w", encoding="utf-8") as f:
+            json.dump(self.objects, f, indent=0)
+
+    def _object_path(self, digest: str) -> Path:
+        return self.folder.joinpath(digest[:2], digest)
+
+    @property
+    def size(self) -> int:
+        return sum([info["size"] for info in self.objects.values()])
+
+    def add(self, file_path: Path, digest: Optional[str] = None) -> str:
+        """
+        Add a file to the store.
+
+        :param file_path:
+        :param digest: sha256 of the file if already known
+        :return: sha256 of the file
+        """
+        digest = digest or hash_file(file_path)
+        with self.lock:
+            if digest not in self.objects:
+                object_path = self._object_path(digest)
+                object_path.parent.mkdir(parents=True, exist_ok=True)
+                _link_or_copy(file_path, object_path)
+                self.objects[digest] = {"size": object_path.stat().st_size}
+            self.objects[digest]["last_used"] = time.time()
+        return digest
+
+    def restore(self, digest: str, target_path: Path) -> bool:
+        """
+        Restore a file from the store.
+
+        :param digest: sha256 of the file
+        :param target_path:
+        :return: True if restored
+        """
+        with self.lock:
+            info = self.objects.get(digest)
+        object_path = self._object_path(digest)
+        if not info or not object_path.exists():
+            self.misses += 1
+            return False
+        if hash_file(object_path) != digest:
+            # should not happen, unless the object was modified through a hardlink
+            logger.warning(f"Removing corrupted artifact {digest}")
+            with self.lock:
+                self.objects.pop(digest, None)
+            object_path.unlink()
+            self.misses += 1
+            return False
+        _link_or_copy(object_path, target_path)
+        with self.lock:
+            info["last_used"] = time.time()
+        self.hits += 1
+        return True
+
+    def evict(self) -> int:
+        """
+        Remove the least recently used objects until the store is within max_size.
+
+        :return: Number of objects removed
+        """
+        removed = 0
+        size = self.size
+        for digest, info in sorted(
+            self.objects.items(), key=lambda item: item[1].get("last_used", 0)
+        ):
+            if size <= self.max_size:
+                break
+            self._object_path(digest).unlink(missing_ok=True)
+            del self.objects[digest]
+            size -= info["size"]
+            removed += 1
+        return removed
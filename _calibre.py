@@ -0,0 +1,312 @@
+# Copyright (c) 2022 https://github.com/ping/
+#
+# This software is released under the GNU General Public License v3.0
+# https://opensource.org/licenses/GPL-3.0
+
+# Long-lived calibre worker to avoid paying calibre's startup cost for every
+# ebook-convert/ebook-meta invocation.
+#
+# The worker is this same file executed inside calibre with `calibre-debug -e`,
+# so it must only import from the standard library. Jobs and results are
+# exchanged as json lines over the worker's stdin/stdout.
+import json
+import os
+import queue
+import subprocess
+import sys
+import tempfile
+import threading
+import traceback
+from timeit import default_timer as timer
+from typing import IO, Dict, List, Optional
+
+# set calibre_worker=false in the environment to always launch calibre processes
+enabled = os.environ.get("calibre_worker", "true").strip().lower() != "false"
+worker_commands = ["ebook-convert", "ebook-meta"]
+worker_startup_timeout = 60  # seconds
+max_jobs_per_worker = 50  # restart the worker periodically to release memory
+
+
+class WorkerUnavailable(Exception):
+    pass
+
+
+class CalibreWorker:
+    """
+    Client for a calibre worker process. Jobs are executed one at a time.
+    """
+
+    def __init__(self, worker_cmd: Optional[List[str]] = None) -> None:
+        """
+        :param worker_cmd: Command that starts the worker process, e.g. in tests
+        """
+        self.worker_cmd = worker_cmd or [
+            "calibre-debug",
+            "-e",
+            os.path.abspath(__file__),
+        ]
+        self.proc: Optional[subprocess.Popen] = None
+        self.responses: queue.Queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.starts = 0  # number of worker processes started
+        self.jobs = 0  # jobs executed by the current process
+        self.startup_time = 0.0  # seconds taken to start the last worker process
+        self.startup_saved = 0.0  # seconds of startup avoided by reusing the worker
+
+    @staticmethod
+    def _read_responses(stdout: IO, responses: queue.Queue) -> None:
+        # each worker process has its own queue, so that a killed process
+        # cannot end the responses of the process that replaced it
+        try:
+            for line in stdout:
+                try:
+                    responses.put(json.loads(line))
+                except json.JSONDecodeError:
+                    # not a response, e.g. output from calibre-debug itself
+                    continue
+        except (OSError, ValueError):
+            # stdout closed when the worker was stopped
+            pass
+        responses.put(None)  # EOF, worker has exited
+
+    def _get_response(self, timeout: Optional[float]) -> Dict:
+        try:
+            response = self.responses.get(timeout=timeout)
+        except queue.Empty:
+            self.stop()
+            raise
+        if response is None:
+            self.stop()
+            raise WorkerUnavailable("calibre worker exited")
+        return response
+
+    def start(self) -> None:
+        start_time = timer()
+        self.responses = queue.Queue()
+        try:
+            self.proc = subprocess.Popen(
+                self.worker_cmd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                encoding="utf-8",
+            )
+        except OSError as err:
+            raise WorkerUnavailable(str(err)) from err
+        threading.Thread(
+            target=self._read_responses,
+            args=(self.proc.stdout, self.responses),
+            daemon=True,
+        ).start()
+        try:
+            self._get_response(worker_startup_timeout)
+        except queue.Empty as err:
+            raise WorkerUnavailable("calibre worker did not start") from err
+        self.starts += 1
+        self.jobs = 0
+        self.startup_time = timer() - start_time
+
+    def stop(self) -> None:
+        if not self.proc:
+            return
+        try:
+            self.proc.kill()
+            self.proc.wait()
+        except OSError:
+            pass
+        for pipe in (self.proc.stdin, self.proc.stdout):
+            try:
+                pipe.close()  # type: ignore[union-attr]
+            except (OSError, ValueError):
+                pass
+        self.proc = None
+
+    def execute(
+        self,
+        cmd: List[str],
+        timeout: Optional[float] = None,
+        env: Optional[Dict[str, str]] = None,
+    ) -> Dict:
+        """
+        Execute a calibre command in the worker.
+
+        :param cmd: ebook-convert/ebook-meta command line
+        :param timeout: in seconds, the worker is killed if exceeded
+        :param env: Environment for the command
+        :return: dict with the exit_code and output
+        """
+        with self.lock:
+            reused = bool(self.proc and self.proc.poll() is None)
+            if not reused:
+                self.start()
+            try:
+                self.proc.stdin.write(  # type: ignore[union-attr]
+                    json.dumps({"cmd": cmd, "env": env}) + "\n"
+                )
+                self.proc.stdin.flush()  # type: ignore[union-attr]
+            except (OSError, ValueError) as err:
+                self.stop()
+                raise WorkerUnavailable(str(err)) from err
+            try:
+                response = self._get_response(timeout)
+            except queue.Empty:
+                raise subprocess.TimeoutExpired(cmd, timeout or 0) from None
+            self.jobs += 1
+            if reused:
+                self.startup_saved += self.startup_time
+            if self.jobs >= max_jobs_per_worker:
+                self.stop()
+            return response
+
+
+_worker: Optional[CalibreWorker] = None
+
+
+def get_worker() -> CalibreWorker:
+    """
+    The calibre worker for the current process, created on first use.
+
+    :return:
+    """
+    global _worker
+    if _worker is None:
+        _worker = CalibreWorker()
+    return _worker
+
+
+def startup_saved() -> float:
+    """
+    Seconds of calibre startup avoided by the current process' worker. Every job
+    executed by an already running worker saves roughly the worker startup time.
+
+    :return:
+    """
+    return _worker.startup_saved if _worker else 0.0
+
+
+def _execute(
+    cmd: List[str],
+    timeout: Optional[float] = None,
+    env: Optional[Dict[str, str]] = None,
+) -> Optional[Dict]:
+    global enabled
+    if not (enabled and cmd[0] in worker_commands):
+        return None
+    try:
+        return get_worker().execute(cmd, timeout=timeout, env=env)
+    except WorkerUnavailable as err:
+        if not get_worker().starts:
+            # worker cannot be started, e.g. calibre-debug is not available
+            enabled = False
+        sys.stderr.write(f"calibre worker unavailable: {err}\n")
+        return None
+
+
+def call(
+    cmd: List[str],
+    timeout: Optional[float] = None,
+    stdout: Optional[IO] = None,
+    env: Optional[Dict[str, str]] = None,
+) -> int:
+    """
+    Drop-in for subprocess.call() for calibre commands. The command is executed
+    in the warm worker if possible, otherwise in a new process.
+
+    :param cmd:
+    :param timeout:
+    :param stdout: Stream for the command's stdout and stderr, output is discarded if None
+    :param env:
+    :return: exit code
+    """
+    response = _execute(cmd, timeout=timeout, env=env)
+    if response is None:
+        return subprocess.call(
+            cmd,
+            timeout=timeout,
+            stdout=stdout or subprocess.DEVNULL,
+            stderr=stdout,
+            env=env,
+        )
+    if stdout:
+        stdout.write(response["output"])
+    return response["exit_code"]
+
+
+def get_output(
+    cmd: List[str],
+    timeout: Optional[float] = None,
+    env: Optional[Dict[str, str]] = None,
+) -> str:
+    """
+    Output of a calibre command, regardless of its exit code.
+
+    :param cmd:
+    :param timeout:
+    :param env:
+    :return:
+    """
+    response = _execute(cmd, timeout=timeout, env=env)
+    if response is None:
+        return subprocess.run(
+            cmd, timeout=timeout, stdout=subprocess.PIPE, env=env, check=False
+        ).stdout.decode("utf-8")
+    return response["output"]
+
+
+def _serve() -> None:
+    """
+    Worker loop, executed inside calibre.
+
+    :return:
+    """
+    # keep the original stdout for responses and send any other output to stderr
+    channel = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    os.dup2(2, 1)
+
+    from calibre.ebooks.conversion.cli import main as convert_main  # type: ignore
+    from calibre.ebooks.metadata.cli import main as meta_main  # type: ignore
+
+    entry_points = {"ebook-convert": convert_main, "ebook-meta": meta_main}
+
+    channel.write(json.dumps({"ready": True}) + "\n")
+    channel.flush()
+    for line in sys.stdin:
+        job = json.loads(line)
+        cmd = job["cmd"]
+        original_env = dict(os.environ)
+        if job.get("env"):
+            os.environ.clear()
+            os.environ.update(job["env"])
+        with tempfile.TemporaryFile() as output:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            original_fds = os.dup(1), os.dup(2)
+            os.dup2(output.fileno(), 1)
+            os.dup2(output.fileno(), 2)
+            try:
+                exit_code = entry_points[cmd[0]](cmd) or 0
+            except SystemExit as err:
+                exit_code = (
+                    err.code if isinstance(err.code, int) else int(bool(err.code))
+                )
+            except Exception:  # noqa, pylint: disable=broad-except
+                traceback.print_exc()
+                exit_code = 1
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os.dup2(original_fds[0], 1)
+                os.dup2(original_fds[1], 2)
+                os.close(original_fds[0])
+                os.close(original_fds[1])
+                os.environ.clear()
+                os.environ.update(original_env)
+            output.seek(0)
+            output_text = output.read().decode("utf-8", errors="replace")
+        channel.write(
+            json.dumps({"exit_code": exit_code, "output": output_text}) + "\n"
+        )
+        channel.flush()
+
+
+if __name__ == "__main__":
+    _serve()
@@ -0,0 +1,506 @@
+# Copyright (c) 2022 https://github.com/ping/
+#
+# This software is released under the GNU General Public License v3.0
+# https://opensource.org/licenses/GPL-3.0
+
+# Read and write EPUB/MOBI metadata directly instead of through ebook-meta
+import io
+import os
+import posixpath
+import re
+import struct
+import zipfile
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+from urllib.parse import unquote
+from xml.dom import minidom
+
+from PIL import Image  # type: ignore
+
+OPF_NS = "http://www.idpf.org/2007/opf"
+DC_NS = "http://purl.org/dc/elements/1.1/"
+CONTAINER_NS = "urn:oasis:names:tc:opendocument:xmlns:container"
+
+# EXTH record types
+EXTH_PUBLISHER = 101
+EXTH_DESCRIPTION = 103
+EXTH_PUBLISHED = 106
+EXTH_COVER_OFFSET = 201
+EXTH_THUMB_OFFSET = 202
+EXTH_KF8_HEADER = 121
+EXTH_UPDATED_TITLE = 503
+
+mobi_thumbnail_size = (180, 240)
+
+
+class UnsupportedBook(Exception):
+    pass
+
+
+@dataclass
+class BookMetadata:
+    title: str = ""
+    published: Optional[datetime] = None
+    comments: str = ""
+    publisher: str = ""
+    series: str = ""
+    series_index: Optional[float] = None
+
+
+def _parse_date(value: str) -> Optional[datetime]:
+    """
+    Parse an ISO 8601 date as written by calibre into a UTC datetime.
+
+    :param value:
+    :return:
+    """
+    mobj = re.match(
+        r"(?P<dt>\d{4}-\d{2}-\d{2}(T\d{2}:\d{2}:\d{2})?)(\.\d+)?(?P<tz>Z|[+-]\d{2}:\d{2})?",
+        value.strip(),
+    )
+    if not mobj:
+        return None
+    dt = datetime.fromisoformat(
+        mobj.group("dt") + (mobj.group("tz") or "").replace("Z", "+00:00")
+    )
+    if not dt.tzinfo:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def _to_image_format(image: Union[Path, bytes], image_format: str, size=None) -> bytes:
+    with Image.open(io.BytesIO(image) if isinstance(image, bytes) else image) as source:
+        if isinstance(image, bytes) and source.format == image_format and not size:
+            # already encoded as required
+            return image
+        img: Image.Image = source
+        if image_format == "JPEG" and img.mode != "RGB":
+            img = img.convert("RGB")
+        if size:
+            img.thumbnail(size)
+        output = io.BytesIO()
+        img.save(output, format=image_format)
+        return output.getvalue()
+
+
+def _get_opf_path(book: zipfile.ZipFile) -> str:
+    container = minidom.parseString(book.read("META-INF/container.xml"))
+    rootfiles = container.getElementsByTagNameNS(CONTAINER_NS, "rootfile")
+    if not rootfiles:
+        raise UnsupportedBook("EPUB has no rootfile")
+    return rootfiles[0].getAttribute("full-path")
+
+
+def _text(element) -> str:
+    return "".join(
+        [n.data for n in element.childNodes if n.nodeType == n.TEXT_NODE]
+    ).strip()
+
+
+def _get_opf_meta(opf: minidom.Document, name: str) -> str:
+    for meta in opf.getElementsByTagNameNS(OPF_NS, "meta"):
+        if meta.getAttribute("name") == name:
+            return meta.getAttribute("content")
+    return ""
+
+
+def _read_opf(opf: minidom.Document) -> BookMetadata:
+    metadata = BookMetadata()
+    for tag, attr in [
+        ("title", "title"),
+        ("description", "comments"),
+        ("publisher", "publisher"),
+    ]:
+        elements = opf.getElementsByTagNameNS(DC_NS, tag)
+        if elements:
+            setattr(metadata, attr, _text(elements[0]))
+    for element in opf.getElementsByTagNameNS(DC_NS, "date"):
+        event = element.getAttributeNS(OPF_NS, "event") or element.getAttribute(
+            "opf:event"
+        )
+        if event in ("", "publication"):
+            metadata.published = _parse_date(_text(element))
+            break
+    metadata.series = _get_opf_meta(opf, "calibre:series")
+    series_index = _get_opf_meta(opf, "calibre:series_index")
+    for meta in opf.getElementsByTagNameNS(OPF_NS, "meta"):
+        # EPUB3
+        if meta.getAttribute("property") == "belongs-to-collection":
+            metadata.series = metadata.series or _text(meta)
+        elif meta.getAttribute("property") == "group-position":
+            series_index = series_index or _text(meta)
+    if series_index:
+        try:
+            metadata.series_index = float(series_index)
+        except ValueError:
+            pass
+    return metadata
+
+
+def _set_opf_element(
+    opf: minidom.Document, parent, namespace: str, tag: str, value: str
+) -> None:
+    elements = opf.getElementsByTagNameNS(namespace, tag)
+    if elements:
+        element = elements[0]
+        for child in list(element.childNodes):
+            element.removeChild(child)
+    else:
+        element = opf.createElementNS(namespace, f"dc:{tag}")
+        parent.appendChild(element)
+    element.appendChild(opf.createTextNode(value))
+
+
+def _set_opf_meta(opf: minidom.Document, parent, name: str, value: str) -> None:
+    for meta in opf.getElementsByTagNameNS(OPF_NS, "meta"):
+        if meta.getAttribute("name") == name:
+            meta.setAttribute("content", value)
+            return
+    meta = opf.createElementNS(
+        OPF_NS, f"{parent.prefix}:meta" if parent.prefix else "meta"
+    )
+    meta.setAttribute("name", name)
+    meta.setAttribute("content", value)
+    parent.appendChild(meta)
+
+
+def _get_opf_cover_item(opf: minidom.Document):
+    cover_id = _get_opf_meta(opf, "cover")
+    for item in opf.getElementsByTagNameNS(OPF_NS, "item"):
+        if (cover_id and item.getAttribute("id") == cover_id) or "cover-image" in (
+            item.getAttribute("properties") or ""
+        ).split():
+            return item
+    return None
+
+
+def _get_item_path(opf_path: str, item) -> str:
+    # manifest hrefs are relative to the OPF
+    return posixpath.normpath(
+        posixpath.join(posixpath.dirname(opf_path), unquote(item.getAttribute("href")))
+    )
+
+
+def _write_epub(
+    book_path: Path,
+    series: str,
+    series_index: float,
+    publisher: str,
+    cover: Union[Path, bytes, None],
+) -> None:
+    replacements: Dict[str, bytes] = {}
+    with zipfile.ZipFile(book_path) as book:
+        opf_path = _get_opf_path(book)
+        opf = minidom.parseString(book.read(opf_path))
+        metadata_elements = opf.getElementsByTagNameNS(OPF_NS, "metadata")
+        if not metadata_elements:
+            raise UnsupportedBook("OPF has no metadata")
+        parent = metadata_elements[0]
+        if publisher:
+            _set_opf_element(opf, parent, DC_NS, "publisher", publisher)
+        if series:
+            _set_opf_meta(opf, parent, "calibre:series", series)
+            _set_opf_meta(opf, parent, "calibre:series_index", f"{series_index}")
+        if cover:
+            cover_item = _get_opf_cover_item(opf)
+            if cover_item is None:
+                raise UnsupportedBook("EPUB has no cover to replace")
+            media_type = cover_item.getAttribute("media-type")
+            if media_type not in ("image/jpeg", "image/png"):
+                raise UnsupportedBook(f"Unsupported cover type: {media_type}")
+            replacements[_get_item_path(opf_path, cover_item)] = _to_image_format(
+                cover, "PNG" if media_type == "image/png" else "JPEG"
+            )
+        replacements[opf_path] = opf.toxml(encoding="utf-8")
+
+        # zip files cannot be updated in place, so copy the other entries as is
+        temp_book_path = book_path.with_name(f".{book_path.name}.tmp")
+        try:
+            with zipfile.ZipFile(temp_book_path, "w") as temp_book:
+                for info in book.infolist():
+                    temp_book.writestr(
+                        info,
+                        replacements.get(info.filename) or book.read(info),
+                        compress_type=info.compress_type,
+                    )
+        except:  # noqa, pylint: disable=bare-except
+            temp_book_path.unlink(missing_ok=True)
+            raise
+    os.replace(temp_book_path, book_path)
+
+
+def _read_sections(data: bytes) -> Tuple[bytes, List[int], bytes, List[bytes]]:
+    """
+    Split a PalmDB file into its sections.
+
+    :param data:
+    :return: header, section attributes, gap after the section list, sections
+    """
+    if len(data) < 78 or data[60:68] not in (b"BOOKMOBI", b"TEXtREAd"):
+        raise UnsupportedBook("Not a MOBI file")
+    count = struct.unpack_from(">H", data, 76)[0]
+    infos = [struct.unpack_from(">II", data, 78 + i * 8) for i in range(count)]
+    offsets = [offset for offset, _ in infos] + [len(data)]
+    return (
+        data[:78],
+        [attributes for _, attributes in infos],
+        data[78 + count * 8 : offsets[0]],
+        [data[offsets[i] : offsets[i + 1]] for i in range(count)],
+    )
+
+
+def _write_sections(
+    header: bytes, attributes: List[int], gap: bytes, sections: List[bytes]
+) -> bytes:
+    offset = len(header) + len(sections) * 8 + len(gap)
+    section_list = b""
+    for attribute, section in zip(attributes, sections):
+        section_list += struct.pack(">II", offset, attribute)
+        offset += len(section)
+    return header + section_list + gap + b"".join(sections)
+
+
+def _pad4(length: int) -> int:
+    return (4 - length % 4) % 4
+
+
+def _read_exth(record0: bytes) -> Tuple[int, int, List[Tuple[int, bytes]]]:
+    """
+    Read the EXTH header in a MOBI header record.
+
+    :param record0:
+    :return: EXTH offset, EXTH length, EXTH records
+    """
+    if record0[16:20] != b"MOBI":
+        raise UnsupportedBook("No MOBI header")
+    header_length, exth_flags = (
+        struct.unpack_from(">I", record0, 20)[0],
+        struct.unpack_from(">I", record0, 128)[0],
+    )
+    exth_offset = 16 + header_length
+    if not exth_flags & 0x40 or record0[exth_offset : exth_offset + 4] != b"EXTH":
+        raise UnsupportedBook("No EXTH header")
+    exth_length, count = struct.unpack_from(">II", record0, exth_offset + 4)
+    records = []
+    pos = exth_offset + 12
+    for _ in range(count):
+        record_type, record_length = struct.unpack_from(">II", record0, pos)
+        records.append((record_type, record0[pos + 8 : pos + record_length]))
+        pos += record_length
+    return exth_offset, exth_length, records
+
+
+def _write_exth(record0: bytes, records: List[Tuple[int, bytes]]) -> bytes:
+    exth_offset, exth_length, _ = _read_exth(record0)
+    exth = b"".join(
+        [struct.pack(">II", t, len(value) + 8) + value for t, value in records]
+    )
+    exth = struct.pack(">4sII", b"EXTH", len(exth) + 12, len(records)) + exth
+    exth += b"\0" * _pad4(len(exth))
+    old_exth_end = exth_offset + exth_length + _pad4(exth_length)
+    delta = len(exth) - (old_exth_end - exth_offset)
+    new_record0 = bytearray(record0[:exth_offset] + exth + record0[old_exth_end:])
+    full_name_offset = struct.unpack_from(">I", record0, 84)[0]
+    if full_name_offset >= exth_offset:
+        struct.pack_into(">I", new_record0, 84, full_name_offset + delta)
+    return bytes(new_record0)
+
+
+def _get_exth_value(records: List[Tuple[int, bytes]], record_type: int) -> bytes:
+    for t, value in records:
+        if t == record_type:
+            return value
+    return b""
+
+
+def _set_exth_value(
+    records: List[Tuple[int, bytes]], record_type: int, value: bytes
+) -> List[Tuple[int, bytes]]:
+    records = [(t, v) for t, v in records if t != record_type]
+    records.append((record_type, value))
+    return records
+
+
+def _get_encoding(record0: bytes) -> str:
+    return "cp1252" if struct.unpack_from(">I", record0, 28)[0] == 1252 else "utf-8"
+
+
+def _read_mobi(book_path: Path) -> BookMetadata:
+    with book_path.open("rb") as f:
+        _, _, _, sections = _read_sections(f.read())
+    record0 = sections[0]
+    encoding = _get_encoding(record0)
+    _, _, records = _read_exth(record0)
+
+    def _value(record_type: int) -> str:
+        return (
+            _get_exth_value(records, record_type)
+            .decode(encoding, errors="replace")
+            .strip()
+        )
+
+    full_name_offset, full_name_length = struct.unpack_from(">II", record0, 84)
+    published = _value(EXTH_PUBLISHED)
+    return BookMetadata(
+        title=_value(EXTH_UPDATED_TITLE)
+        or record0[full_name_offset : full_name_offset + full_name_length].decode(
+            encoding, errors="replace"
+        ),
+        published=_parse_date(published) if published else None,
+        comments=_value(EXTH_DESCRIPTION),
+        publisher=_value(EXTH_PUBLISHER),
+    )
+
+
+def _read_mobi_cover(book_path: Path) -> bytes:
+    with book_path.open("rb") as f:
+        _, _, _, sections = _read_sections(f.read())
+    _, _, records = _read_exth(sections[0])
+    value = _get_exth_value(records, EXTH_COVER_OFFSET)
+    if not value:
+        raise UnsupportedBook("MOBI has no cover")
+    index = (
+        struct.unpack_from(">I", sections[0], 108)[0] + struct.unpack(">I", value)[0]
+    )
+    if index >= len(sections):
+        raise UnsupportedBook("Invalid cover offset")
+    return sections[index]
+
+
+def _write_mobi(
+    book_path: Path, publisher: str, cover: Union[Path, bytes, None]
+) -> None:
+    with book_path.open("rb") as f:
+        header, attributes, gap, sections = _read_sections(f.read())
+    _, _, records = _read_exth(sections[0])
+
+    if cover:
+        first_image_index = struct.unpack_from(">I", sections[0], 108)[0]
+        for record_type, size in [
+            (EXTH_COVER_OFFSET, None),
+            (EXTH_THUMB_OFFSET, mobi_thumbnail_size),
+        ]:
+            value = _get_exth_value(records, record_type)
+            if not value:
+                if record_type == EXTH_COVER_OFFSET:
+                    raise UnsupportedBook("MOBI has no cover to replace")
+                continue
+            index = first_image_index + struct.unpack(">I", value)[0]
+            if index >= len(sections):
+                raise UnsupportedBook("Invalid cover offset")
+            sections[index] = _to_image_format(cover, "JPEG", size)
+
+    # joint MOBI/KF8 files have a second header for the KF8 part
+    header_indices = [0]
+    kf8_header = _get_exth_value(records, EXTH_KF8_HEADER)
+    if kf8_header:
+        kf8_index = struct.unpack(">I", kf8_header)[0]
+        if 0 < kf8_index < len(sections) and sections[kf8_index][16:20] == b"MOBI":
+            header_indices.append(kf8_index)
+    for index in header_indices:
+        if publisher:
+            encoding = _get_encoding(sections[index])
+            _, _, index_records = _read_exth(sections[index])
+            sections[index] = _write_exth(
+                sections[index],
+                _set_exth_value(
+                    index_records, EXTH_PUBLISHER, publisher.encode(encoding)
+                ),
+            )
+
+    temp_book_path = book_path.with_name(f".{book_path.name}.tmp")
+    with temp_book_path.open("wb") as f:
+        f.write(_write_sections(header, attributes, gap, sections))
+    os.replace(temp_book_path, book_path)
+
+
+def read_metadata(book_path: Path) -> BookMetadata:
+    """
+    Read the metadata of an EPUB or MOBI/AZW3 book.
+
+    :param book_path:
+    :return:
+    """
+    ext = book_path.suffix.lower()
+    if ext == ".epub":
+        with zipfile.ZipFile(book_path) as book:
+            return _read_opf(minidom.parseString(book.read(_get_opf_path(book))))
+    if ext in (".mobi", ".azw3"):
+        return _read_mobi(book_path)
+    raise UnsupportedBook(f"Unsupported format: {ext}")
+
+
+def read_cover(book_path: Path) -> bytes:
+    """
+    Read the encoded cover image of an EPUB or MOBI/AZW3 book.
+
+    :param book_path:
+    :return:
+    """
+    ext = book_path.suffix.lower()
+    if ext == ".epub":
+        with zipfile.ZipFile(book_path) as book:
+            opf_path = _get_opf_path(book)
+            cover_item = _get_opf_cover_item(minidom.parseString(book.read(opf_path)))
+            if cover_item is None:
+                raise UnsupportedBook("EPUB has no cover")
+            try:
+                return book.read(_get_item_path(opf_path, cover_item))
+            except KeyError as err:
+                raise UnsupportedBook("EPUB cover is missing") from err
+    if ext in (".mobi", ".azw3"):
+        return _read_mobi_cover(book_path)
+    raise UnsupportedBook(f"Unsupported format: {ext}")
+
+
+def write_metadata(
+    book_path: Path,
+    series: str = "",
+    series_index: float = 0,
+    publisher: str = "",
+    cover: Union[Path, bytes, None] = None,
+) -> None:
+    """
+    Update the cover, series and publisher of an EPUB or MOBI/AZW3 book in one pass.
+    MOBI has no series metadata so the series is ignored for MOBI books.
+
+    :param book_path:
+    :param series:
+    :param series_index:
+    :param publisher:
+    :param cover: Image file or encoded image to replace the existing cover with
+    :return:
+    """
+    ext = book_path.suffix.lower()
+    if ext == ".epub":
+        _write_epub(book_path, series, series_index, publisher, cover)
+    elif ext in (".mobi", ".azw3"):
+        _write_mobi(book_path, publisher, cover)
+    else:
+        raise UnsupportedBook(f"Unsupported format: {ext}")
+
+
+def parse_ebook_meta_output(output: str) -> BookMetadata:
+    """
+    Parse the output of the ebook-meta command, for formats not supported here.
+
+    :param output:
+    :return:
+    """
+    metadata = BookMetadata()
+    mobj = re.search(
+        r"Published\s+:\s(?P<pub_date>\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})", output
+    )
+    if mobj:
+        metadata.published = datetime.strptime(
+            mobj.group("pub_date"), "%Y-%m-%dT%H:%M:%S"
+        ).replace(tzinfo=timezone.utc)
+    mobj = re.search(r"Title\s+:\s(?P<title>.+)", output)
+    if mobj:
+        metadata.title = mobj.group("title")
+    mobj = re.search(r"Comments\s+:\s(?P<comments>.+)", output, re.DOTALL)
+    if mobj:
+        metadata.comments = mobj.group("comments")
+    return metadata
@@ -4,29 +4,60 @@
 # https://opensource.org/licenses/GPL-3.0
 
 import argparse
+import dataclasses
+import io
 import json
 import logging
 import os
 import re
-import shutil
 import subprocess
 import sys
+import tempfile
 import time
 from collections import namedtuple
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
 from datetime import datetime, timedelta, timezone
-from functools import cmp_to_key
+from functools import cmp_to_key, partial
 from math import ceil
 from pathlib import Path
 from timeit import default_timer as timer
-from typing import Dict, List, Optional
+from typing import IO, Callable, Dict, List, Optional, Tuple
 from urllib.parse import urlencode, urljoin
 from xml.dom import minidom
 
 import humanize  # type: ignore
 import requests  # type: ignore
 from bleach import linkify
-
+from PIL import Image  # type: ignore
+
+import _calibre
+import _http
+from _artifacts import ArtifactStore, artifacts_folder_name, hash_file
+from _ebook_meta import (
+    UnsupportedBook,
+    parse_ebook_meta_output,
+    read_cover,
+    read_metadata,
+    write_metadata,
+)
+from _history import RecipeHistory, RecipeStats, history_filename
+from _http import HttpClient, RequestMetric
+from _index import BookRecord, read_index, write_index
 from _opds import extension_contenttype_map, init_feed, simple_tag
+from _planner import (
+    PlannedRecipe,
+    RunPlan,
+    adaptive_timeout,
+    format_plan,
+    min_recipe_timeout,
+    plan_run,
+)
 from _recipe_utils import Recipe, is_windows, sort_category
 from _recipes import (
     categories_sort as default_categories_sort,
@@ -36,7 +67,20 @@ from _recipes_custom import (
     categories_sort as custom_categories_sort,
     recipes as custom_recipes,
 )
-from _utils import generate_cover, slugify
+from _utils import (
+    ArticleImageCache,
+    CoverCache,
+    ImageVariant,
+    LogoCache,
+    RecipeResponseCache,
+    article_image_cache_folder_name,
+    cover_cache_folder_name,
+    get_cover_renderer,
+    init_cover_renderer,
+    logo_cache_folder_name,
+    save_site_cover,
+    slugify,
+)
 
 logger = logging.getLogger(__file__)
 ch = logging.StreamHandler(sys.stdout)
@@ -46,16 +90,106 @@ logger.setLevel(logging.INFO)
 
 publish_folder = Path("public")
 meta_folder = Path("meta")
+# not in meta/ since that is uploaded as an artifact, and cached pages can be
+# subscriber-only or personalised
+response_cache_folder = Path("cache", "responses")
 job_log_filename = "job_log.json"
 catalog_path = "catalog.xml"
 index_json_filename = "index.json"
+dry_run_fetch_timeout = 3  # seconds, for fetching index.json in a dry run
 lunr_docs_json_filename = "lunr_docs.json"
-default_retry_wait_interval = 2
+max_conversion_workers = (
+    os.cpu_count() or 1
+)  # max number of ebook-convert format conversions executed concurrently
+max_workers_per_group = (
+    1  # max number of recipes from the same publisher executed concurrently
+)
+retry_timeout_growth = 1.1  # recipe timeout is increased by 10% on each retry
+max_retry_timeout = 20 * 60  # seconds, retries do not increase the timeout beyond this
+max_cache_workers = 8  # max number of recipes restored from cache concurrently
+download_chunk_size = 64 * 1024
+regression_trend_threshold = 1.5  # flag recipes that are this much slower than before
+
+
+class IncompleteDownload(Exception):
+    pass
+
 
 RecipeOutput = namedtuple(
     "RecipeOutput",
     ["recipe", "title", "file", "rename_to", "published_dt", "description", "articles"],
 )
+RecipeFetchResult = namedtuple(
+    "RecipeFetchResult",
+    [
+        "recipe",
+        "status",
+        "duration",
+        "source_file",
+        "exit_code",
+        "last_run",
+        "log_output",
+        "recipe_exit_code",  # ebook-convert exit code, None if not executed or timed out
+        "timed_out",
+        "retries",
+        "cache_hit",
+        "attempt_durations",  # seconds, of each execution attempt
+    ],
+)
+RecipeProcessJob = namedtuple(
+    "RecipeProcessJob",
+    [
+        "slug",
+        "name",
+        "src_ext",
+        "target_ext",
+        "timeout",
+        "overwrite_cover",
+        "cover_options",
+        "conv_options",
+        "source_file",
+        "publish_site",
+        "today",
+        "env",
+        "verbose_mode",
+    ],
+)
+RecipeProcessResult = namedtuple(
+    "RecipeProcessResult",
+    [
+        "title",
+        "published_dt",
+        "series_index",
+        "description",
+        "comments",
+        "file",
+        "rename_to",
+        "duration",
+        "log_output",
+        "calibre_startup_saved",  # seconds of calibre startup saved by the worker
+        "http_metrics",  # requests made by the process, e.g. for the cover logo
+        "cover_cache_hit",  # None if no cover was rendered
+    ],
+)
+RecipeConversionJob = namedtuple(
+    "RecipeConversionJob",
+    [
+        "slug",
+        "name",
+        "ext",
+        "source_file",
+        "series_index",
+        "timeout",
+        "conv_options",
+        "publish_site",
+        "env",
+        "verbose_mode",
+    ],
+)
+RecipeConversionResult = namedtuple(
+    "RecipeConversionResult",
+    ["ext", "file", "exit_code", "duration", "log_output", "calibre_startup_saved"],
+)
 
 # sort categories for display
 # Ignoring mypy error below because of https://github.com/python/mypy/issues/9372
@@ -95,24 +229,46 @@ def _get_env_accounts_info() -> Dict:
 
 
 # fetch index.json from published site
-def _fetch_cache(site, cache_sess: requests.Session) -> Dict:
-    retry_attempts = 1
-    timeout = 15
-    for attempt in range(1 + retry_attempts):
-        res = cache_sess.get(urljoin(site, index_json_filename), timeout=timeout)
+def _fetch_cache(site, http_client: HttpClient) -> Dict[str, List[BookRecord]]:
+    try:
+        res = http_client.get(urljoin(site, index_json_filename), retry_attempts=1)
+        return read_index(res.json())
+    except (requests.exceptions.HTTPError, ValueError) as err:
+        logger.exception(f"{err.__class__.__name__} fetching {index_json_filename}")
+    return {}
+
+
+def _load_plan_cache(
+    index_path: Path, publish_site: Optional[str] = None
+) -> Dict[str, List[BookRecord]]:
+    """
+    index.json for a dry run, from a local copy if there is one, e.g. from the
+    previous build, else fetched from the published site with a short timeout
+    and no retries so that the dry run does not wait on the network.
+
+    :param index_path:
+    :param publish_site:
+    :return:
+    """
+    if index_path.exists():
         try:
-            res.raise_for_status()
-            return res.json()
-        except Exception as err:  # noqa, pylint: disable=broad-except
-            if attempt < retry_attempts:
-                logger.warning(
-                    f"{err.__class__.__name__} downloading {index_json_filename}"
-                    f"Retrying after {default_retry_wait_interval}s..."
-                )
-                timeout += 15
-                time.sleep(default_retry_wait_interval)
-                continue
-            logger.exception(f"{err.__class__.__name__} fetching {index_json_filename}")
+            with index_path.open("r", encoding="utf-8") as f:
+                return read_index(json.load(f))
+        except (OSError, ValueError) as err:
+            logger.warning(f"Unable to load {index_path}: {err}")
+    if publish_site:
+        try:
+            res = _get_http_client().get(
+                urljoin(publish_site, index_json_filename),
+                retry_attempts=0,
+                timeout=dry_run_fetch_timeout,
+            )
+            return read_index(res.json())
+        except (requests.exceptions.RequestException, ValueError) as err:
+            logger.warning(
+                f"{err.__class__.__name__} fetching {index_json_filename}: {err}"
+            )
+    logger.warning("No index.json, recipes are planned as if nothing is cached")
     return {}
 
 
@@ -125,6 +281,30 @@ def _add_recipe_summary(
     return f"| {rec.name} | {status} | {duration_str} |\n"
 
 
+def _add_conversion_summary(
+    rec: Recipe, conversion_result: RecipeConversionResult
+) -> str:
+    status = "" if conversion_result.file else " :x:"
+    return (
+        f"| {rec.name}{status} | {conversion_result.ext} | "
+        f"{humanize.precisedelta(conversion_result.duration)} |\n"
+    )
+
+
+def _add_stats_summary(recipe: Recipe, stats: RecipeStats) -> str:
+    if not stats.p50:
+        return ""
+    trend = ""
+    if stats.trend:
+        trend = f"{stats.trend - 1:+.0%}"
+        if stats.trend >= regression_trend_threshold:
+            trend = f":warning: {trend}"
+    return (
+        f"| {recipe.name} | {humanize.precisedelta(timedelta(seconds=stats.p50))} | "
+        f"{humanize.precisedelta(timedelta(seconds=stats.p95 or stats.p50))} | {trend} |\n"
+    )
+
+
 def _write_opds(generated_output: Dict, recipe_covers: Dict, publish_site: str) -> None:
     """
     Generate minimal OPDS
@@ -280,7 +460,7 @@ def _find_output(folder_path: Path, slug: str, ext: str) -> List[Path]:
     return [r for r in res if slug_match_re.match(r.name)]
 
 
-def _get_cached_files(recipe: Recipe, cached: Dict):
+def _get_cached_files(recipe: Recipe, cached: Dict) -> List[BookRecord]:
     """
     Get the list of cached files for a recipe
 
@@ -292,71 +472,246 @@ def _get_cached_files(recipe: Recipe, cached: Dict):
     return cached.get(recipe.slug, []) or cached.get(recipe.name, [])
 
 
+def _get_http_client() -> HttpClient:
+    """
+    HTTP client for the build, with a connection pool sized for concurrent restores
+    and the timeouts by host set in the http_timeouts env.
+
+    :return:
+    """
+    http_client = HttpClient(
+        host_timeouts=_http.get_env_host_timeouts(), pool_size=max_cache_workers
+    )
+    _http.set_client(http_client)
+    return http_client
+
+
 def _download_from_cache(
-    recipe: Recipe, cached: Dict, publish_site: str, cache_sess: requests.Session
+    recipe: Recipe,
+    cached: Dict,
+    publish_site: str,
+    http_client: HttpClient,
+    log: logging.Logger = logger,
+    store: Optional[ArtifactStore] = None,
 ) -> bool:
     """
     Download a recipe output from the published site
     :param recipe:
     :param cached:
     :param publish_site:
-    :param cache_sess:
+    :param http_client:
+    :param log:
+    :param store: Artifact store to restore from before downloading
     :return:
     """
     abort = False
     cached_files = _get_cached_files(recipe, cached)
     for cached_item in cached_files:
-        ext = Path(cached_item["filename"]).suffix
+        ext = Path(cached_item.filename).suffix
         if ext != f".{recipe.src_ext}" and ext not in [
             f".{x}" for x in recipe.target_ext
         ]:
             continue
 
-        ebook_url = urljoin(publish_site, cached_item["filename"])
-        try:
-            # see if this fixes the ReadTimeout for large files, e.g. WSJ-print
-            cache_sess.head(ebook_url, timeout=5)
-        except (
-            requests.exceptions.ReadTimeout,
-            requests.exceptions.HTTPError,  # it happens
-            requests.exceptions.ConnectionError,  # e.g. Connection aborted.
-        ) as head_err:  # noqa
-            logger.warning(
-                f"{head_err.__class__.__name__} sending HEAD request for {ebook_url}"
+        if (
+            store
+            and cached_item.sha256
+            and store.restore(
+                cached_item.sha256, publish_folder.joinpath(cached_item.filename)
             )
-            time.sleep(default_retry_wait_interval)
+        ):
+            log.debug(f'Restored "{cached_item.filename}" from the artifact store')
+            continue
 
-        timeout = 30
+        ebook_url = urljoin(publish_site, cached_item.filename)
+        timeout = http_client.timeout_for(ebook_url)
         for attempt in range(1 + recipe.retry_attempts):
             try:
-                logger.debug(f'Downloading "{ebook_url}"...')
-                ebook_res = cache_sess.get(ebook_url, timeout=timeout, stream=True)
-                ebook_res.raise_for_status()
-                with publish_folder.joinpath(cached_item["filename"]).open("wb") as f:
-                    shutil.copyfileobj(ebook_res.raw, f)
+                log.debug(f'Downloading "{ebook_url}"...')
+                _download_file(
+                    http_client,
+                    ebook_url,
+                    publish_folder.joinpath(cached_item.filename),
+                    cached_item,
+                    timeout,
+                )
                 abort = False
                 break
             except (
                 requests.exceptions.ReadTimeout,
                 requests.exceptions.HTTPError,  # it happens
                 requests.exceptions.ConnectionError,  # e.g. Connection aborted.
+                requests.exceptions.ChunkedEncodingError,  # e.g. connection broken
+                IncompleteDownload,
             ) as err:
                 if attempt < recipe.retry_attempts:
-                    logger.warning(
+                    wait_interval = http_client.wait_interval(attempt)
+                    log.warning(
                         f"{err.__class__.__name__} downloading {ebook_url}. "
-                        f"Retrying after {default_retry_wait_interval}s..."
+                        f"Retrying after {wait_interval:.1f}s..."
                     )
                     timeout += 30
-                    time.sleep(default_retry_wait_interval)
+                    time.sleep(wait_interval)
                     continue
-                logger.error(f"[!] {err.__class__.__name__} for {ebook_url}")
+                log.error(f"[!] {err.__class__.__name__} for {ebook_url}")
+                _get_part_file_path(
+                    publish_folder.joinpath(cached_item.filename)
+                ).unlink(missing_ok=True)
                 abort = True
                 if ext == f".{recipe.src_ext}":
                     # if primary format, abort early
                     return abort
+    _download_cached_covers(cached_files, publish_site, http_client, log)
     return abort
 
 
+def _get_part_file_path(file_path: Path) -> Path:
+    # does not end with the book extension, so is never picked up by _find_output()
+    return file_path.with_name(f"{file_path.name}.part")
+
+
+def _get_content_size(res: requests.Response) -> Optional[int]:
+    """
+    Full size of the resource from the response headers.
+
+    :param res:
+    :return:
+    """
+    content_range = re.match(
+        r"bytes (\d+-\d+|\*)/(?P<size>\d+)", res.headers.get("Content-Range", "")
+    )
+    if content_range:
+        return int(content_range.group("size"))
+    if res.status_code == 200 and res.headers.get("Content-Length", "").isdigit():
+        return int(res.headers["Content-Length"])
+    return None
+
+
+def _download_file(
+    http_client: HttpClient,
+    url: str,
+    file_path: Path,
+    cached_item: BookRecord,
+    timeout: float,
+) -> None:
+    """
+    Download a cached file, resuming from what was downloaded by a previous attempt.
+    The download is written to a temporary .part file that is only renamed to
+    file_path after its size and hash have been verified against the cached record.
+
+    :param http_client:
+    :param url:
+    :param file_path:
+    :param cached_item:
+    :param timeout:
+    :return:
+    """
+    part_file_path = _get_part_file_path(file_path)
+    offset = part_file_path.stat().st_size if part_file_path.exists() else 0
+    # byte ranges need to be of the unencoded file
+    headers = {"Accept-Encoding": "identity"}
+    if offset:
+        headers["Range"] = f"bytes={offset}-"
+    try:
+        res = http_client.get(
+            url, headers=headers, timeout=timeout, stream=True, retry_attempts=0
+        )
+    except requests.exceptions.HTTPError as err:
+        # 416 Range Not Satisfiable: already fully downloaded
+        if not (offset and err.response.status_code == 416):
+            raise
+        res = err.response
+    with res:
+        expected_size = cached_item.size or _get_content_size(res)
+        if res.status_code != 416:
+            if res.status_code != 206:
+                # range not supported, start over
+                offset = 0
+            elif not res.headers.get("Content-Range", "").startswith(
+                f"bytes {offset}-"
+            ):
+                part_file_path.unlink()
+                raise IncompleteDownload(f"Unexpected range for {url}")
+            with part_file_path.open("ab" if offset else "wb") as f:
+                for chunk in http_client.iter_content(res, download_chunk_size):
+                    f.write(chunk)
+
+    size = part_file_path.stat().st_size
+    if expected_size is not None and size != expected_size:
+        if size > expected_size:
+            part_file_path.unlink()
+        raise IncompleteDownload(
+            f"Downloaded {size} of {expected_size} bytes for {url}"
+        )
+    if cached_item.sha256 and hash_file(part_file_path) != cached_item.sha256:
+        part_file_path.unlink()
+        raise IncompleteDownload(f"Hash does not match for {url}")
+    os.replace(part_file_path, file_path)
+
+
+def _download_cached_covers(
+    cached_files: List[BookRecord],
+    publish_site: str,
+    http_client: HttpClient,
+    log: logging.Logger = logger,
+) -> None:
+    """
+    Download the covers extracted from cached books so that they do not need
+    to be extracted again. Covers that cannot be downloaded are extracted as usual.
+
+    :param cached_files:
+    :param publish_site:
+    :param http_client:
+    :param log:
+    :return:
+    """
+    for image_file_name in sorted(
+        {
+            image_file_name
+            for cached_item in cached_files
+            for image_file_name in [cached_item.cover, cached_item.thumbnail]
+            + [thumbnail["file_name"] for thumbnail in cached_item.thumbnails or []]
+            if image_file_name
+        }
+    ):
+        image_file_path = publish_folder.joinpath(image_file_name)
+        if image_file_path.exists():
+            continue
+        image_url = urljoin(publish_site, image_file_name)
+        try:
+            image_res = http_client.get(image_url, retry_attempts=0, log=log)
+            with image_file_path.open("wb") as f:
+                f.write(image_res.content)
+        except requests.exceptions.RequestException as err:
+            log.warning(f"{err.__class__.__name__} downloading {image_url}")
+
+
+def _get_restored_records(
+    recipe: Recipe, source_file: Path, cached: Dict
+) -> List[BookRecord]:
+    """
+    Cached records for a recipe's outputs if they were restored from cache
+    and are complete, so that the outputs can be listed without being processed.
+
+    :param recipe:
+    :param source_file:
+    :param cached:
+    :return: Empty list if the outputs need to be processed
+    """
+    records = {r.filename: r for r in _get_cached_files(recipe, cached)}
+    restored = []
+    for ext in [recipe.src_ext] + recipe.target_ext:
+        record = records.get(f"{source_file.stem}.{ext}")
+        if not (
+            record
+            and record.complete
+            and publish_folder.joinpath(record.filename).exists()
+        ):
+            return []
+        restored.append(record)
+    return restored
+
+
 def _linkify_attrs(attrs, _=False):
     """
     Add required attributes when linkifying
@@ -369,6 +724,959 @@ def _linkify_attrs(attrs, _=False):
     return attrs
 
 
+def _resolve_recipe_name(recipe: Recipe) -> bool:
+    """
+    Set the recipe display name from the recipe source if not configured.
+
+    :param recipe:
+    :return: False if the recipe should not be processed
+    """
+    if recipe.name:
+        return True
+    recipe_path = Path(f"{recipe.recipe}.recipe")
+    try:
+        with recipe_path.open("r", encoding="utf-8") as f:
+            recipe_source = f.read()
+            mobj = re.search(
+                r"\n_name\s=\s['\"](?P<name>.+)['\"]\n", recipe_source
+            ) or re.search(r"\btitle\s+=\s+u?['\"](?P<name>.+)['\"]\n", recipe_source)
+            if mobj:
+                recipe.name = mobj.group("name")
+            else:
+                logger.warning(f"Unable to extract recipe name for {recipe}.")
+                recipe.name = f"{recipe.recipe}.recipe"  # set name to recipe file name
+    except FileNotFoundError:
+        logger.warning(
+            f"Built-in recipes should be configured with a recipe name: {recipe.recipe}"
+        )
+        recipe.name = f"{recipe.recipe}.recipe"
+    except Exception:  # noqa, pylint: disable=broad-except
+        logger.exception("Error getting recipe name")
+        return False
+    return True
+
+
+def _get_recipe_env(
+    recipe: Recipe, verbose_mode: bool, has_account: bool = False
+) -> Dict[str, str]:
+    """
+    Environment for the calibre processes of a recipe. This is used instead of
+    modifying os.environ so that recipes can be executed concurrently.
+
+    :param recipe:
+    :param verbose_mode:
+    :param has_account: If True, the recipe logs in and its pages are not cached
+    :return:
+    """
+    env = dict(os.environ)
+    env["newsrack_title_dt_format"] = recipe.title_date_format
+    env["newsrack_title_dts_format"] = recipe.recipe_datetime_format
+    # article images cache shared by the recipes
+    env["newsrack_image_cache_folder"] = str(
+        meta_folder.joinpath(article_image_cache_folder_name).absolute()
+    )
+    if recipe.grayscale_images:
+        env["newsrack_grayscale_images"] = str(recipe.grayscale_images)
+        env["newsrack_dither_images"] = "1" if recipe.dither_images else ""
+    if recipe.image_budget:
+        env["newsrack_image_budget"] = str(recipe.image_budget)
+    # pages fetched by the recipe, reused when it is retried or rerun
+    if not has_account:
+        env["newsrack_response_cache_folder"] = str(
+            response_cache_folder.joinpath(recipe.slug).absolute()
+        )
+    if recipe.response_cache_ttl is not None:
+        env["newsrack_response_cache_ttl"] = str(recipe.response_cache_ttl)
+    if verbose_mode:
+        # set recipe debug output folder
+        env["recipe_debug_folder"] = str(publish_folder.absolute())
+    return env
+
+
+def _get_buffered_logger(name: str, stream: IO, level: int) -> logging.Logger:
+    """
+    Logger that writes to its own log stream so that the output
+    of concurrently executing recipes is not interleaved.
+
+    :param name:
+    :param stream:
+    :param level:
+    :return:
+    """
+    buffered_logger = logging.getLogger(f"{__file__}:{name}")
+    buffered_logger.propagate = False
+    for handler in list(buffered_logger.handlers):
+        buffered_logger.removeHandler(handler)
+    buffered_handler = logging.StreamHandler(stream)
+    buffered_handler.setLevel(logging.DEBUG)
+    buffered_logger.addHandler(buffered_handler)
+    buffered_logger.setLevel(level)
+    return buffered_logger
+
+
+def _read_log_stream(log_stream: IO) -> str:
+    log_stream.flush()
+    log_stream.seek(0)
+    log_output = log_stream.read()
+    log_stream.close()
+    return log_output
+
+
+def _should_execute(
+    recipe: Recipe, cached: Dict, regenerate_recipes_slugs: List[str]
+) -> bool:
+    """
+    Determine if a recipe should be executed instead of being restored from cache.
+
+    :param recipe:
+    :param cached:
+    :param regenerate_recipes_slugs:
+    :return:
+    """
+    return bool(
+        # regenerate restriction is not in place and recipe is enabled
+        (recipe.is_enabled() and not regenerate_recipes_slugs)
+        # regenerate restriction is in place and recipe is included
+        or (regenerate_recipes_slugs and recipe.slug in regenerate_recipes_slugs)
+        # not cached (so that we always have a copy available)
+        or not _get_cached_files(recipe, cached)
+    )
+
+
+def _fetch_recipe(
+    recipe: Recipe,
+    execute: bool,
+    publish_site: str,
+    cached: Dict,
+    http_client: HttpClient,
+    accounts_info: Dict,
+    verbose_mode: bool,
+    buffer_log: bool,
+    timeout: Optional[int] = None,
+    deadline: Optional[float] = None,
+    store: Optional[ArtifactStore] = None,
+) -> RecipeFetchResult:
+    """
+    Fetch stage: execute a recipe, or download it from cache, to get the source book.
+    Post-processing of the book is done separately in _process_recipe_output().
+
+    :param recipe:
+    :param execute: If False, the recipe is restored from cache
+    :param publish_site:
+    :param cached:
+    :param http_client:
+    :param accounts_info:
+    :param verbose_mode:
+    :param buffer_log: If True, log and calibre output is buffered and
+                       returned in the result instead of written to stdout
+    :param timeout: Recipe timeout in seconds, defaults to recipe.timeout
+    :param deadline: timer() value that retries should not run past, None if unlimited
+    :param store: Artifact store to restore cached books from
+    :return:
+    """
+    log_stream: IO = (
+        tempfile.TemporaryFile(mode="w+", encoding="utf-8")
+        if buffer_log
+        else sys.stdout
+    )
+    log = (
+        _get_buffered_logger(recipe.slug, log_stream, logger.level)
+        if buffer_log
+        else logger
+    )
+    last_run: Optional[float] = None
+    recipe_exit_code: Optional[int] = None
+    timed_out = False
+    retries = 0
+    cache_hit = False
+    attempt_durations: List[float] = []
+
+    def _result(
+        status: str,
+        duration: timedelta,
+        source_file: Optional[Path] = None,
+        exit_code: int = 0,
+    ) -> RecipeFetchResult:
+        return RecipeFetchResult(
+            recipe=recipe,
+            status=status,
+            duration=duration,
+            source_file=source_file,
+            exit_code=exit_code,
+            last_run=last_run,
+            log_output=_read_log_stream(log_stream) if buffer_log else "",
+            recipe_exit_code=recipe_exit_code,
+            timed_out=timed_out,
+            retries=retries,
+            cache_hit=cache_hit,
+            attempt_durations=attempt_durations,
+        )
+
+    recipe_path = Path(f"{recipe.recipe}.recipe")
+    job_status = ""
+    log.info(f'{"-" * 20} Executing "{recipe.name}" recipe... {"-" * 30}')
+    recipe_start_time = timer()
+
+    source_file_name = Path(f"{recipe.slug}.{recipe.src_ext}")
+    source_file_path = publish_folder.joinpath(source_file_name)
+    cmd = [
+        "ebook-convert",
+        str(recipe_path),
+        str(source_file_path),
+    ]
+    has_account = False
+    try:
+        recipe_account = accounts_info.get(recipe.slug, {})
+        recipe_username = recipe_account.get("username", None)
+        recipe_password = recipe_account.get("password", None)
+        if recipe_username and recipe_password:
+            cmd.extend(
+                [f"--username={recipe_username}", f"--password={recipe_password}"]
+            )
+            has_account = True
+    except:  # noqa, pylint: disable=bare-except
+        pass
+    if recipe.conv_options and recipe.conv_options.get(recipe.src_ext):
+        cmd.extend(recipe.conv_options[recipe.src_ext])
+    customised_css_filename = Path("static", f"{recipe.src_ext}.css")
+    if customised_css_filename.exists():
+        cmd.append(f"--extra-css={str(customised_css_filename)}")
+    if verbose_mode:
+        cmd.append("-vv")
+
+    exit_code = 0
+
+    cached_files = _get_cached_files(recipe, cached)
+
+    if not _find_output(publish_folder, recipe.slug, recipe.src_ext):
+        # existing file does not exist
+        try:
+            if execute:
+                timeout = recipe.timeout if timeout is None else timeout
+                for attempt in range(recipe.retry_attempts + 1):
+                    try:
+                        # run recipe
+                        log.debug(f"Executing with a timeout of {timeout}s")
+                        log_stream.flush()
+                        attempt_start_time = timer()
+                        exit_code = subprocess.call(
+                            cmd,
+                            timeout=timeout,
+                            stdout=log_stream,
+                            stderr=log_stream if buffer_log else sys.stderr,
+                            env=_get_recipe_env(recipe, verbose_mode, has_account),
+                        )
+                        attempt_durations.append(timer() - attempt_start_time)
+                        recipe_exit_code = exit_code
+                        break
+                    except subprocess.TimeoutExpired:
+                        attempt_durations.append(timer() - attempt_start_time)
+                        if attempt < recipe.retry_attempts:
+                            retries += 1
+                            recipe_elapsed_time = timedelta(
+                                seconds=timer() - recipe_start_time
+                            )
+                            wait_interval = min(max(ceil(timeout / 100), 2), 10)
+                            log.warning(
+                                f"TimeoutExpired fetching '{recipe.name}' "
+                                f"after {humanize.precisedelta(recipe_elapsed_time)}. "
+                                f"Retrying after {wait_interval}s..."
+                            )
+                            # increase recipe timeout on retry but up to a max
+                            timeout = min(
+                                ceil(retry_timeout_growth * timeout),
+                                max(timeout, max_retry_timeout),
+                            )
+                            if deadline is not None:
+                                timeout = max(
+                                    min_recipe_timeout,
+                                    min(timeout, int(deadline - timer())),
+                                )
+                            time.sleep(wait_interval)
+                            continue
+                        raise
+
+                last_run = time.time()
+
+            else:
+                # use cache
+                log.warning(f'Using cached copy for "{recipe.name}".')
+                abort_recipe = _download_from_cache(
+                    recipe, cached, publish_site, http_client, log, store
+                )
+                if not abort_recipe:
+                    job_status = ":outbox_tray: From cache"
+                    cache_hit = True
+                else:
+                    recipe_elapsed_time = timedelta(seconds=timer() - recipe_start_time)
+                    log.info(
+                        f'{"=" * 10} "{recipe.name}" recipe took {humanize.precisedelta(recipe_elapsed_time)} {"=" * 20}'
+                    )
+                    return _result(":x: Cache Timeout", recipe_elapsed_time)
+
+        except subprocess.TimeoutExpired:
+            timed_out = True
+            log.exception(f"[!] TimeoutExpired fetching '{recipe.name}'")
+            recipe_elapsed_time = timedelta(seconds=timer() - recipe_start_time)
+            log.info(
+                f'{"=" * 10} "{recipe.name}" recipe took {humanize.precisedelta(recipe_elapsed_time)} {"=" * 20}'
+            )
+            return _result(":x: Convert Timeout", recipe_elapsed_time)
+    else:
+        job_status = ":file_folder: From local"
+
+    source_file_paths = sorted(
+        _find_output(publish_folder, recipe.slug, recipe.src_ext)
+    )
+    if cached_files and not source_file_paths:
+        log.warning(
+            f'Using cached copy for "{recipe.name}" because recipe has no output.'
+        )
+        # try to use cached copy if recipe does not have output
+        # for example FT(Print) has no weekend issue, so we'll try to keep the last issue
+        _ = _download_from_cache(recipe, cached, publish_site, http_client, log, store)
+        source_file_paths = sorted(
+            _find_output(publish_folder, recipe.slug, recipe.src_ext)
+        )
+        if source_file_paths:
+            exit_code = (
+                0  # reset exit_code (not 0 because of failed recipe ebook-convert)
+            )
+            job_status = ":outbox_tray: From cache"
+            cache_hit = True
+
+    recipe_elapsed_time = timedelta(seconds=timer() - recipe_start_time)
+    if not source_file_paths:
+        log.error(
+            f"Unable to find source generated: '/{recipe.slug}*.{recipe.src_ext}'"
+        )
+        log.info(
+            f'{"=" * 20} "{recipe.name}" recipe took {humanize.precisedelta(recipe_elapsed_time)} {"=" * 20}'
+        )
+        return _result(":x: No output", recipe_elapsed_time)
+
+    log.info(
+        f'{"=" * 20} "{recipe.name}" recipe took {humanize.precisedelta(recipe_elapsed_time)} {"=" * 20}'
+    )
+    return _result(
+        job_status or ":white_check_mark: Completed",
+        recipe_elapsed_time,
+        source_file=source_file_paths[-1],
+        exit_code=exit_code,
+    )
+
+
+def _get_process_job(
+    recipe: Recipe,
+    source_file: Path,
+    publish_site: str,
+    today: datetime,
+    verbose_mode: bool,
+) -> RecipeProcessJob:
+    """
+    Picklable post-processing job for a recipe because Recipe itself
+    can hold unpicklable callables, e.g. enable_on lambdas.
+    """
+    return RecipeProcessJob(
+        slug=recipe.slug,
+        name=recipe.name,
+        src_ext=recipe.src_ext,
+        target_ext=recipe.target_ext,
+        timeout=recipe.timeout,
+        overwrite_cover=recipe.overwrite_cover,
+        cover_options=recipe.cover_options,
+        conv_options=recipe.conv_options,
+        source_file=source_file,
+        publish_site=publish_site,
+        today=today,
+        env=_get_recipe_env(recipe, verbose_mode),
+        verbose_mode=verbose_mode,
+    )
+
+
+def _write_metadata(
+    book_path: Path,
+    series: str,
+    series_index: int,
+    publisher: str,
+    cover: Optional[bytes] = None,
+    log: logging.Logger = logger,
+) -> None:
+    """
+    Set the series, publisher and optionally the cover of a book.
+    Falls back to ebook-meta for books that cannot be updated directly.
+
+    :param book_path:
+    :param series:
+    :param series_index:
+    :param publisher:
+    :param cover: Encoded cover image
+    :param log:
+    :return:
+    """
+    try:
+        write_metadata(book_path, series, series_index, publisher, cover)
+        return
+    except Exception as err:  # noqa, pylint: disable=broad-except
+        log.warning(f"Unable to write metadata, using ebook-meta instead: {err}")
+    cmd = ["ebook-meta", str(book_path)]
+    cover_file_path = Path(f"{str(book_path)}.cover")
+    if cover:
+        with Image.open(io.BytesIO(cover)) as img:
+            # ebook-meta needs the image type from the file extension
+            cover_file_path = cover_file_path.with_suffix(
+                f".{(img.format or 'jpeg').lower()}"
+            )
+        with cover_file_path.open("wb") as f:
+            f.write(cover)
+        cmd.append(f"--cover={str(cover_file_path)}")
+    cmd.extend(
+        [f"--series={series}", f"--index={series_index}", f"--publisher={publisher}"]
+    )
+    try:
+        _ = _calibre.call(cmd)
+    finally:
+        cover_file_path.unlink(missing_ok=True)
+
+
+def _read_cover(book_path: Path) -> bytes:
+    """
+    Read the cover of a book.
+    Falls back to ebook-meta for books that cannot be read directly.
+
+    :param book_path:
+    :return: Encoded cover image
+    """
+    try:
+        return read_cover(book_path)
+    except Exception as err:  # noqa, pylint: disable=broad-except
+        logger.debug(f"Unable to read cover, using ebook-meta instead: {err}")
+    cover_file_path = Path(f"{str(book_path)}.cover.jpg")
+    try:
+        exit_code = _calibre.call(
+            ["ebook-meta", f"--get-cover={str(cover_file_path)}", str(book_path)]
+        )
+        if exit_code or not cover_file_path.exists():
+            raise UnsupportedBook(
+                f"No cover extracted, ebook-meta exit code: {exit_code}"
+            )
+        with cover_file_path.open("rb") as f:
+            return f.read()
+    finally:
+        cover_file_path.unlink(missing_ok=True)
+
+
+def _extract_site_cover(
+    book_paths: List[Path], cover_file_path: Path, cover_thumbnail_file_path: Path
+) -> List[ImageVariant]:
+    """
+    Write the site cover and thumbnails from the first of the books with a readable cover.
+    Executed in a thread pool.
+
+    :param book_paths: Formats of the same book
+    :param cover_file_path:
+    :param cover_thumbnail_file_path:
+    :return: Thumbnails written, none if the cover could not be extracted
+    """
+    for book_path in book_paths:
+        try:
+            return save_site_cover(
+                _read_cover(book_path), cover_file_path, cover_thumbnail_file_path
+            )
+        except Exception as err:  # noqa, pylint: disable=broad-except
+            logger.warning("Unable to extract cover for %s: %s", book_path.name, err)
+    return []
+
+
+def _get_site_cover(
+    cover_file_name: str, cover_thumbnail_file_name: str, thumbnails: List[ImageVariant]
+) -> Dict:
+    """
+    Site listing entry for an extracted cover, with the srcset of each thumbnail format
+    so that browsers only download the thumbnail that fits. The full-size cover that
+    the thumbnail links to, and the OPDS catalog's images, are JPEG only.
+
+    :param cover_file_name:
+    :param cover_thumbnail_file_name: Default thumbnail, for browsers without srcset
+    :param thumbnails: Thumbnail variants, in order of preference
+    :return:
+    """
+    site_cover: Dict = {
+        "cover": cover_file_name,
+        "thumbnail": cover_thumbnail_file_name,
+        "sources": [],
+    }
+    srcsets: Dict[str, List[str]] = {}
+    for thumbnail in thumbnails:
+        srcsets.setdefault(thumbnail.media_type, []).append(
+            f"{thumbnail.file_name} {thumbnail.width}w"
+        )
+        if thumbnail.file_name == cover_thumbnail_file_name:
+            site_cover["width"] = thumbnail.width
+            site_cover["height"] = thumbnail.height
+    for media_type, srcset in srcsets.items():
+        site_cover["sources"].append({"type": media_type, "srcset": ", ".join(srcset)})
+    return site_cover
+
+
+def _process_recipe_output(job: RecipeProcessJob) -> RecipeProcessResult:
+    """
+    Post-processing stage, executed in a process pool: read the book metadata,
+    generate the cover and convert the book into the alternative formats.
+
+    :param job:
+    :return:
+    """
+    log_stream: IO = tempfile.TemporaryFile(mode="w+", encoding="utf-8")
+    log = _get_buffered_logger(
+        f"{job.slug}:process",
+        log_stream,
+        logging.DEBUG if job.verbose_mode else logging.INFO,
+    )
+    start_time = timer()
+
+    source_file_path = job.source_file
+    source_file_name = Path(source_file_path.name)
+    log.debug(f'Get book meta info for "{source_file_path}"')
+    startup_saved = _calibre.startup_saved()
+    metrics_start = len(_http.get_client().metrics)
+    try:
+        metadata = read_metadata(source_file_path)
+    except Exception as err:  # noqa, pylint: disable=broad-except
+        log.warning(f"Unable to read metadata, using ebook-meta instead: {err}")
+        metadata = parse_ebook_meta_output(
+            _calibre.get_output(["ebook-meta", str(source_file_path)])
+        )
+    pub_date = metadata.published or job.today
+    title = metadata.title
+    rename_file_name = Path(f"{job.slug}-{pub_date:%Y-%m-%d}.{job.src_ext}")
+
+    comments = []
+    description = ""
+    if metadata.comments:
+        try:
+            comments = [c.strip() for c in metadata.comments.split("\n") if c.strip()]
+            description = (
+                f"{comments[0]}"
+                f'<ul><li>{"</li><li>".join(comments[1:-1])}</li></ul>'
+                f"{linkify(comments[-1], callbacks=[_linkify_attrs])}"
+            )
+        except:  # noqa, pylint: disable=bare-except
+            pass
+
+    pseudo_series_index = pub_date.year * 1000 + pub_date.timetuple().tm_yday
+    cover_cache_hit = None
+    # (rename_file_name != source_file_name) checks that it is a newly generated file
+    # so that we don't regenerate the cover needlessly
+    if job.overwrite_cover and title and rename_file_name != source_file_name:
+        # customise cover
+        log.debug(f'Setting cover for "{source_file_path}"')
+        try:
+            # books' covers are JPEG so that the cover does not need to be re-encoded
+            renderer = get_cover_renderer()
+            cache_hits = renderer.cache_hits
+            cover = renderer.render(title, job.cover_options, "JPEG", logger=log)
+            if renderer.cover_cache:
+                cover_cache_hit = renderer.cache_hits > cache_hits
+            _write_metadata(
+                source_file_path,
+                job.name,
+                pseudo_series_index,
+                job.publish_site,
+                cover,
+                log,
+            )
+        except Exception:  # noqa, pylint: disable=broad-except
+            log.exception("Error generating cover")
+    elif rename_file_name != source_file_name:
+        # just set series name
+        _write_metadata(
+            source_file_path, job.name, pseudo_series_index, job.publish_site, log=log
+        )
+
+    elapsed_time = timedelta(seconds=timer() - start_time)
+    log.info(
+        f'{"=" * 20} "{job.name}" post-processing took {humanize.precisedelta(elapsed_time)} {"=" * 20}'
+    )
+    return RecipeProcessResult(
+        title=title,
+        published_dt=pub_date,
+        series_index=pseudo_series_index,
+        description=description,
+        comments=comments,
+        file=source_file_name,
+        rename_to=rename_file_name,
+        duration=elapsed_time,
+        log_output=_read_log_stream(log_stream),
+        calibre_startup_saved=_calibre.startup_saved() - startup_saved,
+        http_metrics=_http.get_client().metrics[metrics_start:],
+        cover_cache_hit=cover_cache_hit,
+    )
+
+
+def _get_conversion_jobs(
+    process_job: RecipeProcessJob, process_result: RecipeProcessResult
+) -> List[RecipeConversionJob]:
+    return [
+        RecipeConversionJob(
+            slug=process_job.slug,
+            name=process_job.name,
+            ext=ext,
+            source_file=process_job.source_file,
+            series_index=process_result.series_index,
+            timeout=process_job.timeout,
+            conv_options=process_job.conv_options,
+            publish_site=process_job.publish_site,
+            env=process_job.env,
+            verbose_mode=process_job.verbose_mode,
+        )
+        for ext in process_job.target_ext
+    ]
+
+
+def _convert_recipe_output(job: RecipeConversionJob) -> RecipeConversionResult:
+    """
+    Convert a generated book into an alternative format. Executed in the
+    conversion process pool so that conversions across recipes run concurrently.
+
+    :param job:
+    :return:
+    """
+    log_stream: IO = tempfile.TemporaryFile(mode="w+", encoding="utf-8")
+    log = _get_buffered_logger(
+        f"{job.slug}:{job.ext}",
+        log_stream,
+        logging.DEBUG if job.verbose_mode else logging.INFO,
+    )
+    start_time = timer()
+
+    target_file_name = Path(f"{job.slug}.{job.ext}")
+    target_file_path = Path(publish_folder, target_file_name)
+
+    cmd = [
+        "ebook-convert",
+        str(job.source_file),
+        str(target_file_path),
+        f"--series={job.name}",
+        f"--series-index={job.series_index}",
+        f"--publisher={job.publish_site}",
+    ]
+    if job.conv_options and job.conv_options.get(job.ext):
+        cmd.extend(job.conv_options[job.ext])
+
+    customised_css_filename = Path("static", f"{job.ext}.css")
+    if customised_css_filename.exists():
+        cmd.append(f"--extra-css={str(customised_css_filename)}")
+    if job.verbose_mode:
+        cmd.append("-vv")
+
+    exit_code = 0
+    startup_saved = _calibre.startup_saved()
+    if not _find_output(publish_folder, job.slug, job.ext):
+        log_stream.flush()
+        try:
+            exit_code = _calibre.call(
+                cmd,
+                timeout=job.timeout,
+                stdout=log_stream,
+                env=job.env,
+            )
+        except subprocess.TimeoutExpired:
+            log.exception(f"[!] TimeoutExpired converting '{job.name}' to {job.ext}")
+            exit_code = 1
+
+    target_file_paths = sorted(_find_output(publish_folder, job.slug, job.ext))
+    elapsed_time = timedelta(seconds=timer() - start_time)
+    log.info(
+        f'{"=" * 20} "{job.name}" {job.ext} conversion took {humanize.precisedelta(elapsed_time)} {"=" * 20}'
+    )
+    return RecipeConversionResult(
+        ext=job.ext,
+        file=Path(target_file_paths[-1].name)
+        if (target_file_paths and not exit_code)
+        else None,
+        exit_code=exit_code,
+        duration=elapsed_time,
+        log_output=_read_log_stream(log_stream),
+        calibre_startup_saved=_calibre.startup_saved() - startup_saved,
+    )
+
+
+def _get_history_entry(fetch_result: RecipeFetchResult, run_id: str) -> Dict:
+    """
+    History values for the fetch stage of a recipe run.
+
+    :param fetch_result:
+    :param run_id:
+    :return:
+    """
+    executed = bool(fetch_result.last_run) or fetch_result.timed_out
+    attempt_durations = fetch_result.attempt_durations
+    duration = None
+    if executed and attempt_durations:
+        # exclude the waits and the failed attempts, whose timeouts grow on each retry
+        duration = (
+            min(attempt_durations) if fetch_result.timed_out else attempt_durations[-1]
+        )
+    elif executed:
+        duration = fetch_result.duration.total_seconds()
+    entry = {
+        "duration": duration,
+        "run_id": run_id,
+        "exit_code": fetch_result.recipe_exit_code,
+        "timed_out": fetch_result.timed_out,
+        "retries": fetch_result.retries,
+        "cache_hit": fetch_result.cache_hit,
+    }
+    if len(attempt_durations) > 1:
+        entry["attempts"] = [round(d, 3) for d in attempt_durations]
+    return entry
+
+
+def _get_output_sizes(
+    src_ext: str, source_file: Path, conversion_results: List[RecipeConversionResult]
+) -> Dict[str, int]:
+    """
+    Sizes of a recipe's outputs by format.
+
+    :param src_ext:
+    :param source_file:
+    :param conversion_results:
+    :return:
+    """
+    sizes = {}
+    for ext, file_path in [(src_ext, source_file)] + [
+        (c.ext, c.file) for c in conversion_results if c.file
+    ]:
+        try:
+            sizes[ext] = publish_folder.joinpath(file_path).stat().st_size
+        except OSError:
+            continue
+    return sizes
+
+
+def get_recipe_stats(
+    slugs: Optional[List[str]] = None, history: Optional[RecipeHistory] = None
+) -> List[RecipeStats]:
+    """
+    Duration statistics (p50/p95, trend) for recipes from the run history.
+
+    :param slugs: Recipe slugs, defaults to all recipes in the history
+    :param history: Defaults to the history saved in meta/
+    :return:
+    """
+    if not history:
+        history = RecipeHistory(meta_folder.joinpath(history_filename))
+        if history.file_path.exists():
+            history.load()
+    return [history.stats(slug) for slug in (slugs or sorted(history.entries.keys()))]
+
+
+def _schedule_recipes(
+    recipes: List[Recipe],
+    execute: Callable[[Recipe], RecipeFetchResult],
+    max_workers: int,
+    on_complete: Callable[[RecipeFetchResult], None],
+    started: Optional[List[Future]] = None,
+) -> List[RecipeFetchResult]:
+    """
+    Execute recipes with up to max_workers at a time, while never running more than
+    max_workers_per_group recipes from the same concurrency group together so that
+    we don't trigger bot detection.
+
+    :param recipes:
+    :param execute: Function that executes a recipe
+    :param max_workers:
+    :param on_complete: Called in the main thread as each recipe completes
+    :param started: Futures of recipes already running elsewhere, e.g. cache restores,
+                    on_complete is also called for these
+    :return: Results in the same order as recipes
+    """
+    results: Dict[int, RecipeFetchResult] = {}
+    pending = list(enumerate(recipes))
+    running: Dict[Future, Tuple[int, str]] = {}
+    group_running: Dict[str, int] = {}
+    background = set(started or [])
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        while pending or running or background:
+            for i, recipe in list(pending):
+                if len(running) >= max_workers:
+                    break
+                group = recipe.get_concurrency_group()
+                if group_running.get(group, 0) >= max_workers_per_group:
+                    continue
+                pending.remove((i, recipe))
+                group_running[group] = group_running.get(group, 0) + 1
+                running[executor.submit(execute, recipe)] = (i, group)
+
+            done, _ = wait(set(running) | background, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in background:
+                    background.remove(future)
+                    on_complete(future.result())
+                    continue
+                i, group = running.pop(future)
+                group_running[group] -= 1
+                results[i] = future.result()
+                on_complete(results[i])
+    return [results[i] for i in sorted(results)]
+
+
+def _load_history() -> RecipeHistory:
+    history = RecipeHistory(meta_folder.joinpath(history_filename))
+    try:
+        history.load()
+    except Exception as err:  # noqa, pylint: disable=broad-except
+        logger.warning(f"Unable to load history: {err}")
+    return history
+
+
+def _get_plan_reason(
+    recipe: Recipe, cached: Dict, regenerate_recipes_slugs: List[str]
+) -> str:
+    """
+    Why a recipe is executed or restored from cache, mirrors _should_execute().
+
+    :param recipe:
+    :param cached:
+    :param regenerate_recipes_slugs:
+    :return:
+    """
+    if _find_output(publish_folder, recipe.slug, recipe.src_ext):
+        return "Local output exists"
+    if regenerate_recipes_slugs and recipe.slug in regenerate_recipes_slugs:
+        return "In regenerate list"
+    if not _get_cached_files(recipe, cached):
+        return "Not cached"
+    if regenerate_recipes_slugs:
+        return "Not in regenerate list"
+    return "Enabled" if recipe.is_enabled() else "Not enabled"
+
+
+def _estimate_download_size(
+    recipe: Recipe, cached: Dict, history: RecipeHistory
+) -> Optional[int]:
+    """
+    Estimate the bytes to download to restore a recipe from cache,
+    from the output sizes of its last run.
+
+    :param recipe:
+    :param cached:
+    :param history:
+    :return:
+    """
+    sizes = history.last_sizes(recipe.slug)
+    if not sizes:
+        return None
+    download_size = 0
+    for cached_item in _get_cached_files(recipe, cached):
+        ext = Path(cached_item.filename).suffix[1:]
+        if ext == recipe.src_ext or ext in recipe.target_ext:
+            download_size += sizes.get(ext, 0)
+    return download_size
+
+
+def _plan_recipes(
+    recipes: List[Recipe],
+    cached: Dict,
+    job_log: Dict[str, float],
+    history: RecipeHistory,
+    skip_recipes_slugs: List[str],
+    regenerate_recipes_slugs: List[str],
+    max_workers: int,
+    budget: float,
+) -> Tuple[RunPlan, List[Recipe]]:
+    """
+    Evaluate the recipes and plan the run.
+
+    :param recipes:
+    :param cached:
+    :param job_log:
+    :param history:
+    :param skip_recipes_slugs:
+    :param regenerate_recipes_slugs:
+    :param max_workers:
+    :param budget:
+    :return: the plan and the skipped recipes
+    """
+    recipes_to_execute: List[Recipe] = []
+    skipped_recipes: List[Recipe] = []
+    for recipe in recipes:
+        if not _resolve_recipe_name(recipe):
+            continue
+        recipe.last_run = job_log.get(recipe.slug, 0)
+        if recipe.slug in skip_recipes_slugs:
+            skipped_recipes.append(recipe)
+            continue
+        recipes_to_execute.append(recipe)
+
+    plan = plan_run(
+        recipes_to_execute,
+        should_execute=lambda r: (
+            not _find_output(publish_folder, r.slug, r.src_ext)
+            and _should_execute(r, cached, regenerate_recipes_slugs)
+        ),
+        can_defer=lambda r: (
+            bool(_get_cached_files(r, cached))
+            and r.slug not in regenerate_recipes_slugs
+        ),
+        history=history,
+        max_workers=max_workers,
+        max_workers_per_group=max_workers_per_group,
+        budget=budget,
+    )
+    for p in plan.recipes:
+        p.reason = p.reason or _get_plan_reason(
+            p.recipe, cached, regenerate_recipes_slugs
+        )
+        if not p.execute and not _find_output(
+            publish_folder, p.recipe.slug, p.recipe.src_ext
+        ):
+            p.download_size = _estimate_download_size(p.recipe, cached, history)
+    return plan, skipped_recipes
+
+
+def dry_run(
+    publish_site: Optional[str] = None,
+    max_workers: int = 1,
+    budget: float = 0,
+    index_path: Optional[Path] = None,
+) -> None:
+    """
+    Print the execution plan for a run without executing any recipe.
+
+    :param publish_site: Site to fetch index.json from if there is no local index
+    :param max_workers:
+    :param budget:
+    :param index_path: Local index.json, defaults to the one in the publish folder
+    :return:
+    """
+    if publish_site and not publish_site.endswith("/"):
+        publish_site += "/"
+    job_log: Dict[str, float] = {}
+    try:
+        with meta_folder.joinpath(job_log_filename).open("r", encoding="utf-8") as f:
+            job_log = json.load(f)
+    except Exception as err:  # noqa, pylint: disable=broad-except
+        logger.warning(f"Unable to load job log: {err}")
+
+    plan, skipped_recipes = _plan_recipes(
+        custom_recipes or default_recipes,
+        _load_plan_cache(
+            index_path or publish_folder.joinpath(index_json_filename), publish_site
+        ),
+        job_log,
+        _load_history(),
+        _get_env_csv("skip"),
+        _get_env_csv("regenerate"),
+        max_workers,
+        budget,
+    )
+    print(format_plan(plan, details=True))
+    if skipped_recipes:
+        print(f'Skipped: {", ".join([r.slug for r in skipped_recipes])}')
+
+
 def run(
     publish_site: str,
     source_url: str,
@@ -377,6 +1685,9 @@ def run(
     run_id: str,
     run_url: str,
     verbose_mode: bool,
+    max_workers: int = 1,
+    budget: float = 0,
+    adaptive_timeouts: bool = False,
 ) -> None:
     # set path to recipe includes in os environ so that recipes can pick it up
     os.environ["recipes_includes"] = str(Path("recipes/includes/").absolute())
@@ -396,12 +1707,15 @@ def run(
         logger.warning(f"Unable to load job log: {err}")
 
     today = datetime.utcnow().replace(tzinfo=timezone.utc)
-    cache_sess = requests.Session()
-    cached = _fetch_cache(publish_site, cache_sess)
-    index = {}  # type: ignore
+    http_client = _get_http_client()
+    cached = _fetch_cache(publish_site, http_client)
+    store = ArtifactStore(meta_folder.joinpath(artifacts_folder_name)).load()
+    index: Dict[str, List[BookRecord]] = {}
     recipe_descriptions = {}
     recipe_covers = {}
+    cover_thumbnails: Dict[str, List[ImageVariant]] = {}  # by cover file name
     generated: Dict[str, Dict[str, List[RecipeOutput]]] = {}
+    recipes: List[Recipe] = custom_recipes or default_recipes
 
     # skip specified recipes in CI
     skip_recipes_slugs: List[str] = _get_env_csv("skip")
@@ -412,374 +1726,332 @@ def run(
 
     accounts_info = _get_env_accounts_info()
 
-    recipes: List[Recipe] = custom_recipes or default_recipes
-    for recipe in recipes:
-        recipe_path = Path(f"{recipe.recipe}.recipe")
-        if not recipe.name:
+    history = _load_history()
+    plan, skipped_recipes = _plan_recipes(
+        custom_recipes or default_recipes,
+        cached,
+        job_log,
+        history,
+        skip_recipes_slugs,
+        regenerate_recipes_slugs,
+        max_workers,
+        budget,
+    )
+    for recipe in skipped_recipes:
+        logger.info(f"::group::{recipe.name}")
+        logger.info(f'[!] SKIPPED recipe: "{recipe.slug}"')
+        logger.info("::endgroup::")
+    planned_recipes: Dict[int, PlannedRecipe] = {id(p.recipe): p for p in plan.recipes}
+    plan_summary = format_plan(plan)
+    logger.info("::group::Plan")
+    logger.info(plan_summary)
+    logger.info("::endgroup::")
+
+    # buffer each recipe's output when other recipes or cache restores run at the
+    # same time, so that their log groups are written out whole and not interleaved
+    buffer_log = max_workers > 1 or any(not p.execute for p in plan.recipes)
+    fetch_results: Dict[int, RecipeFetchResult] = {}
+    process_futures: Dict[int, Future] = {}
+    # resolves to the list of conversion futures once a recipe has been post-processed
+    conversion_futures: Dict[int, Future] = {}
+    restored_records: Dict[int, List[BookRecord]] = {}
+    conversions_summary = ""
+    calibre_startup_saved = 0.0
+    http_metrics: List[RequestMetric] = []
+
+    # The recipes are executed in a pipeline: the network-bound fetch stage
+    # runs in threads and as each recipe's book is available, it is queued
+    # for the CPU-bound post-processing stage in a process pool, so that
+    # the two overlap. Conversions into the target formats are then queued
+    # to a separate bounded pool shared by all recipes.
+    cover_cache = CoverCache(meta_folder.joinpath(cover_cache_folder_name))
+    cover_cache.evict()
+    ArticleImageCache(meta_folder.joinpath(article_image_cache_folder_name)).evict()
+    RecipeResponseCache(response_cache_folder).evict()
+    cover_cache_hits: List[bool] = []
+
+    # one cover renderer in each post-processing process, reused for the whole run
+    with ProcessPoolExecutor(
+        initializer=init_cover_renderer,
+        initargs=(
+            LogoCache(meta_folder.joinpath(logo_cache_folder_name)),
+            cover_cache,
+        ),
+    ) as process_executor, ProcessPoolExecutor(
+        max_workers=max_conversion_workers
+    ) as conversion_executor, ThreadPoolExecutor(
+        max_workers=max_cache_workers
+    ) as cache_executor:
+
+        def _fetch(recipe: Recipe) -> RecipeFetchResult:
+            if not buffer_log:
+                logger.info(f"::group::{recipe.name}")
+            timeout = recipe.timeout
+            deadline = None
+            if adaptive_timeouts:
+                deadline = fetch_start_time + budget if budget else None
+                timeout = adaptive_timeout(
+                    recipe, history, deadline - timer() if deadline else None
+                )
+            return _fetch_recipe(
+                recipe,
+                planned_recipes[id(recipe)].execute,
+                publish_site,
+                cached,
+                http_client,
+                accounts_info,
+                verbose_mode,
+                buffer_log,
+                timeout,
+                deadline,
+                store,
+            )
+
+        def _queue_conversions(
+            process_job: RecipeProcessJob, conversions: Future, process_future: Future
+        ) -> None:
             try:
-                with recipe_path.open("r", encoding="utf-8") as f:
-                    recipe_source = f.read()
-                    mobj = re.search(
-                        r"\n_name\s=\s['\"](?P<name>.+)['\"]\n", recipe_source
-                    ) or re.search(
-                        r"\btitle\s+=\s+u?['\"](?P<name>.+)['\"]\n", recipe_source
-                    )
-                    if mobj:
-                        recipe.name = mobj.group("name")
-                    else:
-                        logger.warning(f"Unable to extract recipe name for {recipe}.")
-                        recipe.name = (
-                            f"{recipe.recipe}.recipe"  # set name to recipe file name
+                conversions.set_result(
+                    [
+                        conversion_executor.submit(_convert_recipe_output, job)
+                        for job in _get_conversion_jobs(
+                            process_job, process_future.result()
                         )
-            except FileNotFoundError:
-                logger.warning(
-                    f"Built-in recipes should be configured with a recipe name: {recipe.recipe}"
+                    ]
                 )
-                recipe.name = f"{recipe.recipe}.recipe"
-            except Exception:  # noqa, pylint: disable=broad-except
-                logger.exception("Error getting recipe name")
-                continue
-
-        if recipe_path.exists():
-            os.environ["newsrack_title_dt_format"] = recipe.title_date_format
-            os.environ["newsrack_title_dts_format"] = recipe.recipe_datetime_format
-
-        job_status = ""
-        recipe.last_run = job_log.get(recipe.slug, 0)
-        logger.info(f"::group::{recipe.name}")
-
-        if recipe.slug in skip_recipes_slugs:
-            logger.info(f'[!] SKIPPED recipe: "{recipe.slug}"')
+            except Exception as err:  # noqa, pylint: disable=broad-except
+                conversions.set_exception(err)
+
+        def _on_fetched(result: RecipeFetchResult) -> None:
+            if buffer_log:
+                # write out the buffered output of the recipe in one group
+                logger.info(f"::group::{result.recipe.name}")
+                sys.stdout.write(result.log_output)
             logger.info("::endgroup::")
-            job_summary += _add_recipe_summary(recipe, ":arrow_right_hook: Skipped")
-            continue
-
-        logger.info(f'{"-" * 20} Executing "{recipe.name}" recipe... {"-" * 30}')
-        recipe_start_time = timer()
-
-        if recipe.category not in generated:
-            generated[recipe.category] = {}
-        generated[recipe.category][recipe.name] = []
-        index[recipe.slug] = []
-
-        source_file_name = Path(f"{recipe.slug}.{recipe.src_ext}")
-        source_file_path = publish_folder.joinpath(source_file_name)
-        cmd = [
-            "ebook-convert",
-            str(recipe_path),
-            str(source_file_path),
-        ]
-        try:
-            recipe_account = accounts_info.get(recipe.slug, {})
-            recipe_username = recipe_account.get("username", None)
-            recipe_password = recipe_account.get("password", None)
-            if recipe_username and recipe_password:
-                cmd.extend(
-                    [f"--username={recipe_username}", f"--password={recipe_password}"]
+            fetch_results[id(result.recipe)] = result
+            if result.source_file and not result.exit_code:
+                records = _get_restored_records(
+                    result.recipe, result.source_file, cached
                 )
-        except:  # noqa, pylint: disable=bare-except
-            pass
-        if recipe.conv_options and recipe.conv_options.get(recipe.src_ext):
-            cmd.extend(recipe.conv_options[recipe.src_ext])
-        customised_css_filename = Path("static", f"{recipe.src_ext}.css")
-        if customised_css_filename.exists():
-            cmd.append(f"--extra-css={str(customised_css_filename)}")
-        if verbose_mode:
-            cmd.append("-vv")
-
-        exit_code = 0
-
-        # set recipe debug output folder
-        if verbose_mode:
-            os.environ["recipe_debug_folder"] = str(publish_folder.absolute())
-
-        cached_files = _get_cached_files(recipe, cached)
-
-        if not _find_output(publish_folder, recipe.slug, recipe.src_ext):
-            # existing file does not exist
-            try:
-                if (
-                    # regenerate restriction is not in place and recipe is enabled
-                    (recipe.is_enabled() and not regenerate_recipes_slugs)
-                    # regenerate restriction is in place and recipe is included
-                    or (
-                        regenerate_recipes_slugs
-                        and recipe.slug in regenerate_recipes_slugs
-                    )
-                    # not cached (so that we always have a copy available)
-                    or not cached_files
-                ):
-                    original_recipe_timeout = recipe.timeout
-                    for attempt in range(recipe.retry_attempts + 1):
-                        try:
-                            # run recipe
-                            exit_code = subprocess.call(
-                                cmd,
-                                timeout=recipe.timeout,
-                                stdout=sys.stdout,
-                                stderr=sys.stderr,
-                            )
-                            break
-                        except subprocess.TimeoutExpired:
-                            if attempt < recipe.retry_attempts:
-                                recipe_elapsed_time = timedelta(
-                                    seconds=timer() - recipe_start_time
-                                )
-                                wait_interval = ceil(recipe.timeout / 100)
-                                logger.warning(
-                                    f"TimeoutExpired fetching '{recipe.name}' "
-                                    f"after {humanize.precisedelta(recipe_elapsed_time)}. "
-                                    f"Retrying after {wait_interval}s..."
-                                )
-                                # increase recipe timeout by 10% on retry but up to a max of 20min
-                                recipe.timeout = max(int(1.1 * recipe.timeout), 20 * 60)
-                                time.sleep(max(min(wait_interval, 2), 10))
-                                continue
-                            raise
-                        finally:
-                            # it's not used anymore, but restore original timeout
-                            # value just in case
-                            recipe.timeout = original_recipe_timeout
-
-                    job_log[recipe.slug] = time.time()
+                if records:
+                    # already processed when cached, list them from the cached records
+                    restored_records[id(result.recipe)] = records
+                    return
+                process_job = _get_process_job(
+                    result.recipe,
+                    result.source_file,
+                    publish_site,
+                    today,
+                    verbose_mode,
+                )
+                process_future = process_executor.submit(
+                    _process_recipe_output, process_job
+                )
+                conversions: Future = Future()
+                process_future.add_done_callback(
+                    partial(_queue_conversions, process_job, conversions)
+                )
+                process_futures[id(result.recipe)] = process_future
+                conversion_futures[id(result.recipe)] = conversions
+
+        fetch_start_time = timer()
+        # cache restores are not limited by the recipe workers or concurrency groups,
+        # so start them all right away to overlap with the recipes that are executed
+        restore_futures = [
+            cache_executor.submit(_fetch, p.recipe)
+            for p in plan.recipes
+            if not p.execute
+        ]
+        _schedule_recipes(
+            [p.recipe for p in plan.recipes if p.execute],
+            _fetch,
+            max_workers,
+            _on_fetched,
+            restore_futures,
+        )
+        fetch_elapsed_time = timedelta(seconds=timer() - fetch_start_time)
 
-                else:
-                    # use cache
-                    logger.warning(f'Using cached copy for "{recipe.name}".')
-                    abort_recipe = _download_from_cache(
-                        recipe, cached, publish_site, cache_sess
-                    )
-                    if not abort_recipe:
-                        job_status = ":outbox_tray: From cache"
-                    else:
-                        recipe_elapsed_time = timedelta(
-                            seconds=timer() - recipe_start_time
-                        )
-                        logger.info(
-                            f'{"=" * 10} "{recipe.name}" recipe took {humanize.precisedelta(recipe_elapsed_time)} {"=" * 20}'
-                        )
-                        logger.info("::endgroup::")
-                        job_summary += _add_recipe_summary(
-                            recipe, ":x: Cache Timeout", recipe_elapsed_time
+        # collect results in the configured recipes order so that outputs are deterministic
+        for recipe in recipes:
+            if any(recipe is r for r in skipped_recipes):
+                job_summary += _add_recipe_summary(recipe, ":arrow_right_hook: Skipped")
+                continue
+            fetch_result = fetch_results.get(id(recipe))
+            if not fetch_result:
+                continue
+            if recipe.category not in generated:
+                generated[recipe.category] = {}
+            generated[recipe.category][recipe.name] = []
+            index[recipe.slug] = []
+            if fetch_result.last_run:
+                job_log[recipe.slug] = fetch_result.last_run
+            history_entry = _get_history_entry(fetch_result, run_id)
+            status = fetch_result.status
+            if planned_recipes[id(recipe)].deferred and fetch_result.source_file:
+                status = ":hourglass: Deferred to cache"
+                history_entry["deferred"] = True
+
+            records = restored_records.get(id(recipe))
+            if records:
+                for record in records:
+                    if record.cover and record.thumbnails:
+                        cover_thumbnails[record.cover] = [
+                            ImageVariant(**thumbnail) for thumbnail in record.thumbnails
+                        ]
+                    generated[recipe.category][recipe.name].append(
+                        RecipeOutput(
+                            recipe=recipe,
+                            title=record.title,
+                            file=Path(record.filename),
+                            rename_to=Path(record.filename),
+                            published_dt=datetime.fromtimestamp(
+                                record.published, tz=timezone.utc
+                            ),
+                            description=record.description,
+                            articles=record.articles,
                         )
-                        continue
-
-            except subprocess.TimeoutExpired:
-                logger.exception(f"[!] TimeoutExpired fetching '{recipe.name}'")
-                recipe_elapsed_time = timedelta(seconds=timer() - recipe_start_time)
-                logger.info(
-                    f'{"=" * 10} "{recipe.name}" recipe took {humanize.precisedelta(recipe_elapsed_time)} {"=" * 20}'
-                )
-                logger.info("::endgroup::")
+                    )
                 job_summary += _add_recipe_summary(
-                    recipe, ":x: Convert Timeout", recipe_elapsed_time
+                    recipe, status, fetch_result.duration
+                )
+                history.add(
+                    recipe.slug,
+                    sizes=_get_output_sizes(
+                        recipe.src_ext,
+                        Path(records[0].filename),
+                        [],
+                    ),
+                    articles=len(records[0].articles or []),
+                    **history_entry,
                 )
                 continue
-        else:
-            job_status = ":file_folder: From local"
-
-        # unset debug folder
-        if os.environ.get("recipe_debug_folder", ""):
-            del os.environ["recipe_debug_folder"]
 
-        source_file_paths = sorted(
-            _find_output(publish_folder, recipe.slug, recipe.src_ext)
-        )
-        if cached_files and not source_file_paths:
-            logger.warning(
-                f'Using cached copy for "{recipe.name}" because recipe has no output.'
-            )
-            # try to use cached copy if recipe does not have output
-            # for example FT(Print) has no weekend issue, so we'll try to keep the last issue
-            _ = _download_from_cache(recipe, cached, publish_site, cache_sess)
-            source_file_paths = sorted(
-                _find_output(publish_folder, recipe.slug, recipe.src_ext)
-            )
-            if source_file_paths:
-                exit_code = (
-                    0  # reset exit_code (not 0 because of failed recipe ebook-convert)
-                )
-                job_status = ":outbox_tray: From cache"
+            process_future = process_futures.get(id(recipe))
+            if not process_future:
+                history.add(recipe.slug, **history_entry)
+                if not fetch_result.source_file:
+                    job_summary += _add_recipe_summary(
+                        recipe, status, fetch_result.duration
+                    )
+                continue
 
-        if not source_file_paths:
-            logger.error(
-                f"Unable to find source generated: '/{recipe.slug}*.{recipe.src_ext}'"
-            )
-            recipe_elapsed_time = timedelta(seconds=timer() - recipe_start_time)
-            logger.info(
-                f'{"=" * 20} "{recipe.name}" recipe took {humanize.precisedelta(recipe_elapsed_time)} {"=" * 20}'
-            )
+            process_result: RecipeProcessResult = process_future.result()
+            conversion_results: List[RecipeConversionResult] = [
+                f.result() for f in conversion_futures[id(recipe)].result()
+            ]
+            logger.info(f"::group::{recipe.name} (post-processing)")
+            sys.stdout.write(process_result.log_output)
+            for conversion_result in conversion_results:
+                sys.stdout.write(conversion_result.log_output)
             logger.info("::endgroup::")
-            job_summary += _add_recipe_summary(
-                recipe, ":x: No output", recipe_elapsed_time
-            )
-            continue
-
-        source_file_path = source_file_paths[-1]
-        source_file_name = Path(source_file_path.name)
-        if not exit_code:
-            logger.debug(f'Get book meta info for "{source_file_path}"')
-            proc = subprocess.Popen(
-                ["ebook-meta", str(source_file_path)], stdout=subprocess.PIPE
-            )
-            meta_out = proc.stdout.read().decode("utf-8")  # type: ignore
-            mobj = re.search(
-                r"Published\s+:\s(?P<pub_date>\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})",
-                meta_out,
-            )
-            pub_date = today
-            if mobj:
-                pub_date = datetime.strptime(
-                    mobj.group("pub_date"), "%Y-%m-%dT%H:%M:%S"
-                ).replace(tzinfo=timezone.utc)
-            title = ""
-            mobj = re.search(r"Title\s+:\s(?P<title>.+)", meta_out)
-            if mobj:
-                title = mobj.group("title")
-            rename_file_name = Path(
-                f"{recipe.slug}-{pub_date:%Y-%m-%d}.{recipe.src_ext}"
-            )
-
-            comments = []
-            description = ""
-            mobj = re.search(r"Comments\s+:\s(?P<comments>.+)", meta_out, re.DOTALL)
-            if mobj:
-                try:
-                    comments = [
-                        c.strip()
-                        for c in mobj.group("comments").split("\n")
-                        if c.strip()
-                    ]
-                    description = (
-                        f"{comments[0]}"
-                        f'<ul><li>{"</li><li>".join(comments[1:-1])}</li></ul>'
-                        f"{linkify(comments[-1], callbacks=[_linkify_attrs])}"
-                    )
-                except:  # noqa, pylint: disable=bare-except
-                    pass
 
+            pub_date = process_result.published_dt
             generated[recipe.category][recipe.name].append(
                 RecipeOutput(
                     recipe=recipe,
-                    title=title,
-                    file=source_file_name,
-                    rename_to=rename_file_name,
+                    title=process_result.title,
+                    file=process_result.file,
+                    rename_to=process_result.rename_to,
                     published_dt=pub_date,
-                    description=description,
-                    articles=comments[1:-1],
+                    description=process_result.description,
+                    articles=process_result.comments[1:-1],
                 )
             )
-
-            pseudo_series_index = pub_date.year * 1000 + pub_date.timetuple().tm_yday
-            # (rename_file_name != source_file_name) checks that it is a newly generated file
-            # so that we don't regenerate the cover needlessly
-            if (
-                recipe.overwrite_cover
-                and title
-                and rename_file_name != source_file_name
-            ):
-                # customise cover
-                logger.debug(f'Setting cover for "{source_file_path}"')
-                try:
-                    cover_file_path = Path(f"{str(source_file_path)}.png")
-                    generate_cover(
-                        cover_file_path, title, recipe.cover_options, logger=logger
-                    )
-                    cover_cmd = [
-                        "ebook-meta",
-                        str(source_file_path),
-                        f"--cover={str(cover_file_path)}",
-                        f"--series={recipe.name}",
-                        f"--index={pseudo_series_index}",
-                        f"--publisher={publish_site}",
-                    ]
-                    _ = subprocess.call(cover_cmd, stdout=subprocess.PIPE)
-                    cover_file_path.unlink()
-                except Exception:  # noqa, pylint: disable=broad-except
-                    logger.exception("Error generating cover")
-            elif rename_file_name != source_file_name:
-                # just set series name
-                series_cmd = [
-                    "ebook-meta",
-                    str(source_file_path),
-                    f"--series={recipe.name}",
-                    f"--index={pseudo_series_index}",
-                    f"--publisher={publish_site}",
-                ]
-                _ = subprocess.call(series_cmd, stdout=subprocess.PIPE)
-
-            index[recipe.slug].append(
-                {
-                    "filename": f"{recipe.slug}-{pub_date:%Y-%m-%d}.{recipe.src_ext}",
-                    "published": pub_date.timestamp(),
-                }
+            calibre_startup_saved += process_result.calibre_startup_saved + sum(
+                [c.calibre_startup_saved for c in conversion_results]
             )
-
-            # convert generate book into alternative formats
-            for ext in recipe.target_ext:
-                target_file_name = Path(f"{recipe.slug}.{ext}")
-                target_file_path = Path(publish_folder, target_file_name)
-
-                cmd = [
-                    "ebook-convert",
-                    str(source_file_path),
-                    str(target_file_path),
-                    f"--series={recipe.name}",
-                    f"--series-index={pseudo_series_index}",
-                    f"--publisher={publish_site}",
-                ]
-                if recipe.conv_options and recipe.conv_options.get(ext):
-                    cmd.extend(recipe.conv_options[ext])
-
-                customised_css_filename = Path("static", f"{ext}.css")
-                if customised_css_filename.exists():
-                    cmd.append(f"--extra-css={str(customised_css_filename)}")
-                if verbose_mode:
-                    cmd.append("-vv")
-                if not _find_output(publish_folder, recipe.slug, ext):
-                    exit_code = subprocess.call(
-                        cmd,
-                        timeout=recipe.timeout,
-                        stdout=sys.stdout,
-                        stderr=sys.stderr,
-                    )
-
-                if not exit_code:
-                    target_file_path = sorted(
-                        _find_output(publish_folder, recipe.slug, ext)
-                    )[-1]
-                    target_file_name = Path(target_file_path.name)
-
-                    generated[recipe.category][recipe.name].append(
-                        RecipeOutput(
-                            recipe=recipe,
-                            title=title,
-                            file=target_file_name,
-                            rename_to=f"{recipe.slug}-{pub_date:%Y-%m-%d}.{ext}",
-                            published_dt=pub_date,
-                            description=comments,
-                            articles=comments[1:-1],
-                        )
-                    )
-                    index[recipe.slug].append(
-                        {
-                            "filename": f"{recipe.slug}-{pub_date:%Y-%m-%d}.{ext}",
-                            "published": pub_date.timestamp(),
-                        }
+            http_metrics.extend(process_result.http_metrics)
+            if process_result.cover_cache_hit is not None:
+                cover_cache_hits.append(process_result.cover_cache_hit)
+            for conversion_result in conversion_results:
+                conversions_summary += _add_conversion_summary(
+                    recipe, conversion_result
+                )
+                if not conversion_result.file:
+                    continue
+                generated[recipe.category][recipe.name].append(
+                    RecipeOutput(
+                        recipe=recipe,
+                        title=process_result.title,
+                        file=conversion_result.file,
+                        rename_to=Path(
+                            f"{recipe.slug}-{pub_date:%Y-%m-%d}.{conversion_result.ext}"
+                        ),
+                        published_dt=pub_date,
+                        description=process_result.description,
+                        articles=process_result.comments[1:-1],
                     )
-
-            recipe_elapsed_time = timedelta(seconds=timer() - recipe_start_time)
-            logger.info(
-                f'{"=" * 20} "{recipe.name}" recipe took {humanize.precisedelta(recipe_elapsed_time)} {"=" * 20}'
-            )
-            logger.info("::endgroup::")
+                )
             job_summary += _add_recipe_summary(
                 recipe,
-                job_status or ":white_check_mark: Completed",
-                recipe_elapsed_time,
+                status,
+                fetch_result.duration
+                + process_result.duration
+                + sum([c.duration for c in conversion_results], timedelta()),
+            )
+            history.add(
+                recipe.slug,
+                conversions={
+                    c.ext: round(c.duration.total_seconds(), 3)
+                    for c in conversion_results
+                    if c.file
+                },
+                sizes=_get_output_sizes(
+                    recipe.src_ext, process_result.file, conversion_results
+                ),
+                articles=len(process_result.comments[1:-1]),
+                **history_entry,
+            )
+
+    job_summary += (
+        f"\n{plan_summary}Actual {humanize.precisedelta(fetch_elapsed_time)}.\n"
+    )
+    if conversions_summary:
+        job_summary += (
+            "\n| Conversion | Format | Duration |\n| ---------- | ------ | -------- |\n"
+            + conversions_summary
+        )
+    stats_summary = "".join(
+        [
+            _add_stats_summary(p.recipe, stats)
+            for p, stats in zip(
+                plan.recipes,
+                get_recipe_stats([p.recipe.slug for p in plan.recipes], history),
             )
+            if p.execute
+        ]
+    )
+    if stats_summary:
+        job_summary += (
+            "\n| Recipe | p50 | p95 | Trend |\n| ------ | --- | --- | ----- |\n"
+            + stats_summary
+        )
 
     static_assets_start_time = timer()
+    # extract the default covers not generated by newsrack, for all books at once
+    site_covers: Dict[Path, List[Path]] = {}
+    for publications in generated.values():
+        for books in publications.values():
+            for book in books:
+                cover_file_path = publish_folder.joinpath(
+                    f"{publish_folder.joinpath(book.rename_to).stem}.jpg"
+                )
+                if (not book.recipe.overwrite_cover) and (not cover_file_path.exists()):
+                    site_covers.setdefault(cover_file_path, []).append(
+                        publish_folder.joinpath(book.file)
+                    )
+    with ThreadPoolExecutor(max_workers=max_conversion_workers) as cover_executor:
+        for cover_file_path, thumbnails in zip(
+            site_covers.keys(),
+            cover_executor.map(
+                _extract_site_cover,
+                site_covers.values(),
+                site_covers.keys(),
+                [p.with_suffix(".thumb.jpg") for p in site_covers.keys()],
+            ),
+        ):
+            cover_thumbnails[cover_file_path.name] = thumbnails
+
     # generate index.html
     lunr_documents = []
     listing = ""
@@ -810,72 +2082,18 @@ def run(
                 cover_file_name = Path(f"{book_rename_to.stem}.jpg")
                 cover_file_path = publish_folder.joinpath(cover_file_name)
                 cover_thumbnail_file_name = Path(f"{book_rename_to.stem}.thumb.jpg")
-                cover_thumbnail_file_path = publish_folder.joinpath(
-                    cover_thumbnail_file_name
-                )
-                if (not book.recipe.overwrite_cover) and (not cover_file_path.exists()):
-                    # only extract default cover not generated by newsrack
-                    cover_get_cmd = [
-                        "ebook-meta",
-                        f"--get-cover={str(cover_file_path)}",
-                        str(book_rename_to),
-                    ]
-                    try:
-                        _ = subprocess.call(cover_get_cmd, stdout=subprocess.PIPE)
-                        temp_cover_file_name = Path(f"{book_rename_to.stem}.temp.jpg")
-                        temp_cover_file_path = publish_folder.joinpath(
-                            temp_cover_file_name
-                        )
-                        imagemagick_cmd = [
-                            "convert",
-                            str(cover_file_path),
-                            "-quality",
-                            "70",
-                            "-resize",
-                            "1024x1024>",
-                            "-unsharp",
-                            "0x.5",
-                            "-strip",
-                            str(temp_cover_file_path),
-                        ]
-                        exit_code = subprocess.call(imagemagick_cmd)
-                        if exit_code:
-                            logger.warning(
-                                "convert exited with the code: {0!s}".format(exit_code)
-                            )
-                        else:
-                            temp_cover_file_path.rename(cover_file_path)
-                        imagemagick_cmd = [
-                            "convert",
-                            str(cover_file_path),
-                            "-quality",
-                            "80",
-                            "-thumbnail",
-                            "500x500>",
-                            "-unsharp",
-                            "0x.5",
-                            str(cover_thumbnail_file_path),
-                        ]
-                        exit_code = subprocess.call(imagemagick_cmd)
-                        if exit_code:
-                            logger.warning(
-                                "convert (thumbnail) exited with the code: {0!s}".format(
-                                    exit_code
-                                )
-                            )
-                    except (
-                        Exception  # noqa, pylint: disable=broad-except
-                    ) as get_cover_err:
-                        logger.warning(
-                            "Unable to extract cover for %s: %s",
-                            book.rename_to,
-                            str(get_cover_err),
-                        )
                 if (not book.recipe.overwrite_cover) and cover_file_path.exists():
-                    recipe_covers[book.recipe.slug] = {
-                        "cover": str(cover_file_name),
-                        "thumbnail": str(cover_thumbnail_file_name),
-                    }
+                    # e.g. thumbnails that could not be restored from cache
+                    cover_thumbnails[str(cover_file_name)] = [
+                        thumbnail
+                        for thumbnail in cover_thumbnails.get(str(cover_file_name), [])
+                        if publish_folder.joinpath(thumbnail.file_name).exists()
+                    ]
+                    recipe_covers[book.recipe.slug] = _get_site_cover(
+                        str(cover_file_name),
+                        str(cover_thumbnail_file_name),
+                        cover_thumbnails[str(cover_file_name)],
+                    )
 
                 file_size = book_rename_to.stat().st_size
                 book_ext = book_file.suffix
@@ -948,11 +2166,33 @@ def run(
     ) as f_lunr_index:
         json.dump(lunr_documents, f_lunr_index)
 
-    with publish_folder.joinpath(index_json_filename).open(
-        "w", encoding="utf-8"
-    ) as f_in:
-        index["_generated"] = int(time.time())
-        json.dump(index, f_in, indent=0)
+    # record each book in full so that it can be restored without being processed,
+    # and keep a copy for the next runs
+    for publications in generated.values():
+        for books in publications.values():
+            for book in books:
+                book_path = publish_folder.joinpath(book.rename_to)
+                covers = recipe_covers.get(book.recipe.slug, {})
+                thumbnails = cover_thumbnails.get(covers.get("cover", ""), [])
+                record = BookRecord(
+                    filename=str(book.rename_to),
+                    published=book.published_dt.timestamp(),
+                    title=book.title,
+                    description=book.description,
+                    articles=book.articles,
+                    cover=covers.get("cover"),
+                    thumbnail=covers.get("thumbnail"),
+                    thumbnails=[dataclasses.asdict(t) for t in thumbnails] or None,
+                    tags=book.recipe.tags,
+                )
+                if book_path.exists():
+                    record.size = book_path.stat().st_size
+                    record.sha256 = store.add(book_path)
+                index[book.recipe.slug].append(record)
+    store.evict()
+    store.save()
+
+    write_index(index, publish_folder.joinpath(index_json_filename))
 
     elapsed_time = timedelta(seconds=timer() - start_time)
 
@@ -960,6 +2200,7 @@ def run(
         meta_folder.mkdir(parents=True, exist_ok=True)
     with meta_folder.joinpath(job_log_filename).open("w", encoding="utf-8") as f:
         json.dump(job_log, f, indent=0)
+    history.save()
 
     site_css = "static/site.css"
     if os.path.exists("static/custom.css"):
@@ -1022,6 +2263,23 @@ def run(
     static_assets_elapsed_time = timedelta(seconds=timer() - static_assets_start_time)
 
     job_summary += f'\nStatic assets took {humanize.naturaldelta(static_assets_elapsed_time, minimum_unit="seconds")}.\n'
+    if store.hits or store.misses:
+        job_summary += (
+            f"\n{store.hits} cached books restored from the artifact store, "
+            f"{store.misses} not found in it.\n"
+        )
+    calibre_startup_saved += _calibre.startup_saved()
+    if calibre_startup_saved:
+        job_summary += f"\nThe calibre worker saved {humanize.precisedelta(timedelta(seconds=calibre_startup_saved))} of startup time.\n"
+    if cover_cache_hits:
+        job_summary += (
+            f"\n{cover_cache_hits.count(True)} of {len(cover_cache_hits)} covers "
+            f"reused from the cover cache "
+            f"({cover_cache_hits.count(True) / len(cover_cache_hits):.0%}).\n"
+        )
+    http_summary = http_client.summary(http_client.metrics + http_metrics)
+    if http_summary:
+        job_summary += f"\n{http_summary}"
 
     with open("job_summary.md", "w", encoding="utf-8") as f:
         f.write(job_summary)
@@ -1029,12 +2287,13 @@ def run(
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument("publish_site", type=str, help="Deployment site url")
-    parser.add_argument("repo_url", type=str, help="Source repo url")
-    parser.add_argument("commit_hash", type=str, help="Commit hash")
-    parser.add_argument("commit_url", type=str, help="URL for the commit")
-    parser.add_argument("run_id", type=str, help="Run ID")
-    parser.add_argument("run_url", type=str, help="URL for the job run")
+    # optional with --plan
+    parser.add_argument("publish_site", type=str, nargs="?", help="Deployment site url")
+    parser.add_argument("repo_url", type=str, nargs="?", help="Source repo url")
+    parser.add_argument("commit_hash", type=str, nargs="?", help="Commit hash")
+    parser.add_argument("commit_url", type=str, nargs="?", help="URL for the commit")
+    parser.add_argument("run_id", type=str, nargs="?", help="Run ID")
+    parser.add_argument("run_url", type=str, nargs="?", help="URL for the job run")
     parser.add_argument(
         "-v",
         "--verbose",
@@ -1042,7 +2301,52 @@ if __name__ == "__main__":
         action="store_true",
         help="Enable more verbose messages for debugging",
     )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        dest="workers",
+        type=int,
+        default=1,
+        help="Number of recipes to execute concurrently",
+    )
+    parser.add_argument(
+        "--budget-minutes",
+        dest="budget_minutes",
+        type=float,
+        default=0,
+        help="Time available for executing recipes, recipes that will not fit are deferred to cache",
+    )
+    parser.add_argument(
+        "--adaptive-timeouts",
+        dest="adaptive_timeouts",
+        action="store_true",
+        help="Set recipe timeouts from their previous durations instead of the configured timeout",
+    )
+    parser.add_argument(
+        "--plan",
+        dest="plan",
+        action="store_true",
+        help="Print the execution plan without executing any recipe",
+    )
+    parser.add_argument(
+        "--index",
+        dest="index",
+        type=Path,
+        help="index.json to plan with, defaults to the one in the publish folder, "
+        "else the one on the publish site",
+    )
     args = parser.parse_args()
+    positionals = [
+        "publish_site",
+        "repo_url",
+        "commit_hash",
+        "commit_url",
+        "run_id",
+        "run_url",
+    ]
+    missing = [name for name in positionals if getattr(args, name) is None]
+    if missing and not args.plan:
+        parser.error(f"the following arguments are required: {', '.join(missing)}")
 
     try:
         verbose = str(os.environ["verbose"]).strip().lower() == "true"
@@ -1053,6 +2357,27 @@ if __name__ == "__main__":
     if verbose:
         logger.setLevel(logging.DEBUG)
 
+    try:
+        workers = int(os.environ["workers"])
+    except (KeyError, ValueError):
+        workers = args.workers
+
+    try:
+        budget_minutes = float(os.environ["budget_minutes"])
+    except (KeyError, ValueError):
+        budget_minutes = args.budget_minutes
+
+    try:
+        adaptive_timeouts = (
+            str(os.environ["adaptive_timeouts"]).strip().lower() == "true"
+        )
+    except (KeyError, ValueError):
+        adaptive_timeouts = args.adaptive_timeouts
+
+    if args.plan:
+        dry_run(args.publish_site, max(1, workers), budget_minutes * 60, args.index)
+        sys.exit(0)
+
     run(
         args.publish_site,
         args.repo_url,
@@ -1061,4 +2386,7 @@ if __name__ == "__main__":
         args.run_id,
         args.run_url,
         verbose,
+        max(1, workers),
+        budget_minutes * 60,
+        adaptive_timeouts or args.adaptive_timeouts,
     )
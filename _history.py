@@ -0,0 +1,272 @@
+# Copyright (c) 2022 https://github.com/ping/
+#
+# This software is released under the GNU General Public License v3.0
+# https://opensource.org/licenses/GPL-3.0
+
+# Per-recipe run history, persisted in meta/ between runs
+import json
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from statistics import median
+from typing import Dict, List, Optional
+
+history_filename = "history.jsonl"
+estimate_sample_size = 10  # number of recent runs used to estimate a recipe's duration
+max_entries_per_recipe = 60  # entries kept per recipe when the history is compacted
+compact_threshold = 2  # compact when a recipe has this many times the max entries
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """
+    Percentile with linear interpolation between the closest ranks.
+
+    :param values:
+    :param pct: 0-100
+    :return:
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+@dataclass
+class RecipeStats:
+    """Summary statistics for a recipe's executions"""
+
+    slug: str
+    runs: int  # number of executions
+    p50: Optional[float]  # duration in seconds
+    p95: Optional[float]  # duration in seconds
+    trend: Optional[float]  # recent p50 / previous p50, e.g. 1.2 means 20% slower
+    failures: int  # executions that timed out or exited with an error
+    cache_hits: int  # runs where the recipe was restored from cache
+    last_size: Optional[int]  # size in bytes of the largest output of the last run
+
+
+class RecipeHistory:
+    """
+    Append-only history of recipe runs, stored as json lines.
+    The file is compacted to the most recent entries of each recipe when it grows too large.
+
+    Each entry is a dict with:
+        - slug: recipe slug
+        - ts: unix timestamp
+        - run_id: CI run ID
+        - duration: fetch (recipe execution) duration in seconds, only if executed,
+                    of the successful attempt or the shortest if all attempts timed out
+        - attempts: duration in seconds of each attempt, only if retried
+        - exit_code: ebook-convert exit code, None if timed out
+        - retries: number of retries on timeout
+        - cache_hit: True if restored from cache instead of executed
+        - deferred: True if deferred to cache to fit the run budget
+        - conversions: {format: conversion duration in seconds}
+        - sizes: {format: size in bytes}
+        - articles: number of articles
+    """
+
+    def __init__(self, file_path: Path):
+        self.file_path = file_path
+        self.entries: Dict[str, List[Dict]] = {}
+        self.new_entries: List[Dict] = []
+
+    def load(self) -> "RecipeHistory":
+        """
+        Load history from file_path.
+
+        :return:
+        """
+        with self.file_path.open("r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # skip partially written lines
+                    continue
+                self.entries.setdefault(entry["slug"], []).append(entry)
+        return self
+
+    def add(self, slug: str, duration: Optional[float] = None, **kwargs) -> Dict:
+        """
+        Record a recipe run.
+
+        :param slug: Recipe slug
+        :param duration: Time taken to execute the recipe in seconds, None if not executed
+        :param kwargs: Other entry values, e.g. exit_code, retries, cache_hit
+        :return:
+        """
+        entry: Dict = {"slug": slug, "ts": time.time()}
+        if duration is not None:
+            entry["duration"] = round(duration, 3)
+        entry.update(kwargs)
+        self.entries.setdefault(slug, []).append(entry)
+        self.new_entries.append(entry)
+        return entry
+
+    def durations(self, slug: str) -> List[float]:
+        """
+        Recorded execution durations for a recipe, oldest first.
+
+        :param slug:
+        :return:
+        """
+        return [e["duration"] for e in self.entries.get(slug, []) if "duration" in e]
+
+    def deferred_runs(self, slug: str) -> int:
+        """
+        Number of runs a recipe has been deferred to cache since it was last executed.
+
+        :param slug:
+        :return:
+        """
+        deferred = 0
+        for entry in reversed(self.entries.get(slug, [])):
+            if "duration" in entry:
+                break
+            if entry.get("deferred"):
+                deferred += 1
+        return deferred
+
+    def estimate_duration(self, slug: str) -> Optional[float]:
+        """
+        Estimated duration of the next run of a recipe, based on recent runs.
+
+        :param slug:
+        :return:
+        """
+        durations = self.durations(slug)[-estimate_sample_size:]
+        if not durations:
+            return None
+        return median(durations)
+
+    def percentile(
+        self, slug: str, pct: float, sample_size: int = estimate_sample_size
+    ) -> Optional[float]:
+        """
+        Duration percentile of a recipe's recent executions, e.g. p95.
+
+        :param slug:
+        :param pct: 0-100
+        :param sample_size: Number of recent executions used
+        :return:
+        """
+        return percentile(self.durations(slug)[-sample_size:], pct)
+
+    def conversion_percentile(
+        self, slug: str, ext: str, pct: float, sample_size: int = estimate_sample_size
+    ) -> Optional[float]:
+        """
+        Duration percentile of a recipe's recent conversions to the ext format.
+
+        :param slug:
+        :param ext:
+        :param pct: 0-100
+        :param sample_size: Number of recent conversions used
+        :return:
+        """
+        durations = [
+            e["conversions"][ext]
+            for e in self.entries.get(slug, [])
+            if ext in (e.get("conversions") or {})
+        ]
+        return percentile(durations[-sample_size:], pct)
+
+    def trend(
+        self, slug: str, sample_size: int = estimate_sample_size
+    ) -> Optional[float]:
+        """
+        Ratio of the median of the recent executions to the median of
+        the executions before them, e.g. 1.5 means 50% slower.
+
+        :param slug:
+        :param sample_size: Number of executions in each window
+        :return:
+        """
+        durations = self.durations(slug)
+        if len(durations) < 2:
+            return None
+        window = min(sample_size, len(durations) // 2)
+        recent = median(durations[-window:])
+        previous = median(durations[-2 * window : -window])
+        if not previous:
+            return None
+        return recent / previous
+
+    def last_sizes(self, slug: str) -> Dict[str, int]:
+        """
+        Output sizes by format from the last run that generated outputs.
+
+        :param slug:
+        :return:
+        """
+        sizes = [e["sizes"] for e in self.entries.get(slug, []) if e.get("sizes")]
+        return sizes[-1] if sizes else {}
+
+    def stats(self, slug: str) -> RecipeStats:
+        """
+        Summary statistics for a recipe.
+
+        :param slug:
+        :return:
+        """
+        entries = self.entries.get(slug, [])
+        sizes = self.last_sizes(slug)
+        return RecipeStats(
+            slug=slug,
+            runs=len(self.durations(slug)),
+            p50=self.percentile(slug, 50),
+            p95=self.percentile(slug, 95),
+            trend=self.trend(slug),
+            failures=len(
+                [e for e in entries if "duration" in e and e.get("exit_code", 0) != 0]
+            ),
+            cache_hits=len([e for e in entries if e.get("cache_hit")]),
+            last_size=max(sizes.values()) if sizes else None,
+        )
+
+    def compact(self) -> None:
+        """
+        Rewrite the history file with only the most recent entries of each recipe.
+
+        :return:
+        """
+        self.entries = {
+            slug: entries[-max_entries_per_recipe:]
+            for slug, entries in self.entries.items()
+        }
+        temp_file_path = self.file_path.with_name(f".{self.file_path.name}.tmp")
+        with temp_file_path.open("w", encoding="utf-8") as f:
+            for entry in sorted(
+                [e for entries in self.entries.values() for e in entries],
+                key=lambda e: e["ts"],
+            ):
+                f.write(json.dumps(entry) + "\n")
+        os.replace(temp_file_path, self.file_path)
+        self.new_entries = []
+
+    def save(self) -> None:
+        """
+        Append new entries to file_path, compacting it if required.
+
+        :return:
+        """
+        if not self.new_entries:
+            return
+        self.file_path.parent.mkdir(parents=True, exist_ok=True)
+        if any(
+            len(entries) > compact_threshold * max_entries_per_recipe
+            for entries in self.entries.values()
+        ):
+            self.compact()
+            return
+        with self.file_path.open("a", encoding="utf-8") as f:
+            for entry in self.new_entries:
+                f.write(json.dumps(entry) + "\n")
+        self.new_entries = []
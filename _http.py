@@ -0,0 +1,268 @@
+# Copyright (c) 2022 https://github.com/ping/
+#
+# This software is released under the GNU General Public License v3.0
+# https://opensource.org/licenses/GPL-3.0
+
+# Shared HTTP client for the build script, with connection pooling, retries with
+# exponential backoff and per-request metrics for the job summary.
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+from dataclasses import dataclass
+from timeit import default_timer as timer
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import urlparse
+
+import humanize  # type: ignore
+import requests  # type: ignore
+
+from _history import percentile
+
+default_timeout = 30  # seconds
+default_pool_size = 10  # max connections per host
+default_retry_attempts = 2
+default_backoff = 2  # seconds, doubled on each retry
+max_backoff = 30  # seconds
+retry_status_codes = [408, 429, 500, 502, 503, 504]
+# errors worth retrying, e.g. timeouts, connection aborted, connection broken
+retry_exceptions = (
+    requests.exceptions.Timeout,
+    requests.exceptions.ConnectionError,
+    requests.exceptions.ChunkedEncodingError,
+)
+
+logger = logging.getLogger(__file__)
+
+
+@dataclass
+class RequestMetric:
+    host: str
+    method: str
+    status: Optional[int]  # None if no response was received
+    duration: float  # seconds, until the response headers were received
+    size: int = 0  # bytes of content received
+    error: str = ""
+
+
+class HttpClient:
+    """
+    requests.Session wrapper that retries failed requests and records metrics
+    for every request, including each retry.
+    """
+
+    def __init__(
+        self,
+        timeout: float = default_timeout,
+        host_timeouts: Optional[Dict[str, float]] = None,
+        pool_size: int = default_pool_size,
+        retry_attempts: int = default_retry_attempts,
+        backoff: float = default_backoff,
+    ):
+        """
+        :param timeout: Default timeout in seconds
+        :param host_timeouts: Timeouts by host name, e.g. {"example.com": 60}
+        :param pool_size: Max connections kept open per host
+        :param retry_attempts: Default number of retries
+        :param backoff: Base wait in seconds before a retry
+        """
+        self.timeout = timeout
+        self.host_timeouts = host_timeouts or {}
+        self.retry_attempts = retry_attempts
+        self.backoff = backoff
+        self.session = requests.Session()
+        # compressed responses are decoded transparently by requests
+        self.session.headers.update(
+            {"User-Agent": "Mozilla/5.0", "Accept-Encoding": "gzip, deflate"}
+        )
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.metrics: List[RequestMetric] = []
+        self.lock = threading.Lock()
+        self._streams: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def timeout_for(self, url: str) -> float:
+        return self.host_timeouts.get(urlparse(url).hostname or "", self.timeout)
+
+    def wait_interval(
+        self, attempt: int, res: Optional[requests.Response] = None
+    ) -> float:
+        """
+        Seconds to wait before a retry: exponential backoff with jitter so that
+        concurrent retries spread out, or the server's Retry-After if any.
+
+        :param attempt: 0-based number of the failed attempt
+        :param res: The failed response, if any
+        :return:
+        """
+        retry_after = res.headers.get("Retry-After", "") if res is not None else ""
+        if retry_after.isdigit():
+            return min(int(retry_after), max_backoff)
+        return min(self.backoff * (2**attempt), max_backoff) + random.uniform(0, 1)
+
+    def _record(self, metric: RequestMetric) -> None:
+        with self.lock:
+            self.metrics.append(metric)
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        retry_attempts: Optional[int] = None,
+        log: logging.Logger = logger,
+        **kwargs,
+    ) -> requests.Response:
+        """
+        Send a request, retrying on timeouts, connection errors and
+        server errors. Other HTTP errors are raised without retrying.
+
+        :param method:
+        :param url:
+        :param retry_attempts: Defaults to the client's retry_attempts
+        :param log:
+        :param kwargs: requests arguments, e.g. headers, stream, timeout
+        :return:
+        """
+        retry_attempts = (
+            self.retry_attempts if retry_attempts is None else retry_attempts
+        )
+        kwargs.setdefault("timeout", self.timeout_for(url))
+        host = urlparse(url).hostname or ""
+        attempt = 0
+        while True:
+            res = None
+            metric = RequestMetric(host=host, method=method, status=None, duration=0)
+            self._record(metric)
+            start_time = timer()
+            try:
+                res = self.session.request(method, url, **kwargs)
+                metric.status = res.status_code
+                metric.duration = timer() - start_time
+                if kwargs.get("stream"):
+                    self._streams[res] = metric
+                else:
+                    metric.size = len(res.content)
+                res.raise_for_status()
+                return res
+            except retry_exceptions + (requests.exceptions.HTTPError,) as err:
+                metric.error = err.__class__.__name__
+                metric.duration = metric.duration or timer() - start_time
+                if (
+                    isinstance(err, requests.exceptions.HTTPError)
+                    and err.response.status_code not in retry_status_codes
+                ) or attempt >= retry_attempts:
+                    raise
+                wait_interval = self.wait_interval(attempt, res)
+                log.warning(
+                    f"{err.__class__.__name__} for {method} {url}. "
+                    f"Retrying after {wait_interval:.1f}s..."
+                )
+                if res is not None:
+                    res.close()
+                time.sleep(wait_interval)
+                attempt += 1
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def iter_content(self, res: requests.Response, chunk_size: int) -> Iterator[bytes]:
+        """
+        Content of a streamed response, counted in the request's metric.
+
+        :param res: Response of a request made with stream=True
+        :param chunk_size:
+        :return:
+        """
+        metric = self._streams.get(res)
+        try:
+            for chunk in res.iter_content(chunk_size=chunk_size):
+                if metric:
+                    metric.size += len(chunk)
+                yield chunk
+        except retry_exceptions as err:
+            if metric:
+                metric.error = err.__class__.__name__
+            raise
+
+    def summary(self, metrics: Optional[List[RequestMetric]] = None) -> str:
+        """
+        Markdown table of the request metrics by host.
+
+        :param metrics: Defaults to all the requests made by this client
+        :return:
+        """
+        metrics = self.metrics if metrics is None else metrics
+        by_host: Dict[str, List[RequestMetric]] = {}
+        for metric in metrics:
+            by_host.setdefault(metric.host, []).append(metric)
+        if not by_host:
+            return ""
+        summary = (
+            "| Host | Requests | Errors | Downloaded | p50 | p95 |\n"
+            "| ---- | -------- | ------ | ---------- | --- | --- |\n"
+        )
+        for host, host_metrics in sorted(by_host.items()):
+            durations = [m.duration for m in host_metrics]
+            summary += (
+                f"| {host} | {len(host_metrics)} "
+                f"| {len([m for m in host_metrics if m.error])} "
+                f"| {humanize.naturalsize(sum([m.size for m in host_metrics]))} "
+                f"| {percentile(durations, 50):.2f}s "
+                f"| {percentile(durations, 95):.2f}s |\n"
+            )
+        return summary
+
+
+_client: Optional[HttpClient] = None
+_client_pid: Optional[int] = None
+
+
+def get_env_host_timeouts() -> Dict[str, float]:
+    """
+    Timeouts by host from the http_timeouts env, as csv of host=seconds,
+    e.g. "example.com=60,cdn.example.net=120".
+
+    :return:
+    """
+    host_timeouts: Dict[str, float] = {}
+    for host_timeout in os.environ.get("http_timeouts", "").split(","):
+        if not host_timeout.strip():
+            continue
+        host, _, timeout = host_timeout.partition("=")
+        try:
+            host_timeouts[host.strip().lower()] = float(timeout)
+        except ValueError:
+            logger.warning(f"Invalid http_timeouts value: {host_timeout.strip()}")
+    return host_timeouts
+
+
+def get_client() -> HttpClient:
+    """
+    The HTTP client for the current process, created on first use with the
+    timeouts by host from the env. A forked or spawned process, e.g. of a
+    process pool, gets its own client instead of sharing the pooled connections.
+
+    :return:
+    """
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        _client = HttpClient(host_timeouts=get_env_host_timeouts())
+        _client_pid = os.getpid()
+    return _client
+
+
+def set_client(client: HttpClient) -> None:
+    """
+    Replace the HTTP client of the current process, e.g. in tests.
+
+    :param client:
+    :return:
+    """
+    global _client, _client_pid
+    _client = client
+    _client_pid = os.getpid()
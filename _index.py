@@ -0,0 +1,89 @@
+# Copyright (c) 2022 https://github.com/ping/
+#
+# This software is released under the GNU General Public License v3.0
+# https://opensource.org/licenses/GPL-3.0
+
+# Read/write the index.json published with the site. From version 2, the index
+# carries the full record of each book so that books restored from cache do not
+# need to have their metadata extracted again.
+import json
+import time
+from dataclasses import asdict, dataclass, field, fields
+from pathlib import Path
+from typing import Dict, List, Optional
+
+index_version = 2
+
+
+@dataclass
+class BookRecord:
+    filename: str
+    published: float  # timestamp
+    size: Optional[int] = None  # bytes
+    sha256: Optional[str] = None
+    # from version 2
+    title: Optional[str] = None
+    description: Optional[str] = None  # html
+    articles: Optional[List[str]] = None
+    cover: Optional[str] = None  # file name, only for covers extracted from the book
+    thumbnail: Optional[str] = None
+    # responsive variants of the thumbnail: file_name, media_type, width, height
+    thumbnails: Optional[List[Dict]] = None
+    tags: List[str] = field(default_factory=list)
+
+    @property
+    def complete(self) -> bool:
+        """
+        True if the record has everything needed to list the book without
+        reading its metadata, i.e. it was written by index version 2 or later.
+
+        :return:
+        """
+        return self.description is not None and self.articles is not None
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "BookRecord":
+        names = [f.name for f in fields(cls)]
+        return cls(**{k: v for k, v in data.items() if k in names})
+
+    def to_dict(self) -> Dict:
+        return {k: v for k, v in asdict(self).items() if v is not None}
+
+
+def read_index(data: Dict) -> Dict[str, List[BookRecord]]:
+    """
+    Parse the books in an index.json, including the original version
+    that only has the filename and published timestamp of each book.
+
+    :param data: Parsed index.json
+    :return: dict of recipe slug: list of book records
+    """
+    index: Dict[str, List[BookRecord]] = {}
+    for slug, items in data.items():
+        if slug.startswith("_") or not isinstance(items, list):
+            # metadata, e.g. _version, _generated
+            continue
+        index[slug] = [
+            BookRecord.from_dict(item)
+            for item in items
+            if isinstance(item, dict) and item.get("filename")
+        ]
+    return index
+
+
+def write_index(index: Dict[str, List[BookRecord]], file_path: Path) -> None:
+    """
+    Write out index.json.
+
+    :param index: dict of recipe slug: list of book records
+    :param file_path:
+    :return:
+    """
+    data: Dict = {
+        slug: [record.to_dict() for record in records]
+        for slug, records in index.items()
+    }
+    data["_version"] = index_version
+    data["_generated"] = int(time.time())
+    with file_path.open("w", encoding="utf-8") as f:
+        json.dump(data, f, indent=0)
@@ -0,0 +1,217 @@
+# Copyright (c) 2022 https://github.com/ping/
+#
+# This software is released under the GNU General Public License v3.0
+# https://opensource.org/licenses/GPL-3.0
+
+# Plans the order of recipe execution against the job time budget
+from dataclasses import dataclass
+from datetime import timedelta
+from math import ceil
+from typing import Callable, Dict, List, Optional
+
+import humanize  # type: ignore
+
+from _history import RecipeHistory
+from _recipe_utils import Recipe
+
+default_cache_estimate = 5  # seconds, estimate for restoring a recipe from cache
+timeout_headroom = 1.5  # adaptive timeout is the p95 duration multiplied by this
+timeout_min_samples = 3  # runs required before the adaptive timeout is used
+min_recipe_timeout = 60  # seconds, adaptive timeouts are never shorter than this
+
+
+@dataclass
+class PlannedRecipe:
+    """A recipe in the run plan"""
+
+    recipe: Recipe
+    execute: bool  # False if the recipe will be restored from cache
+    estimate: float  # estimated duration in seconds
+    start: float = 0  # predicted start, in seconds from the start of the run
+    deferred: bool = False  # True if the recipe was deferred to cache to fit the budget
+    reason: str = ""  # why the recipe is executed or restored from cache
+    download_size: Optional[int] = None  # estimated bytes to restore from cache
+
+    @property
+    def finish(self) -> float:
+        return self.start + self.estimate
+
+
+@dataclass
+class RunPlan:
+    """Execution plan for a run"""
+
+    recipes: List[PlannedRecipe]  # in execution order
+    budget: float = 0  # in seconds, 0 if unlimited
+
+    @property
+    def predicted_duration(self) -> float:
+        return max([p.finish for p in self.recipes], default=0)
+
+    @property
+    def deferred(self) -> List[PlannedRecipe]:
+        return [p for p in self.recipes if p.deferred]
+
+
+def estimate_duration(recipe: Recipe, history: RecipeHistory) -> float:
+    """
+    Estimate how long a recipe will take to execute. If there is no history,
+    the recipe timeout is used as the worst case.
+
+    :param recipe:
+    :param history:
+    :return:
+    """
+    estimate = history.estimate_duration(recipe.slug)
+    if estimate is None:
+        return float(recipe.timeout)
+    return estimate
+
+
+def adaptive_timeout(
+    recipe: Recipe, history: RecipeHistory, remaining: Optional[float] = None
+) -> int:
+    """
+    Timeout for a recipe based on its observed p95 duration plus headroom,
+    instead of the hand-tuned recipe timeout. Falls back to the recipe timeout
+    if there is not enough history.
+
+    :param recipe:
+    :param history:
+    :param remaining: Time left in the run budget in seconds, None if unlimited
+    :return:
+    """
+    timeout = recipe.timeout
+    p95 = history.percentile(recipe.slug, 95)
+    if p95 is not None and len(history.durations(recipe.slug)) >= timeout_min_samples:
+        timeout = max(min_recipe_timeout, ceil(p95 * timeout_headroom))
+    if remaining is not None:
+        # never run past the budget, unless it leaves too little time to do anything
+        timeout = max(min_recipe_timeout, min(timeout, int(remaining)))
+    return timeout
+
+
+def plan_run(
+    recipes: List[Recipe],
+    should_execute: Callable[[Recipe], bool],
+    can_defer: Callable[[Recipe], bool],
+    history: RecipeHistory,
+    max_workers: int = 1,
+    max_workers_per_group: int = 1,
+    budget: float = 0,
+) -> RunPlan:
+    """
+    Order recipes longest-first so that they pack well across the workers, and
+    simulate the run to predict when each executed recipe starts. Recipes that are predicted
+    to finish after the budget are deferred to cache where possible.
+    Recipes deferred in previous runs are planned first, so that the same recipes
+    are not deferred on every run while the others are executed.
+
+    :param recipes:
+    :param should_execute: Returns True if a recipe needs to be executed
+    :param can_defer: Returns True if a recipe can be restored from cache instead
+    :param history:
+    :param max_workers:
+    :param max_workers_per_group:
+    :param budget: Time available for executing recipes in seconds, 0 for unlimited
+    :return:
+    """
+    planned: List[PlannedRecipe] = []
+    deferred_runs: Dict[str, int] = {}
+    for recipe in recipes:
+        deferred_runs[recipe.slug] = history.deferred_runs(recipe.slug)
+        execute = should_execute(recipe)
+        planned.append(
+            PlannedRecipe(
+                recipe=recipe,
+                execute=execute,
+                estimate=estimate_duration(recipe, history)
+                if execute
+                else default_cache_estimate,
+            )
+        )
+    # sorted() is stable so recipes with the same estimate keep the configured order
+    planned = sorted(
+        planned,
+        key=lambda p: (deferred_runs[p.recipe.slug], p.estimate),
+        reverse=True,
+    )
+
+    workers_free_at = [0.0] * max(1, max_workers)
+    groups_free_at: Dict[str, List[float]] = {}
+    for p in planned:
+        if not p.execute:
+            # cache restores all start right away on their own threads,
+            # so they do not take up the recipe workers or concurrency groups
+            continue
+        group_free_at = groups_free_at.setdefault(
+            p.recipe.get_concurrency_group(), [0.0] * max(1, max_workers_per_group)
+        )
+        worker = workers_free_at.index(min(workers_free_at))
+        group_slot = group_free_at.index(min(group_free_at))
+        p.start = max(workers_free_at[worker], group_free_at[group_slot])
+        if budget and p.finish > budget and can_defer(p.recipe):
+            p.execute = False
+            p.deferred = True
+            p.estimate = default_cache_estimate
+            p.reason = "Over budget"
+            p.start = 0
+            continue
+        workers_free_at[worker] = p.finish
+        group_free_at[group_slot] = p.finish
+
+    return RunPlan(recipes=planned, budget=budget)
+
+
+def format_plan(plan: RunPlan, details: bool = False) -> str:
+    """
+    Markdown summary of the plan, for the job summary.
+
+    :param plan:
+    :param details: Include the reasons and download sizes
+    :return:
+    """
+    if details:
+        summary = "| Recipe | Plan | Reason | Estimate | Predicted Start | Download |\n"
+        summary += (
+            "| ------ | ---- | ------ | -------- | --------------- | -------- |\n"
+        )
+    else:
+        summary = "| Recipe | Plan | Estimate | Predicted Start |\n"
+        summary += "| ------ | ---- | -------- | --------------- |\n"
+    for p in plan.recipes:
+        if p.deferred:
+            action = ":hourglass: Deferred to cache"
+        elif p.execute:
+            action = "Execute"
+        else:
+            action = "Cache"
+        summary += (
+            f"| {p.recipe.name} | {action} | "
+            + (f"{p.reason} | " if details else "")
+            + f"{humanize.precisedelta(timedelta(seconds=p.estimate))} | "
+            f"{humanize.precisedelta(timedelta(seconds=p.start))} |"
+            + (
+                f" {humanize.naturalsize(p.download_size) if p.download_size is not None else ''} |"
+                if details
+                else ""
+            )
+            + "\n"
+        )
+    download_size = sum([p.download_size or 0 for p in plan.recipes])
+    summary += (
+        f"\nPredicted {humanize.precisedelta(timedelta(seconds=plan.predicted_duration))}"
+        + (
+            f" of the {humanize.precisedelta(timedelta(seconds=plan.budget))} budget"
+            if plan.budget
+            else ""
+        )
+        + (f", {len(plan.deferred)} deferred" if plan.deferred else "")
+        + (
+            f", {humanize.naturalsize(download_size)} to download from cache"
+            if details and download_size
+            else ""
+        )
+        + ".\n"
+    )
+    return summary
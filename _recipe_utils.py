@@ -6,7 +6,7 @@ import sys
 from calendar import monthrange
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
-from typing import Callable, Dict, List, Union
+from typing import Callable, Dict, List, Optional, Union
 
 # adapted from calibre.constants.iswindows
 _plat = sys.platform.lower()
@@ -78,12 +78,27 @@ class Recipe:
     recipe_datetime_format: str = (
         "%I:%M%p, %-d %b, %Y" if is_windows else "%-I:%M%p, %-d %b, %Y"
     )  # used to format a datetime in the recipe
+    concurrency_group: str = ""  # recipes in the same group, e.g. sharing a publisher login, are never executed concurrently, defaults to the slug
+    grayscale_images: int = 0  # convert article images to 8 or 4-bit grayscale for e-ink screens, 0 to keep colour
+    dither_images: bool = False  # dither 4-bit grayscale images
+    image_budget: int = (
+        0  # max total bytes of the article images in an issue, 0 for no limit
+    )
+    response_cache_ttl: Optional[int] = None  # seconds to reuse fetched pages for
 
     def is_enabled(self) -> bool:
         if callable(self.enable_on):
             return self.enable_on(self)
         return self.enable_on
 
+    def get_concurrency_group(self) -> str:
+        """
+        Group used to limit concurrent fetches to the same publisher,
+        e.g. "nytimes-global" and "nytimes-print" are both set to "nytimes".
+        Recipes without a group are only limited by themselves.
+        """
+        return self.concurrency_group or self.slug
+
 
 def sort_category(a: str, b: str, categories_sort: List[str]) -> int:
     try:
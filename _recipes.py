@@ -124,6 +124,7 @@ recipes: List[Recipe] = [
     Recipe(
         recipe="mit-tech-review",
         slug="mit-tech-review-feed",
+        concurrency_group="mit-tech-review",
         src_ext="mobi",
         target_ext=["epub"],
         category="Online Magazines",
@@ -137,6 +138,7 @@ recipes: List[Recipe] = [
     Recipe(
         recipe="mit-tech-review-magazine",
         slug="mit-tech-review-magazine",
+        concurrency_group="mit-tech-review",
         src_ext="mobi",
         target_ext=["epub"],
         category="Magazines",
@@ -178,6 +180,7 @@ recipes: List[Recipe] = [
     Recipe(
         recipe="nytimes-global",
         slug="nytimes-global",
+        concurrency_group="nytimes",
         src_ext="mobi",
         target_ext=["epub"],
         category="News",
@@ -193,6 +196,7 @@ recipes: List[Recipe] = [
     Recipe(
         recipe="nytimes-paper",
         slug="nytimes-print",
+        concurrency_group="nytimes",
         src_ext="mobi",
         target_ext=["epub"],
         category="News",
@@ -206,6 +210,7 @@ recipes: List[Recipe] = [
     Recipe(
         recipe="nytimes-books",
         slug="nytimes-books",
+        concurrency_group="nytimes",
         src_ext="mobi",
         target_ext=["epub"],
         category="Arts & Culture",
@@ -220,6 +225,7 @@ recipes: List[Recipe] = [
     Recipe(
         recipe="nytimes-magazine",
         slug="nytimes-magazine",
+        concurrency_group="nytimes",
         src_ext="mobi",
         target_ext=["epub"],
         category="Magazines",
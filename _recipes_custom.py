@@ -123,6 +123,7 @@ recipes: List[Recipe] = [
     Recipe(
         recipe="mit-tech-review",
         slug="mit-tech-review-feed",
+        concurrency_group="mit-tech-review",
         src_ext="mobi",
         target_ext=["epub"],
         category="Online Magazines",
@@ -136,6 +137,7 @@ recipes: List[Recipe] = [
     Recipe(
         recipe="mit-tech-review-magazine",
         slug="mit-tech-review-magazine",
+        concurrency_group="mit-tech-review",
         src_ext="mobi",
         target_ext=["epub"],
         category="Magazines",
@@ -177,6 +179,7 @@ recipes: List[Recipe] = [
     Recipe(
         recipe="nytimes-global",
         slug="nytimes-global",
+        concurrency_group="nytimes",
         src_ext="mobi",
         target_ext=["epub"],
         category="News",
@@ -192,6 +195,7 @@ recipes: List[Recipe] = [
     Recipe(
         recipe="nytimes-paper",
         slug="nytimes-print",
+        concurrency_group="nytimes",
         src_ext="mobi",
         target_ext=["epub"],
         category="News",
@@ -205,6 +209,7 @@ recipes: List[Recipe] = [
     Recipe(
         recipe="nytimes-books",
         slug="nytimes-books",
+        concurrency_group="nytimes",
         src_ext="mobi",
         target_ext=["epub"],
         category="Arts & Culture",
@@ -219,6 +224,7 @@ recipes: List[Recipe] = [
     Recipe(
         recipe="nytimes-magazine",
         slug="nytimes-magazine",
+        concurrency_group="nytimes",
         src_ext="mobi",
         target_ext=["epub"],
         category="Magazines",
@@ -2,20 +2,53 @@
 #
 # This software is released under the GNU General Public License v3.0
 # https://opensource.org/licenses/GPL-3.0
+import dataclasses
+import hashlib
+import io
+import json
 import logging
 import os.path
 import re
 import sys
 import textwrap
+import time
 import unicodedata
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 
-import requests
-from PIL import Image, ImageDraw, ImageFont  # type: ignore
+import requests  # type: ignore
+from PIL import Image, ImageDraw, ImageFilter, ImageFont, features  # type: ignore
 
+import _http
 from _recipe_utils import CoverOptions
 
+logo_cache_folder_name = "logos"
+cover_cache_folder_name = "covers"
+article_image_cache_folder_name = "images"
+cover_cache_version = 1  # increment when covers are rendered differently
+# covers extracted from books for the site, equivalent to the imagemagick
+# `convert -resize 1024x1024> -unsharp 0x.5 -strip -quality 70` and
+# `convert -thumbnail 500x500> -unsharp 0x.5 -quality 80`
+site_cover_size = (1024, 1024)
+site_cover_quality = 70
+# responsive variants of the thumbnail, the first size is the default thumbnail
+site_thumbnail_sizes = [(500, 500), (250, 250)]
+# image format: (file extension, media type, quality), in order of preference
+site_thumbnail_formats = {
+    "AVIF": ("avif", "image/avif", 55),
+    "WEBP": ("webp", "image/webp", 75),
+    "JPEG": ("jpg", "image/jpeg", 80),
+}
+default_calibre_title_re = re.compile(r"(.+)\s\[(.+?)\]", re.IGNORECASE)
+
+
+@dataclasses.dataclass
+class ImageVariant:
+    file_name: str
+    media_type: str
+    width: int
+    height: int
+
 
 class ExperimentalFunctionWarning(UserWarning):
     """Experimental features warning."""
@@ -87,203 +120,655 @@ def calc_resize(
     return None
 
 
-def generate_cover(
-    file_name: Path, title_text: str, cover_options: CoverOptions, logger=None
-):
+class LogoCache:
+    """
+    On-disk cache of cover logos, already resized for the cover.
+    Entries are revalidated with the server at most once every max_age seconds.
     """
-    Generate a plain image cover file
 
-    :param file_name: Filename to be saved as
-    :param title_text: Cover text
-    :param cover_options: Cover options
-    :param logger: Logger instance
-    :return:
+    def __init__(self, folder: Path, max_age: int = 24 * 60 * 60):
+        self.folder = folder
+        self.max_age = max_age
+
+    def get(
+        self,
+        url: str,
+        box: Tuple[int, int],
+        prepare: Callable[[Image.Image], Image.Image],
+    ) -> Image.Image:
+        """
+        Get a logo, downloading and preparing it if it is not cached or has changed.
+
+        :param url: Logo url
+        :param box: Max logo size, part of the cache key with the url
+        :param prepare: Converts a downloaded logo into the image to cache
+        :return:
+        """
+        key = hashlib.sha256(f"{url} {box[0]}x{box[1]}".encode("utf-8")).hexdigest()
+        image_path = self.folder.joinpath(f"{key}.png")
+        info_path = self.folder.joinpath(f"{key}.json")
+        info: Dict = {}
+        if image_path.exists():
+            try:
+                with info_path.open("r", encoding="utf-8") as f:
+                    info = json.load(f)
+            except (OSError, ValueError):
+                info = {}
+
+        if info and time.time() - info.get("checked", 0) < self.max_age:
+            return self._load(image_path)
+
+        headers = {}
+        if info.get("etag"):
+            headers["If-None-Match"] = info["etag"]
+        if info.get("last_modified"):
+            headers["If-Modified-Since"] = info["last_modified"]
+        try:
+            res = _http.get_client().get(url, headers=headers)
+        except requests.exceptions.RequestException:
+            if info:
+                # use the cached logo until it can be revalidated
+                return self._load(image_path)
+            raise
+
+        if res.status_code == 304 and info:
+            logo = self._load(image_path)
+        else:
+            with Image.open(io.BytesIO(res.content)) as downloaded_logo:
+                logo = prepare(downloaded_logo)
+            self.folder.mkdir(parents=True, exist_ok=True)
+            # write to a temp file first since covers are generated concurrently
+            temp_image_path = image_path.with_name(f"{key}.{os.getpid()}.png")
+            logo.save(temp_image_path, format="PNG")
+            os.replace(temp_image_path, image_path)
+            info = {
+                "url": url,
+                "etag": res.headers.get("ETag"),
+                "last_modified": res.headers.get("Last-Modified"),
+            }
+        info["checked"] = time.time()
+        temp_info_path = info_path.with_name(f"{key}.{os.getpid()}.json")
+        with temp_info_path.open("w", encoding="utf-8") as f:
+            json.dump(info, f)
+        os.replace(temp_info_path, info_path)
+        return logo
+
+    @staticmethod
+    def _load(image_path: Path) -> Image.Image:
+        with Image.open(image_path) as logo:
+            logo.load()
+            return logo.convert("RGBA")
+
+
+class CoverCache:
     """
+    On-disk cache of rendered covers, keyed by the cover text and options.
+    Entries that have not been used for max_age seconds are evicted.
+    """
+
+    def __init__(self, folder: Path, max_age: int = 7 * 24 * 60 * 60):
+        self.folder = folder
+        self.max_age = max_age
+
+    @staticmethod
+    def key(title_text: str, cover_options: CoverOptions, image_format: str) -> str:
+        return hashlib.sha256(
+            json.dumps(
+                [
+                    cover_cache_version,
+                    title_text,
+                    dataclasses.asdict(cover_options),
+                    image_format,
+                ],
+                sort_keys=True,
+            ).encode("utf-8")
+        ).hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        cover_path = self.folder.joinpath(key)
+        try:
+            with cover_path.open("rb") as f:
+                cover = f.read()
+            # mark as used
+            os.utime(cover_path)
+            return cover
+        except OSError:
+            return None
+
+    def put(self, key: str, cover: bytes) -> None:
+        self.folder.mkdir(parents=True, exist_ok=True)
+        # write to a temp file first since covers are generated concurrently
+        temp_cover_path = self.folder.joinpath(f"{key}.{os.getpid()}.tmp")
+        with temp_cover_path.open("wb") as f:
+            f.write(cover)
+        os.replace(temp_cover_path, self.folder.joinpath(key))
+
+    def evict(self) -> int:
+        """
+        Remove the entries not used within max_age.
+
+        :return: Number of entries removed
+        """
+        removed = 0
+        if not self.folder.exists():
+            return removed
+        for cover_path in self.folder.iterdir():
+            if time.time() - cover_path.stat().st_mtime > self.max_age:
+                cover_path.unlink()
+                removed += 1
+        return removed
+
+
+class ArticleImageCache:
+    """
+    Article images cached by the recipes, see recipes_shared.ImageCache.
+    The least recently used images are evicted to keep the cache within max_size bytes.
+    """
+
+    def __init__(self, folder: Path, max_size: int = 50 * 1024 * 1024):
+        self.folder = folder
+        self.max_size = max_size
+
+    def evict(self) -> int:
+        """
+        Remove the least recently used images until the cache is within max_size,
+        and the keys of the removed images.
+
+        :return: Number of images removed
+        """
+        removed = 0
+        images_folder = self.folder.joinpath("images")
+        keys_folder = self.folder.joinpath("keys")
+        if not images_folder.exists():
+            return removed
+        images: List[Tuple[float, int, Path]] = []
+        for image_path in images_folder.iterdir():
+            if image_path.suffix == ".tmp":
+                # left by an interrupted recipe
+                image_path.unlink()
+                continue
+            stat = image_path.stat()
+            images.append((stat.st_mtime, stat.st_size, image_path))
+        cache_size = sum([size for _, size, _ in images])
+        for _, size, image_path in sorted(images):
+            if cache_size <= self.max_size:
+                break
+            image_path.unlink()
+            cache_size -= size
+            removed += 1
+        if keys_folder.exists():
+            for key_path in keys_folder.iterdir():
+                if (
+                    key_path.suffix == ".tmp"
+                    or not images_folder.joinpath(
+                        key_path.read_text(encoding="utf-8").strip()
+                    ).exists()
+                ):
+                    key_path.unlink()
+        return removed
+
+
+class RecipeResponseCache:
+    """
+    HTTP responses cached by the recipes, see recipes/includes/response_cache.py.
+    Each recipe caches in its own sub folder, and an entry's mtime is when it expires.
+    The folder should not be published, e.g. uploaded with meta/.
+    Expired entries are evicted, and then the entries expiring soonest
+    to keep the cache within max_size bytes.
+    """
+
+    def __init__(self, folder: Path, max_size: int = 20 * 1024 * 1024):
+        self.folder = folder
+        self.max_size = max_size
+
+    def evict(self) -> int:
+        """
+        Remove the expired entries, and the entries expiring soonest until
+        the cache is within max_size.
+
+        :return: Number of entries removed
+        """
+        removed = 0
+        if not self.folder.exists():
+            return removed
+        responses: List[Tuple[float, int, Path]] = []
+        for response_path in self.folder.glob("*/*"):
+            stat = response_path.stat()
+            if response_path.suffix == ".tmp" or stat.st_mtime < time.time():
+                response_path.unlink()
+                removed += 1
+                continue
+            responses.append((stat.st_mtime, stat.st_size, response_path))
+        cache_size = sum([size for _, size, _ in responses])
+        for _, size, response_path in sorted(responses):
+            if cache_size <= self.max_size:
+                break
+            response_path.unlink()
+            cache_size -= size
+            removed += 1
+        return removed
+
+
+def _get_logger(logger=None) -> logging.Logger:
     if not logger:
         logger = logging.getLogger(__file__)
         ch = logging.StreamHandler(sys.stdout)
         ch.setLevel(logging.DEBUG)
         logger.addHandler(ch)
         logger.setLevel(logging.INFO)
+    return logger
 
-    font_title = ImageFont.truetype(
-        cover_options.title_font_path, cover_options.title_font_size
-    )
-    font_date = ImageFont.truetype(
-        cover_options.datestamp_font_path, cover_options.datestamp_font_size
-    )
 
-    default_calibre_title_re = re.compile(r"(.+)\s\[(.+?)\]", re.IGNORECASE)
-
-    title_texts = [t.strip() for t in title_text.split(":")]
-    if len(title_texts) == 1:
-        # not the expected newsrack-customised title
-        # try to parse default calibre title format
-        mobj = default_calibre_title_re.match(title_text)
-        if mobj:
-            title_texts = [str(t).strip() for t in mobj.groups()]
-
-    with Image.new(
-        "RGB",
-        (cover_options.cover_width, cover_options.cover_height),
-        color=cover_options.background_colour,
-    ) as img:
-        img_draw = ImageDraw.Draw(img)
-        # rectangle outline
-        if cover_options.border_width and cover_options.border_offset >= 0:
-            img_draw.rectangle(
-                (
-                    cover_options.border_offset,
-                    cover_options.border_offset,
-                    cover_options.cover_width - cover_options.border_offset,
-                    cover_options.cover_height - cover_options.border_offset,
-                ),
-                width=cover_options.border_width,
-                outline=cover_options.text_colour,
+class CoverRenderer:
+    """
+    Renders plain image covers. Fonts and text layouts are cached so that one
+    renderer should be reused for all the covers generated in a process.
+    """
+
+    def __init__(
+        self,
+        logo_cache: Optional[LogoCache] = None,
+        cover_cache: Optional[CoverCache] = None,
+    ):
+        """
+        :param logo_cache: Cache for downloaded logos
+        :param cover_cache: Cache for rendered covers
+        """
+        self.logo_cache = logo_cache
+        self.cover_cache = cover_cache
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._fonts: Dict[Tuple[str, int], ImageFont.FreeTypeFont] = {}
+        self._layouts: Dict[Tuple, Tuple[List[list], int]] = {}
+        # only used to measure text
+        self._draw = ImageDraw.Draw(Image.new("RGB", (1, 1)))
+
+    def font(self, font_path: str, font_size: int) -> ImageFont.FreeTypeFont:
+        key = (font_path, font_size)
+        if key not in self._fonts:
+            self._fonts[key] = ImageFont.truetype(font_path, font_size)
+        return self._fonts[key]
+
+    def _layout_lines(
+        self,
+        text: str,
+        font: ImageFont.FreeTypeFont,
+        font_size: int,
+        cover_options: CoverOptions,
+        is_title: bool,
+    ) -> Tuple[List[list], int]:
+        text_w_h = []
+        total_height = 0
+        max_chars_per_length = int(
+            1.5
+            * (
+                cover_options.cover_width
+                - 2 * (cover_options.border_offset + cover_options.border_width)
             )
+            / font_size
+        )
+        wrapper = textwrap.TextWrapper(width=max_chars_per_length)
+        word_list = wrapper.wrap(text=text)
+
+        for ii in word_list[:-1]:
+            _, __, text_w, text_h = self._draw.textbbox((0, 0), ii, font=font)
+            text_w_h.append([ii, text_w, text_h, text_h, font])
+            # textbbox() is typed as float but is whole pixels for FreeType fonts
+            total_height += int(text_h)
+
+        _, __, text_w, text_h = self._draw.textbbox((0, 0), word_list[-1], font=font)
+        line_gap = int(font_size / 4.0)
+        if is_title:
+            text_w_h.append([word_list[-1], text_w, text_h, text_h + line_gap, font])
+        else:
+            text_w_h.append([word_list[-1], text_w, text_h + line_gap, text_h, font])
+        total_height += int(text_h) + line_gap
+        return text_w_h, total_height
+
+    def layout(
+        self, title_text: str, cover_options: CoverOptions
+    ) -> Tuple[List[list], int]:
+        """
+        Wrap and measure the cover text.
+
+        :param title_text: Cover text
+        :param cover_options: Cover options
+        :return: list of [text, width, height, height offset, font] for each line,
+                 and the total height
+        """
+        key = (title_text, dataclasses.astuple(cover_options))
+        if key in self._layouts:
+            return self._layouts[key]
+
+        title_texts = [t.strip() for t in title_text.split(":")]
+        if len(title_texts) == 1:
+            # not the expected newsrack-customised title
+            # try to parse default calibre title format
+            mobj = default_calibre_title_re.match(title_text)
+            if mobj:
+                title_texts = [str(t).strip() for t in mobj.groups()]
 
         total_height = 0
-        text_w_h = []
+        text_w_h: List[list] = []
         for i, text in enumerate(title_texts):
             if i == 0 and cover_options.title_font_size:
-                max_chars_per_length = int(
-                    1.5
-                    * (
-                        cover_options.cover_width
-                        - 2 * (cover_options.border_offset + cover_options.border_width)
-                    )
-                    / cover_options.title_font_size
-                )
-                wrapper = textwrap.TextWrapper(width=max_chars_per_length)
-                word_list = wrapper.wrap(text=text)
-
-                for ii in word_list[:-1]:
-                    _, __, text_w, text_h = img_draw.textbbox(
-                        (0, 0), ii, font=font_title
-                    )
-                    text_w_h.append([ii, text_w, text_h, text_h, font_title])
-                    total_height += text_h
-
-                _, __, text_w, text_h = img_draw.textbbox(
-                    (0, 0), word_list[-1], font=font_title
+                lines, height = self._layout_lines(
+                    text,
+                    self.font(
+                        cover_options.title_font_path, cover_options.title_font_size
+                    ),
+                    cover_options.title_font_size,
+                    cover_options,
+                    is_title=True,
                 )
-                line_gap = int(cover_options.title_font_size / 4.0)
-                text_w_h.append(
-                    [word_list[-1], text_w, text_h, text_h + line_gap, font_title]
-                )
-                total_height += text_h + line_gap
             elif i > 0 and cover_options.datestamp_font_size:
                 # also support multi-lines for the date string to support long text,
                 # such as "Volume 12, Issue 4 January 2022"
-                max_chars_per_length = int(
-                    1.5
-                    * (
-                        cover_options.cover_width
-                        - 2 * (cover_options.border_offset + cover_options.border_width)
-                    )
-                    / cover_options.datestamp_font_size
+                lines, height = self._layout_lines(
+                    text,
+                    self.font(
+                        cover_options.datestamp_font_path,
+                        cover_options.datestamp_font_size,
+                    ),
+                    cover_options.datestamp_font_size,
+                    cover_options,
+                    is_title=False,
                 )
-                wrapper = textwrap.TextWrapper(width=max_chars_per_length)
-                word_list = wrapper.wrap(text=text)
+            else:
+                continue
+            text_w_h.extend(lines)
+            total_height += height
 
-                for ii in word_list[:-1]:
-                    _, __, text_w, text_h = img_draw.textbbox(
-                        (0, 0), ii, font=font_date
-                    )
-                    text_w_h.append([ii, text_w, text_h, text_h, font_date])
-                    total_height += text_h
+        self._layouts[key] = (text_w_h, total_height)
+        return text_w_h, total_height
+
+    def _paste_logo(
+        self,
+        img: Image.Image,
+        total_height: int,
+        cover_options: CoverOptions,
+        logger: logging.Logger,
+    ) -> bool:
+        try:
+            logo_buffer_gap_x = 0.05 * cover_options.cover_width
+            logo_buffer_gap_y = 0.05 * cover_options.cover_height
 
-                _, __, text_w, text_h = img_draw.textbbox(
-                    (0, 0), word_list[-1], font=font_date
+            logo_max_width = int(
+                cover_options.cover_width
+                - 2 * (cover_options.border_offset + cover_options.border_width)
+                - 2 * logo_buffer_gap_x  # buffer space
+            )
+            logo_max_height = int(
+                (
+                    cover_options.cover_height
+                    - total_height
+                    - 2 * (cover_options.border_offset + cover_options.border_width)
+                    - 2 * logo_buffer_gap_y  # buffer space
                 )
-                line_gap = int(cover_options.datestamp_font_size / 4.0)
-                text_w_h.append(
-                    [word_list[-1], text_w, text_h + line_gap, text_h, font_date]
+                / 2
+            )
+
+            def _fit_logo(source_logo: Image.Image) -> Image.Image:
+                logo = source_logo.convert("RGBA")
+                max_height = logo_max_height
+                if (logo.width / logo.height) >= 0.8:
+                    # close to square-ish, so we reduce the max height a little
+                    # so that there's a little more space above the text
+                    max_height = int(max_height * 0.9)
+
+                logo_new_size = calc_resize((logo_max_width, max_height), logo.size)
+                if logo_new_size:
+                    logger.debug(f"Resizing logo to {logo_new_size}")
+                    logo = logo.resize(logo_new_size)
+                return logo
+
+            if os.path.exists(cover_options.logo_path_or_url):
+                with Image.open(cover_options.logo_path_or_url) as source_logo:
+                    logo = _fit_logo(source_logo)
+            elif self.logo_cache:
+                logo = self.logo_cache.get(
+                    cover_options.logo_path_or_url,
+                    (logo_max_width, logo_max_height),
+                    _fit_logo,
                 )
-                total_height += text_h + line_gap
+            else:
+                res = _http.get_client().get(cover_options.logo_path_or_url, log=logger)
+                with Image.open(io.BytesIO(res.content)) as source_logo:
+                    logo = _fit_logo(source_logo)
 
-        if cover_options.logo_path_or_url:
-            try:
-                logo_buffer_gap_x = 0.05 * cover_options.cover_width
-                logo_buffer_gap_y = 0.05 * cover_options.cover_height
-
-                if os.path.exists(cover_options.logo_path_or_url):
-                    image_pointer = cover_options.logo_path_or_url
-                else:
-                    res = requests.get(
-                        cover_options.logo_path_or_url,
-                        headers={"User-Agent": "Mozilla/5.0"},
-                        timeout=60,
-                        stream=True,
-                    )
-                    res.raise_for_status()
-                    image_pointer = res.raw
-
-                with Image.open(image_pointer).convert("RGBA") as logo:
-                    logo_max_width = int(
-                        cover_options.cover_width
-                        - 2 * (cover_options.border_offset + cover_options.border_width)
-                        - 2 * logo_buffer_gap_x  # buffer space
-                    )
-                    logo_max_height = int(
-                        (
-                            cover_options.cover_height
-                            - total_height
-                            - 2
-                            * (cover_options.border_offset + cover_options.border_width)
-                            - 2 * logo_buffer_gap_y  # buffer space
-                        )
-                        / 2
-                    )
-                    if (logo.width / logo.height) >= 0.8:
-                        # close to square-ish, so we reduce the max height a little
-                        # so that there's a little more space above the text
-                        logo_max_height = int(logo_max_height * 0.9)
+            with logo:
+                background = Image.new(
+                    "RGBA", logo.size, cover_options.background_colour
+                )
+                logo_alpha_composite = Image.alpha_composite(background, logo)
+                logo_pos_x = int((cover_options.cover_width - logo.width) / 2)
+                logo_pos_y = int(
+                    cover_options.border_offset
+                    + cover_options.border_width
+                    + logo_buffer_gap_y
+                )
+                img.paste(logo_alpha_composite, (logo_pos_x, logo_pos_y))
+            return True
 
-                    logo_new_size = calc_resize(
-                        (logo_max_width, logo_max_height), logo.size
-                    )
-                    if logo_new_size:
-                        logger.debug(f"Resizing logo to {logo_new_size}")
-                        logo = logo.resize(logo_new_size)
+        except Exception:  # noqa, pylint: disable=broad-except
+            # fail gracefully since logo is not absolutely necessary
+            logger.exception(
+                "Error processing cover logo: %s", cover_options.logo_path_or_url
+            )
+            return False
 
-                    background = Image.new(
-                        "RGBA", logo.size, cover_options.background_colour
-                    )
-                    logo_alpha_composite = Image.alpha_composite(background, logo)
-                    logo_pos_x = int((cover_options.cover_width - logo.width) / 2)
-                    logo_pos_y = int(
-                        cover_options.border_offset
-                        + cover_options.border_width
-                        + logo_buffer_gap_y
-                    )
-                    img.paste(logo_alpha_composite, (logo_pos_x, logo_pos_y))
+    def render(
+        self,
+        title_text: str,
+        cover_options: CoverOptions,
+        image_format: str = "PNG",
+        logger=None,
+    ) -> bytes:
+        """
+        Render a plain image cover.
 
-            except Exception:  # noqa, pylint: disable=broad-except
-                # fail gracefully since logo is not absolutely necessary
-                logger.exception(
-                    "Error processing cover logo: %s", cover_options.logo_path_or_url
+        :param title_text: Cover text
+        :param cover_options: Cover options
+        :param image_format: PIL format of the image, e.g. PNG, JPEG
+        :param logger: Logger instance
+        :return: Encoded image
+        """
+        logger = _get_logger(logger)
+        cache_key = ""
+        if self.cover_cache:
+            cache_key = self.cover_cache.key(title_text, cover_options, image_format)
+            cover = self.cover_cache.get(cache_key)
+            if cover is not None:
+                logger.debug(f'Using cached cover for "{title_text}"')
+                self.cache_hits += 1
+                return cover
+            self.cache_misses += 1
+
+        text_w_h, total_height = self.layout(title_text, cover_options)
+        cacheable = True
+
+        with Image.new(
+            "RGB",
+            (cover_options.cover_width, cover_options.cover_height),
+            color=cover_options.background_colour,
+        ) as img:
+            img_draw = ImageDraw.Draw(img)
+            # rectangle outline
+            if cover_options.border_width and cover_options.border_offset >= 0:
+                img_draw.rectangle(
+                    (
+                        cover_options.border_offset,
+                        cover_options.border_offset,
+                        cover_options.cover_width - cover_options.border_offset,
+                        cover_options.cover_height - cover_options.border_offset,
+                    ),
+                    width=cover_options.border_width,
+                    outline=cover_options.text_colour,
                 )
 
-        text_start_pos_y = int(
-            (cover_options.cover_height - total_height) / 2
-            + cover_options.border_offset
-            + cover_options.border_width
-        )
-        if not cover_options.logo_path_or_url:
-            # we can bump up the text title a little to make it look better
-            text_start_pos_y -= int(cover_options.title_font_size / 2)
+            if cover_options.logo_path_or_url:
+                # do not cache a cover without its logo
+                cacheable = self._paste_logo(img, total_height, cover_options, logger)
 
-        cumu_offset = 0
-        for text, text_w, text_h, h_offset, font in text_w_h:
-            img_draw.text(
-                (
-                    int((cover_options.cover_width - text_w) / 2),
-                    text_start_pos_y + cumu_offset,
-                ),
-                text,
-                font=font,
-                fill=cover_options.text_colour,
+            text_start_pos_y = int(
+                (cover_options.cover_height - total_height) / 2
+                + cover_options.border_offset
+                + cover_options.border_width
             )
-            cumu_offset += h_offset
-        img.save(file_name)
+            if not cover_options.logo_path_or_url:
+                # we can bump up the text title a little to make it look better
+                text_start_pos_y -= int(cover_options.title_font_size / 2)
+
+            cumu_offset = 0
+            for text, text_w, text_h, h_offset, font in text_w_h:
+                img_draw.text(
+                    (
+                        int((cover_options.cover_width - text_w) / 2),
+                        text_start_pos_y + cumu_offset,
+                    ),
+                    text,
+                    font=font,
+                    fill=cover_options.text_colour,
+                )
+                cumu_offset += h_offset
+            output = io.BytesIO()
+            img.save(output, format=image_format)
+            cover = output.getvalue()
+        if self.cover_cache and cacheable:
+            self.cover_cache.put(cache_key, cover)
+        return cover
+
+
+_cover_renderer: Optional[CoverRenderer] = None
+
+
+def init_cover_renderer(
+    logo_cache: Optional[LogoCache] = None, cover_cache: Optional[CoverCache] = None
+) -> None:
+    """
+    Create the cover renderer for the current process, e.g. as a process pool initializer.
+
+    :param logo_cache:
+    :param cover_cache:
+    :return:
+    """
+    global _cover_renderer
+    _cover_renderer = CoverRenderer(logo_cache, cover_cache)
+
+
+def get_cover_renderer() -> CoverRenderer:
+    """
+    The cover renderer for the current process, created on first use.
+
+    :return:
+    """
+    if _cover_renderer is None:
+        init_cover_renderer()
+    return _cover_renderer  # type: ignore[return-value]
+
+
+def generate_cover(
+    file_name: Path,
+    title_text: str,
+    cover_options: CoverOptions,
+    logger=None,
+    logo_cache: Optional[LogoCache] = None,
+):
+    """
+    Generate a plain image cover file
+
+    :param file_name: Filename to be saved as
+    :param title_text: Cover text
+    :param cover_options: Cover options
+    :param logger: Logger instance
+    :param logo_cache: Cache for downloaded logos
+    :return:
+    """
+    cover = CoverRenderer(logo_cache).render(title_text, cover_options, logger=logger)
+    with open(file_name, "wb") as f:
+        f.write(cover)
+
+
+def _unsharp(img: Image.Image) -> Image.Image:
+    # imagemagick's -unsharp 0x.5 with its default gain of 1 and threshold of 0.05
+    return img.filter(ImageFilter.UnsharpMask(radius=0.5, percent=100, threshold=13))
+
+
+def _save_image(
+    img: Image.Image, file_path: Path, image_format: str, quality: int
+) -> None:
+    # metadata and colour profiles are not written, i.e. stripped
+    temp_file_path = file_path.with_name(f".{file_path.name}.tmp")
+    try:
+        img.save(temp_file_path, format=image_format, quality=quality)
+    except:  # noqa, pylint: disable=bare-except
+        temp_file_path.unlink(missing_ok=True)
+        raise
+    os.replace(temp_file_path, file_path)
+
+
+def get_thumbnail_formats() -> List[str]:
+    """
+    Image formats of the site thumbnails that this Pillow build can write.
+
+    :return:
+    """
+    supported_modules = features.get_supported_modules()
+    return [
+        image_format
+        for image_format in site_thumbnail_formats
+        if image_format == "JPEG" or image_format.lower() in supported_modules
+    ]
+
+
+def save_site_cover(
+    cover: bytes, cover_path: Path, thumbnail_path: Path
+) -> List[ImageVariant]:
+    """
+    Write the site cover and thumbnails for a book cover, decoding the image only once.
+    Thumbnails are written in each of site_thumbnail_sizes and supported formats,
+    e.g. book.thumb.webp and book.thumb-187w.webp for a book.thumb.jpg thumbnail.
+    The cover itself is only written as JPEG since it is linked to directly,
+    including from the OPDS catalog, where readers expect JPEG.
+    Images are only ever downsized.
+
+    :param cover: Encoded cover image
+    :param cover_path: JPEG file for the cover
+    :param thumbnail_path: JPEG file for the default thumbnail
+    :return: Thumbnails written, including the default thumbnail
+    """
+    thumbnails: List[ImageVariant] = []
+    with Image.open(io.BytesIO(cover)) as source:
+        img: Image.Image = source
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        img.thumbnail(site_cover_size, Image.Resampling.LANCZOS)
+        _save_image(_unsharp(img), cover_path, "JPEG", site_cover_quality)
+        widths = []
+        for i, size in enumerate(site_thumbnail_sizes):
+            # from the resized cover before it was sharpened, so it is sharpened once
+            thumbnail = img.copy()
+            thumbnail.thumbnail(size, Image.Resampling.LANCZOS)
+            if thumbnail.width in widths:
+                # cover is too small for this size
+                continue
+            widths.append(thumbnail.width)
+            thumbnail = _unsharp(thumbnail)
+            stem = (
+                thumbnail_path.stem
+                if not i
+                else f"{thumbnail_path.stem}-{thumbnail.width}w"
+            )
+            for image_format in get_thumbnail_formats():
+                ext, media_type, quality = site_thumbnail_formats[image_format]
+                file_path = thumbnail_path.with_name(f"{stem}.{ext}")
+                _save_image(thumbnail, file_path, image_format, quality)
+                thumbnails.append(
+                    ImageVariant(
+                        file_name=file_path.name,
+                        media_type=media_type,
+                        width=thumbnail.width,
+                        height=thumbnail.height,
+                    )
+                )
+    return thumbnails
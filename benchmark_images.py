@@ -0,0 +1,150 @@
+# Copyright (c) 2022 https://github.com/ping/
+#
+# This software is released under the GNU General Public License v3.0
+# https://opensource.org/licenses/GPL-3.0
+
+# Benchmark the build of an image-heavy issue with the article images compressed
+# in the fetch threads (image workers: 0) and in the recipes' process pool.
+# The issue is built from local files so that the network does not skew the results.
+# Usage: python3 benchmark_images.py --articles 20 --images 10 --workers 0 4
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from PIL import Image  # type: ignore
+
+BENCHMARK_RECIPE = """
+import os
+import sys
+
+sys.path.append(os.environ["recipes_includes"])
+from recipes_shared import BasicNewsrackRecipe
+
+from calibre.web.feeds.news import BasicNewsRecipe
+
+
+class ImageBenchmark(BasicNewsrackRecipe, BasicNewsRecipe):
+    title = "Image Benchmark"
+    simultaneous_downloads = 8
+    delay = 0
+
+    def parse_index(self):
+        fixture_folder = os.environ["benchmark_fixture_folder"]
+        articles = sorted(f for f in os.listdir(fixture_folder) if f.endswith(".html"))
+        return [
+            (
+                "Images",
+                [
+                    {
+                        "title": f"Article {i}",
+                        "url": "file://" + os.path.join(fixture_folder, article),
+                    }
+                    for i, article in enumerate(articles, start=1)
+                ],
+            )
+        ]
+"""
+
+
+def create_fixture(fixture_folder: Path, articles: int, images: int) -> None:
+    """
+    Write articles with large photo-like JPEGs that calibre has to compress.
+
+    :param fixture_folder:
+    :param articles:
+    :param images: Number of images per article
+    :return:
+    """
+    size = (2000, 1500)
+    gradient = Image.linear_gradient("L")
+    for a in range(articles):
+        body = ""
+        for i in range(images):
+            image_file_name = f"image-{a}-{i}.jpg"
+            Image.merge(
+                "RGB",
+                (
+                    Image.effect_noise(size, 20 + i),
+                    gradient.resize(size),
+                    gradient.rotate(90 * (a % 4)).resize(size),
+                ),
+            ).save(fixture_folder.joinpath(image_file_name), quality=95)
+            body += f'<p>Paragraph {i}</p><img src="{image_file_name}">'
+        with fixture_folder.joinpath(f"article-{a:03d}.html").open(
+            "w", encoding="utf-8"
+        ) as f:
+            f.write(
+                f"<html><head><title>Article {a}</title></head><body>{body}</body></html>"
+            )
+
+
+def build(recipe_path: Path, fixture_folder: Path, image_workers: int) -> float:
+    """
+    Build the benchmark issue.
+
+    :param recipe_path:
+    :param fixture_folder:
+    :param image_workers:
+    :return: Build time in seconds
+    """
+    env = dict(os.environ)
+    env["recipes_includes"] = str(Path("recipes/includes/").absolute())
+    env["benchmark_fixture_folder"] = str(fixture_folder)
+    env["newsrack_image_workers"] = str(image_workers)
+    # images must not be served from the cache
+    env.pop("newsrack_image_cache_folder", None)
+    output_path = recipe_path.with_suffix(".epub")
+    start_time = time.perf_counter()
+    subprocess.run(
+        ["ebook-convert", str(recipe_path), str(output_path)],
+        env=env,
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+    elapsed = time.perf_counter() - start_time
+    output_path.unlink()
+    return elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the build of an image-heavy issue."
+    )
+    parser.add_argument("--articles", type=int, default=20)
+    parser.add_argument("--images", type=int, default=10, help="Images per article")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        nargs="+",
+        default=[0, min(4, os.cpu_count() or 1)],
+        help="Image workers to compare, 0 to compress in the fetch threads",
+    )
+    parser.add_argument("--runs", type=int, default=2)
+    args = parser.parse_args()
+    if not shutil.which("ebook-convert"):
+        sys.exit("ebook-convert not found, calibre is required.")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        fixture_folder = Path(temp_dir, "fixture")
+        fixture_folder.mkdir()
+        create_fixture(fixture_folder, args.articles, args.images)
+        recipe_path = Path(temp_dir, "image_benchmark.recipe")
+        with recipe_path.open("w", encoding="utf-8") as f:
+            f.write(BENCHMARK_RECIPE)
+
+        print(f"{args.articles} articles, {args.articles * args.images} images")
+        print("| Image workers | Best | Mean |\n| ------------- | ---- | ---- |")
+        for image_workers in args.workers:
+            timings = [
+                build(recipe_path, fixture_folder, image_workers)
+                for _ in range(args.runs)
+            ]
+            print(
+                f"| {image_workers} | {min(timings):.1f}s "
+                f"| {sum(timings) / len(timings):.1f}s |"
+            )
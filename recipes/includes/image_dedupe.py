@@ -0,0 +1,92 @@
+from typing import Dict, Hashable, List, NamedTuple, Tuple
+
+hash_size = (9, 8)  # pixels of the image that the difference hash is made from
+thumbnail_size = (32, 32)  # pixels of the image that matches are confirmed with
+max_aspect_ratio_difference = 0.05
+# thumbnails of the same image resized or recompressed differ a little overall,
+# but different images, e.g. charts on a white background, differ a lot somewhere
+max_mean_pixel_difference = 3.0
+max_pixel_difference = 32
+
+
+class ImageSignature(NamedTuple):
+    bits: int  # 64-bit difference hash
+    width: int
+    height: int
+    thumbnail: bytes  # grayscale pixels of the image resized to thumbnail_size
+
+
+def difference_hash(pixels: bytes) -> int:
+    """
+    Perceptual (difference) hash of an image, which stays the same when the
+    image is resized or recompressed.
+
+    :param pixels: Grayscale pixels of the image resized to hash_size, row by row
+    :return: 64-bit hash
+    """
+    width, height = hash_size
+    bits = 0
+    for y in range(height):
+        row = pixels[y * width : (y + 1) * width]
+        for x in range(width - 1):
+            bits = (bits << 1) | (row[x] > row[x + 1])
+    return bits
+
+
+def is_same_image(
+    signature: ImageSignature, other: ImageSignature, max_distance: int
+) -> bool:
+    """
+    True if two images look the same. Images with close hashes are confirmed by
+    comparing their thumbnails since low-detail images, e.g. charts or maps, can
+    have close hashes without being the same.
+
+    :param signature:
+    :param other:
+    :param max_distance: Max differing bits of the hashes
+    :return:
+    """
+    if bin(signature.bits ^ other.bits).count("1") > max_distance:
+        return False
+    aspect_ratio = signature.width / max(1, signature.height)
+    other_aspect_ratio = other.width / max(1, other.height)
+    if (
+        abs(aspect_ratio - other_aspect_ratio)
+        > max_aspect_ratio_difference * aspect_ratio
+    ):
+        return False
+    if len(signature.thumbnail) != len(other.thumbnail) or not signature.thumbnail:
+        return False
+    differences = [abs(a - b) for a, b in zip(signature.thumbnail, other.thumbnail)]
+    return (
+        max(differences) <= max_pixel_difference
+        and sum(differences) / len(differences) <= max_mean_pixel_difference
+    )
+
+
+def find_duplicates(
+    signatures: List[Tuple[Hashable, ImageSignature]], max_distance: int
+) -> Dict[Hashable, Hashable]:
+    """
+    Find the images that look the same as another image.
+
+    :param signatures: (key, signature) of the images, the copy to keep first
+    :param max_distance: Max differing bits of the hashes
+    :return: Key of each duplicate image: key of the image kept
+    """
+    kept: List[Tuple[Hashable, ImageSignature]] = []
+    duplicates: Dict[Hashable, Hashable] = {}
+    for key, signature in signatures:
+        original = next(
+            (
+                kept_key
+                for kept_key, kept_signature in kept
+                if is_same_image(signature, kept_signature, max_distance)
+            ),
+            None,
+        )
+        if original is None:
+            kept.append((key, signature))
+        else:
+            duplicates[key] = original
+    return duplicates
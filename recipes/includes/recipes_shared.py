@@ -1,13 +1,18 @@
+import hashlib
 import json
+import multiprocessing
 import os
 import re
 import shutil
+import threading
 import time
 import warnings
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import closing
 from datetime import datetime, timedelta, timezone
 from html import unescape
-from typing import Optional, Dict, List, Callable
-from urllib.parse import urlencode
+from typing import Optional, Dict, List, Callable, Tuple
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
 
 from calibre import browser
 from calibre.constants import iswindows
@@ -16,6 +21,15 @@ from calibre.ptempfile import PersistentTemporaryDirectory, PersistentTemporaryF
 from calibre.utils.browser import Browser
 from calibre.web.feeds import Feed
 
+from image_dedupe import (
+    ImageSignature,
+    difference_hash,
+    find_duplicates,
+    hash_size,
+    thumbnail_size,
+)
+from response_cache import ResponseCache
+
 
 def get_date_format() -> str:
     try:
@@ -109,6 +123,384 @@ def extract_from_img_srcset(srcset: str, max_width=0):
     return parsed_sources[-1][0]
 
 
+def normalize_image_url(url: str) -> str:
+    """
+    Normalize an image url so that the same image is cached once,
+    e.g. regardless of the query parameters order.
+
+    :param url:
+    :return:
+    """
+    parts = urlsplit(url.strip())
+    return urlunsplit(
+        (
+            parts.scheme.lower(),
+            parts.netloc.lower(),
+            parts.path or "/",
+            urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True))),
+            "",
+        )
+    )
+
+
+class ImageCache(object):
+    """
+    Cache of downloaded and compressed article images shared by all recipes.
+    Images are stored by content in images/ so that the same image from different
+    urls is stored once, and keys/ maps each url and image options to an image.
+    The cache is created and evicted by newsrack, see _utils.ArticleImageCache.
+    """
+
+    # web2disk options that change the compressed image
+    image_options = (
+        "compress_news_images",
+        "compress_news_images_max_size",
+        "compress_news_images_auto_size",
+        "scale_news_images",
+    )
+
+    def __init__(self, folder: str, options: Dict):
+        self.images_folder = os.path.join(folder, "images")
+        self.keys_folder = os.path.join(folder, "keys")
+        self.options = options
+        self.hits = 0
+        self.bytes_saved = 0
+
+    @classmethod
+    def from_recipe(cls, recipe) -> Optional["ImageCache"]:
+        """
+        Image cache for the recipe's image options, if newsrack set up a cache folder.
+
+        :param recipe:
+        :return:
+        """
+        folder = os.environ.get("newsrack_image_cache_folder")
+        if not folder:
+            return None
+        return cls(
+            folder,
+            {
+                name: getattr(
+                    recipe.web2disk_options, name, getattr(recipe, name, None)
+                )
+                for name in cls.image_options
+            },
+        )
+
+    def key(self, url: str) -> str:
+        return hashlib.sha256(
+            json.dumps([normalize_image_url(url), self.options], sort_keys=True).encode(
+                "utf-8"
+            )
+        ).hexdigest()
+
+    def get(self, url: str) -> Optional[str]:
+        """
+        Path of the cached image for an image url.
+
+        :param url:
+        :return:
+        """
+        key_path = os.path.join(self.keys_folder, self.key(url))
+        try:
+            with open(key_path, "r", encoding="utf-8") as f:
+                image_path = os.path.join(self.images_folder, f.read().strip())
+            # mark as used
+            os.utime(image_path)
+            os.utime(key_path)
+            return image_path
+        except OSError:
+            return None
+
+    @staticmethod
+    def _write(file_path: str, data: bytes) -> None:
+        # write to a temp file first since recipes are executed concurrently
+        temp_file_path = f"{file_path}.{os.getpid()}.tmp"
+        with open(temp_file_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_file_path, file_path)
+
+    def put(self, url: str, image_path: str) -> None:
+        """
+        Cache an image downloaded by calibre.
+
+        :param url:
+        :param image_path: The compressed image
+        :return:
+        """
+        with open(image_path, "rb") as f:
+            data = f.read()
+        image_name = (
+            hashlib.sha256(data).hexdigest() + os.path.splitext(image_path)[1].lower()
+        )
+        os.makedirs(self.images_folder, exist_ok=True)
+        os.makedirs(self.keys_folder, exist_ok=True)
+        cached_image_path = os.path.join(self.images_folder, image_name)
+        if os.path.exists(cached_image_path):
+            os.utime(cached_image_path)
+        else:
+            self._write(cached_image_path, data)
+        self._write(
+            os.path.join(self.keys_folder, self.key(url)), image_name.encode("utf-8")
+        )
+
+    def wrap_url_processor(self, image_url_processor: Optional[Callable]) -> Callable:
+        """
+        Wrap a recipe's image_url_processor so that cached images are read
+        from the cache instead of being downloaded. calibre does not recompress
+        them as they are already within the compression limits.
+
+        :param image_url_processor:
+        :return:
+        """
+
+        def _image_url_processor(base_url, img_url):
+            if callable(image_url_processor):
+                img_url = image_url_processor(base_url, img_url)
+            url = urljoin(base_url, img_url)
+            if urlsplit(url).scheme not in ("http", "https"):
+                return img_url
+            image_path = self.get(url)
+            if not image_path:
+                return img_url
+            return "file://" + ("/" if iswindows else "") + image_path
+
+        return _image_url_processor
+
+    def update(self, image_map: Dict[str, str]) -> None:
+        """
+        Cache the images downloaded by calibre.
+
+        :param image_map: calibre's map of image url: downloaded image path
+        :return:
+        """
+        for url, image_path in image_map.items():
+            try:
+                if url.startswith("file:"):
+                    # served from the cache
+                    self.hits += 1
+                    self.bytes_saved += os.path.getsize(image_path)
+                elif urlsplit(url).scheme in ("http", "https"):
+                    self.put(url, image_path)
+            except OSError:
+                pass
+
+
+def _rescale_image_file(
+    image_path: str, scale_news_images, max_size, auto_size
+) -> Tuple[int, int]:
+    """
+    Compress a downloaded JPEG in place, as calibre does when fetching.
+    Executed in the ImageRescaler's process pool.
+
+    :param image_path:
+    :param scale_news_images:
+    :param max_size: compress_news_images_max_size
+    :param auto_size: compress_news_images_auto_size
+    :return: The image size before and after
+    """
+    from calibre.web.fetch.utils import rescale_image
+
+    with open(image_path, "rb") as f:
+        data = f.read()
+    try:
+        rescaled_data = rescale_image(data, scale_news_images, max_size, auto_size)
+    except Exception:  # noqa
+        # kept as is, like calibre does when an image cannot be compressed
+        return len(data), len(data)
+    if rescaled_data != data:
+        temp_image_path = f"{image_path}.tmp"
+        with open(temp_image_path, "wb") as f:
+            f.write(rescaled_data)
+        os.replace(temp_image_path, image_path)
+    return len(data), len(rescaled_data)
+
+
+def is_jpeg_path(image_path: str) -> bool:
+    # calibre saves JPEGs as .jpeg, or .jpg when served from the image cache
+    return os.path.splitext(image_path)[1].lower() in (".jpg", ".jpeg")
+
+
+class ImageRescaler(object):
+    """
+    Compress downloaded JPEGs in a process pool while the articles are still
+    being fetched, so that the decoding and encoding of images do not hold up
+    the fetch threads. The queue is bounded: when the workers fall behind,
+    the fetch threads wait for a free slot instead of queuing every image.
+    """
+
+    def __init__(self, options, max_workers: int, max_queued: int = 0):
+        """
+        :param options: calibre's web2disk options with the image options
+        :param max_workers:
+        :param max_queued: Images queued or being compressed, defaults to twice the workers
+        """
+        self.image_options = (
+            options.scale_news_images,
+            options.compress_news_images_max_size,
+            options.compress_news_images_auto_size,
+        )
+        # spawned instead of forked since calibre's process is multithreaded
+        self.executor = ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        self.slots = threading.BoundedSemaphore(max_queued or 2 * max_workers)
+        self.lock = threading.Lock()
+        # None if the image could not be queued to the pool
+        self.futures: Dict[str, Optional[Future]] = {}
+        self.start_time = time.time()
+
+    def submit(self, image_path: str) -> None:
+        """
+        Queue an image to be compressed, waiting if the queue is full.
+
+        :param image_path:
+        :return:
+        """
+        with self.lock:
+            if image_path in self.futures:
+                return
+            self.futures[image_path] = None
+        self.slots.acquire()
+        try:
+            future = self.executor.submit(
+                _rescale_image_file, image_path, *self.image_options
+            )
+        except Exception:  # noqa
+            # pool is broken, compressed in close() instead
+            self.slots.release()
+            return
+        future.add_done_callback(lambda _: self.slots.release())
+        with self.lock:
+            self.futures[image_path] = future
+
+    def close(self) -> Tuple[int, int, float]:
+        """
+        Wait for the queued images to be compressed. Images that the pool could not
+        compress, e.g. if the workers cannot be started, are compressed in this process.
+
+        :return: The total size of the images before and after, and the elapsed seconds
+        """
+        original_size = rescaled_size = 0
+        for image_path, future in self.futures.items():
+            try:
+                if future is None:
+                    raise RuntimeError(f"{image_path} was not queued")
+                before, after = future.result()
+            except Exception:  # noqa
+                before, after = _rescale_image_file(image_path, *self.image_options)
+            original_size += before
+            rescaled_size += after
+        self.executor.shutdown()
+        return original_size, rescaled_size, time.time() - self.start_time
+
+
+def grayscale_image(
+    data: bytes,
+    image_format: str,
+    max_size=None,
+    bits: int = 8,
+    dither: bool = False,
+    gamma: float = 1.0,
+) -> bytes:
+    """
+    Convert an image to grayscale for e-ink screens.
+
+    :param data: Encoded image
+    :param image_format: jpeg or png
+    :param max_size: tuple of (width, height) to downsize the image to
+    :param bits: 8 for 256 levels of grey, 4 for the 16 levels of e-ink screens
+    :param dither: Dither 4-bit images instead of rounding to the nearest level,
+                   only for lossless formats since JPEG compression blurs the dither
+    :param gamma: Below 1.0 lightens the midtones, which tend to render dark on e-ink
+    :return:
+    """
+    from calibre.utils.img import (
+        blend_image,
+        eink_dither_image,
+        image_from_data,
+        image_to_data,
+        resize_image,
+    )
+    from qt.core import QColor, QImage
+
+    img = image_from_data(data)
+    if img.hasAlphaChannel():
+        # flatten on white
+        img = blend_image(img)
+    max_width, max_height = max_size or (0, 0)
+    if (
+        max_width
+        and max_height
+        and (img.width() > max_width or img.height() > max_height)
+    ):
+        scale = min(max_width / img.width(), max_height / img.height())
+        img = resize_image(
+            img, max(1, int(img.width() * scale)), max(1, int(img.height() * scale))
+        )
+    img = img.convertToFormat(QImage.Format.Format_Grayscale8)
+
+    dither = dither and bits == 4 and image_format != "jpeg"
+    levels = [round(255 * (i / 255) ** gamma) for i in range(256)]
+    if bits == 4 and not dither:
+        levels = [round(level / 17) * 17 for level in levels]
+    if levels != list(range(256)):
+        # apply the levels to the raw pixels in one pass
+        pixels = img.constBits()
+        pixels.setsize(img.sizeInBytes())
+        raw = bytes(pixels).translate(bytes(levels))
+        img = QImage(
+            raw,
+            img.width(),
+            img.height(),
+            img.bytesPerLine(),
+            QImage.Format.Format_Grayscale8,
+        ).copy()
+    if dither:
+        img = eink_dither_image(img)
+    if bits == 4 and image_format == "png":
+        # written as a 4-bit PNG, the pixels are already on the 16 levels
+        img = img.convertToFormat(
+            QImage.Format.Format_Indexed8,
+            [QColor(level, level, level).rgb() for level in range(0, 256, 17)],
+        )
+    return image_to_data(img, compression_quality=80, fmt=image_format)
+
+
+def image_signature(data: bytes) -> ImageSignature:
+    """
+    Signature of an image to find the images that look the same, see image_dedupe.
+
+    :param data: Encoded image
+    :return:
+    """
+    from calibre.utils.img import blend_image, image_from_data, resize_image
+    from qt.core import QImage
+
+    img = image_from_data(data)
+    width, height = img.width(), img.height()
+    if img.hasAlphaChannel():
+        img = blend_image(img)
+    img = img.convertToFormat(QImage.Format.Format_Grayscale8)
+
+    def grayscale_pixels(size: Tuple[int, int]) -> bytes:
+        resized = resize_image(img, *size)
+        pixels = resized.constBits()
+        pixels.setsize(resized.sizeInBytes())
+        raw = bytes(pixels)
+        # rows are padded to bytesPerLine
+        return b"".join(
+            raw[y * resized.bytesPerLine() :][: size[0]] for y in range(size[1])
+        )
+
+    return ImageSignature(
+        bits=difference_hash(grayscale_pixels(hash_size)),
+        width=width,
+        height=height,
+        thumbnail=grayscale_pixels(thumbnail_size),
+    )
+
+
 class BasicNewsrackRecipe(object):
     encoding = "utf-8"
     remove_javascript = True
@@ -121,10 +513,32 @@ class BasicNewsrackRecipe(object):
     use_embedded_content = False
     remove_empty_feeds = True
 
+    # opt-in conversion of article images for e-ink screens, can also be set
+    # with grayscale_images and dither_images in the newsrack recipe config
+    grayscale_images = 0  # 8 or 4 bits of grey, 0 to keep the images in colour
+    dither_images = False  # dither 4-bit grayscale images, PNG only
+    grayscale_gamma = 1.0
+    # max total bytes of the article images in an issue, 0 for no limit, can also be
+    # set with image_budget in the newsrack recipe config
+    image_budget = 0
+    # replace near-identical article images, e.g. srcset variants, with a single copy
+    dedupe_images = False
+    dedupe_images_distance = 4  # max differing bits of the images' perceptual hashes
+    # processes that compress the article images as each article is fetched,
+    # 0 to compress them in the fetch threads as calibre does, can also be set with
+    # the newsrack_image_workers env var, e.g. to compare them with benchmark_images.py
+    image_workers = 0
+    # seconds that fetched feeds and index pages are reused for when the recipe is
+    # retried or rerun in the same build, not cached if the recipe logs in, 0 to not
+    # cache, can also be set with response_cache_ttl in the newsrack recipe config
+    response_cache_ttl = 30 * 60
+
     timeout = 20
     timefmt = ""  # suppress date output
     pub_date: Optional[datetime] = None  # custom publication date
     temp_dir: Optional[PersistentTemporaryDirectory] = None
+    image_rescaler: Optional[ImageRescaler] = None
+    response_cache: Optional[ResponseCache] = None
 
     def publication_date(self) -> Optional[datetime]:
         return self.pub_date
@@ -146,6 +560,319 @@ class BasicNewsrackRecipe(object):
         """
         return parse_date(date_string, tz_info, as_utc, **kwargs)
 
+    def get_image_workers(self) -> int:
+        """
+        Number of processes to compress images with, 0 if images are compressed
+        in the fetch threads.
+
+        :return:
+        """
+        image_workers = int(
+            os.environ.get("newsrack_image_workers", self.image_workers)
+        )
+        if not (
+            image_workers
+            and self.web2disk_options.compress_news_images  # type: ignore[attr-defined]
+        ):
+            return 0
+        try:
+            from calibre.web.fetch.utils import rescale_image  # noqa: F401
+        except ImportError:
+            return 0
+        return image_workers
+
+    def get_response_cache(self) -> Optional[ResponseCache]:
+        if self.response_cache is None:
+            self.response_cache = ResponseCache.from_recipe(self)
+        return self.response_cache
+
+    def index_to_soup(self, url_or_raw, *args, **kwargs):
+        response_cache = self.get_response_cache()
+        br = self.browser  # type: ignore[attr-defined]
+        if (
+            response_cache
+            and br is not self  # the recipe's own open_novisit is already cached
+            and isinstance(url_or_raw, str)
+            and re.match(r"https?://", url_or_raw)
+        ):
+            br = self.clone_browser(br)  # type: ignore[attr-defined]
+            with closing(
+                response_cache.open(
+                    getattr(br, "open_novisit", br.open),
+                    url_or_raw,
+                    timeout=self.timeout,
+                )
+            ) as f:
+                raw = f.read()
+            if not raw:
+                raise RuntimeError(f"Could not fetch index from {url_or_raw}")
+            url_or_raw = raw
+        return super().index_to_soup(url_or_raw, *args, **kwargs)  # type: ignore[misc]
+
+    def download(self):
+        image_cache = ImageCache.from_recipe(self)
+        if image_cache:
+            self.image_url_processor = image_cache.wrap_url_processor(
+                self.image_url_processor
+            )
+        image_workers = self.get_image_workers()
+        if image_workers:
+            self.image_rescaler = ImageRescaler(
+                self.web2disk_options, image_workers  # type: ignore[attr-defined]
+            )
+            # fetch without compressing, images are queued to the rescaler instead
+            self.web2disk_options.compress_news_images = False  # type: ignore[attr-defined]
+        compressed = not image_workers
+        try:
+            result = super().download()  # type: ignore[misc]
+            if self.image_rescaler:
+                self.rescale_downloaded_images(self.image_rescaler, image_workers)
+                compressed = True
+            return result
+        finally:
+            if self.image_rescaler:
+                self.web2disk_options.compress_news_images = True  # type: ignore[attr-defined]
+                self.image_rescaler.executor.shutdown(cancel_futures=True)
+                self.image_rescaler = None
+            if image_cache and compressed:
+                image_map = getattr(self, "image_map", {})
+                image_cache.update(image_map)
+                self.log(  # type: ignore[attr-defined]
+                    f"Image cache: {image_cache.hits} of {len(image_map)} images "
+                    f"reused, {image_cache.bytes_saved / 1024:.0f}KB not downloaded"
+                )
+            response_cache = self.get_response_cache()
+            if response_cache and response_cache.requests:
+                self.log(  # type: ignore[attr-defined]
+                    f"Response cache: {response_cache.hits} of "
+                    f"{response_cache.requests} requests served from the cache"
+                )
+
+    def _postprocess_html(self, soup, *args, **kwargs):
+        soup = super()._postprocess_html(soup, *args, **kwargs)  # type: ignore[misc]
+        if self.image_rescaler:
+            self.queue_article_images(self.image_rescaler, soup)
+        return soup
+
+    def queue_article_images(self, image_rescaler: ImageRescaler, soup) -> None:
+        """
+        Queue the JPEGs of a fetched article to be compressed. The article's images
+        are saved by now and its img src are still their absolute paths.
+
+        :param image_rescaler:
+        :param soup:
+        :return:
+        """
+        image_urls = {
+            image_path: url
+            for url, image_path in list(getattr(self, "image_map", {}).items())
+        }
+        for img in soup.find_all("img", src=True):
+            url = image_urls.get(img["src"])
+            # cached images are already compressed
+            if url and not url.startswith("file:") and is_jpeg_path(img["src"]):
+                image_rescaler.submit(img["src"])
+
+    def rescale_downloaded_images(
+        self, image_rescaler: ImageRescaler, image_workers: int
+    ) -> None:
+        # images of articles not seen by _postprocess_html, e.g. from skip_ad_pages
+        for url, image_path in list(getattr(self, "image_map", {}).items()):
+            if not url.startswith("file:") and is_jpeg_path(image_path):
+                image_rescaler.submit(image_path)
+        if not image_rescaler.futures:
+            return
+        original_size, rescaled_size, elapsed = image_rescaler.close()
+        self.log(  # type: ignore[attr-defined]
+            f"Compressed {len(image_rescaler.futures)} images in {image_workers} "
+            f"processes while fetching, {original_size / 1024:.0f}KB -> "
+            f"{rescaled_size / 1024:.0f}KB in {elapsed:.1f}s"
+        )
+
+    def postprocess_book(self, oeb, opts, log):
+        if self.dedupe_images:
+            self.dedupe_book_images(oeb, log)
+        grayscale_images = int(
+            os.environ.get("newsrack_grayscale_images") or self.grayscale_images
+        )
+        if grayscale_images:
+            self.grayscale_book_images(oeb, opts, log, grayscale_images)
+        image_budget = int(os.environ.get("newsrack_image_budget") or self.image_budget)
+        if image_budget:
+            self.apply_image_budget(oeb, log, image_budget)
+
+    def grayscale_book_images(self, oeb, opts, log, grayscale_images: int) -> None:
+        dither_images = bool(
+            os.environ.get("newsrack_dither_images") or self.dither_images
+        )
+        # keep the cover in colour, e.g. for the site listing
+        cover_id = str(oeb.metadata.cover[0]) if oeb.metadata.cover else ""
+        image_formats = {"image/jpeg": "jpeg", "image/png": "png"}
+        count = original_size = grayscale_size = 0
+        for item in list(oeb.manifest.items):
+            if item.media_type not in image_formats or item.id == cover_id:
+                continue
+            data = item.data
+            try:
+                grayscale_data = grayscale_image(
+                    data,
+                    image_formats[item.media_type],
+                    getattr(opts.output_profile, "screen_size", None),
+                    grayscale_images,
+                    dither_images,
+                    self.grayscale_gamma,
+                )
+            except Exception as err:  # noqa
+                log.warn(f"Unable to convert {item.href} to grayscale: {err}")
+                continue
+            count += 1
+            original_size += len(data)
+            if len(grayscale_data) < len(data):
+                item.data = grayscale_data
+                data = grayscale_data
+            grayscale_size += len(data)
+        log(
+            f"Grayscale images: {count} images, "
+            f"{original_size / 1024:.0f}KB -> {grayscale_size / 1024:.0f}KB"
+        )
+
+    @staticmethod
+    def get_article_images(oeb) -> Dict:
+        """
+        The JPEG/PNG images in the articles, in reading order. The first image
+        of an article is its lead image.
+
+        :param oeb:
+        :return: dict of image item: (is lead image, [(html item, img element)])
+        """
+        from calibre.ebooks.oeb.base import XPath, urlnormalize
+
+        images: Dict = {}
+        for html_item in oeb.spine:
+            if not hasattr(html_item.data, "xpath"):
+                continue
+            is_lead = True
+            for img in XPath("//h:img[@src]")(html_item.data):
+                image_item = oeb.manifest.hrefs.get(
+                    html_item.abshref(urlnormalize(img.get("src")))
+                )
+                if image_item is None or image_item.media_type not in (
+                    "image/jpeg",
+                    "image/png",
+                ):
+                    continue
+                image_is_lead, references = images.get(image_item, (False, []))
+                images[image_item] = (
+                    image_is_lead or is_lead,
+                    references + [(html_item, img)],
+                )
+                is_lead = False
+        return images
+
+    def dedupe_book_images(self, oeb, log) -> None:
+        """
+        Point the articles at a single copy of images that look the same, keeping
+        the largest copy, and remove the others from the book.
+
+        :param oeb:
+        :param log:
+        :return:
+        """
+        images = self.get_article_images(oeb)
+        cover_id = str(oeb.metadata.cover[0]) if oeb.metadata.cover else ""
+        signatures = []
+        for item in images:
+            if item.id == cover_id:
+                continue
+            try:
+                signatures.append((item, image_signature(item.data)))
+            except Exception as err:  # noqa
+                log.warn(f"Unable to hash {item.href}: {err}")
+
+        # keep the largest copy
+        signatures.sort(
+            key=lambda s: (s[1].width * s[1].height, len(s[0].data)), reverse=True
+        )
+        duplicates = find_duplicates(signatures, self.dedupe_images_distance)
+        removed_size = 0
+        for item, original in duplicates.items():
+            for html_item, img in images[item][1]:
+                img.set("src", html_item.relhref(original.href))
+            removed_size += len(item.data)
+            oeb.manifest.remove(item)
+        log(
+            f"Deduplicated images: {len(duplicates)} of {len(images)} images removed, "
+            f"{removed_size / 1024:.0f}KB saved"
+        )
+
+    @staticmethod
+    def _remove_element(element) -> None:
+        # keep the text that follows the element
+        parent = element.getparent()
+        previous = element.getprevious()
+        if element.tail:
+            if previous is not None:
+                previous.tail = (previous.tail or "") + element.tail
+            else:
+                parent.text = (parent.text or "") + element.tail
+        parent.remove(element)
+
+    def apply_image_budget(self, oeb, log, image_budget: int) -> None:
+        """
+        Keep the total size of the article images within the budget: first lower
+        the quality of the other images, then drop them, and only then lower the
+        quality of the lead images.
+
+        :param oeb:
+        :param log:
+        :param image_budget: bytes
+        :return:
+        """
+        from calibre.utils.img import image_from_data, image_to_data
+
+        images = self.get_article_images(oeb)
+        lead_images = [item for item, (is_lead, _) in images.items() if is_lead]
+        other_images = [item for item, (is_lead, _) in images.items() if not is_lead]
+        original_size = images_size = sum([len(item.data) for item in images])
+        dropped = 0
+        # (images, JPEG quality to lower to, or None to drop the images)
+        for budget_images, quality in [
+            (other_images, 60),
+            (other_images, 40),
+            (other_images, None),
+            (lead_images, 60),
+            (lead_images, 40),
+        ]:
+            for item in sorted(budget_images, key=lambda i: len(i.data), reverse=True):
+                if images_size <= image_budget:
+                    break
+                if quality is None:
+                    for _, img in images[item][1]:
+                        self._remove_element(img)
+                    images_size -= len(item.data)
+                    oeb.manifest.remove(item)
+                    dropped += 1
+                    continue
+                if item.media_type != "image/jpeg":
+                    continue
+                try:
+                    data = image_to_data(
+                        image_from_data(item.data),
+                        compression_quality=quality,
+                        fmt="jpeg",
+                    )
+                except Exception as err:  # noqa
+                    log.warn(f"Unable to compress {item.href}: {err}")
+                    continue
+                if len(data) < len(item.data):
+                    images_size -= len(item.data) - len(data)
+                    item.data = data
+        log(
+            f"Image budget: {len(images)} images, {original_size / 1024:.0f}KB -> "
+            f"{images_size / 1024:.0f}KB of {image_budget / 1024:.0f}KB, "
+            f"{dropped} images dropped"
+        )
+
     def cleanup(self) -> None:
         if self.temp_dir:
             self.log("Deleting temp files...")  # type: ignore[attr-defined]
@@ -304,6 +1031,12 @@ class BasicCookielessNewsrackRecipe(BasicNewsrackRecipe):
         return self.get_browser()
 
     def open_novisit(self, *args, **kwargs):
+        response_cache = self.get_response_cache()
+        if response_cache:
+            return response_cache.open(self._open_novisit, *args, **kwargs)
+        return self._open_novisit(*args, **kwargs)
+
+    def _open_novisit(self, *args, **kwargs):
         br = browser()
         if self.request_as_gbot:
             br.addheaders = [
@@ -0,0 +1,222 @@
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import threading
+import time
+from contextlib import closing
+from email.message import Message
+from typing import Callable, List, Optional
+from urllib.parse import urlsplit
+
+# feeds, index pages and articles, and the json apis that recipes parse
+cacheable_types = {
+    "text/html",
+    "application/xhtml+xml",
+    "application/json",
+    "text/xml",
+    "application/xml",
+    "application/rss+xml",
+    "application/atom+xml",
+}
+max_response_size = 2 * 1024 * 1024  # bytes, larger responses are not cached
+# not stored with the cached responses
+private_headers = {
+    "set-cookie",
+    "set-cookie2",
+    "cookie",
+    "authorization",
+    "proxy-authorization",
+    "www-authenticate",
+    "proxy-authenticate",
+}
+
+
+def is_cacheable_type(content_type: str) -> bool:
+    """
+    True if responses of the content type are cached, e.g. not images.
+
+    :param content_type: Content-Type header value
+    :return:
+    """
+    media_type = content_type.split(";")[0].strip().lower()
+    return media_type in cacheable_types or media_type.endswith(("+json", "+xml"))
+
+
+def get_max_age(cache_control: str) -> Optional[int]:
+    """
+    Max age of a response from its Cache-Control header.
+
+    :param cache_control:
+    :return: Seconds, 0 if the response must not be cached, None if not specified
+    """
+    directives = {}
+    for directive in cache_control.split(","):
+        name, _, value = directive.strip().partition("=")
+        directives[name.lower()] = value.strip('"')
+    if {"no-store", "no-cache", "private"} & set(directives):
+        return 0
+    try:
+        return max(0, int(directives["max-age"]))
+    except (KeyError, ValueError):
+        return None
+
+
+class CachedResponse(io.BytesIO):
+    """
+    Stand-in for a mechanize response, read from the response cache.
+    """
+
+    code = 200
+
+    def __init__(self, url: str, headers: List, data: bytes):
+        super().__init__(data)
+        self.url = url
+        self.headers = Message()
+        for name, value in headers:
+            self.headers[name] = value
+
+    def geturl(self) -> str:
+        return self.url
+
+    def info(self) -> Message:
+        return self.headers
+
+    def getcode(self) -> int:
+        return self.code
+
+
+class ResponseCache(object):
+    """
+    On-disk cache of the feeds, pages and json fetched by a recipe, so that a
+    retried or rerun recipe does not fetch them again. Other responses, e.g.
+    images, are not cached, and neither are the pages of a recipe that logs in.
+    Each entry's mtime is set to when it expires, which is within the recipe's
+    ttl and the response's Cache-Control max-age. Entries are evicted by newsrack,
+    see _utils.RecipeResponseCache.
+    """
+
+    def __init__(self, folder: str, ttl: int):
+        self.folder = folder
+        self.ttl = ttl
+        self.requests = 0  # requests for cacheable responses
+        self.hits = 0
+
+    @classmethod
+    def from_recipe(cls, recipe) -> Optional["ResponseCache"]:
+        """
+        Response cache for the recipe, if newsrack set up a cache folder.
+
+        :param recipe:
+        :return:
+        """
+        folder = os.environ.get("newsrack_response_cache_folder")
+        ttl = int(
+            os.environ.get("newsrack_response_cache_ttl") or recipe.response_cache_ttl
+        )
+        if not (folder and ttl > 0):
+            return None
+        if getattr(recipe, "username", None) or getattr(recipe, "password", None):
+            # pages fetched with a login can be subscriber-only or personalised
+            return None
+        return cls(folder, ttl)
+
+    def key(self, url: str) -> str:
+        return hashlib.sha256(url.strip().encode("utf-8")).hexdigest()
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        """
+        Cached response for a url, if it has not expired.
+
+        :param url:
+        :return:
+        """
+        response_path = os.path.join(self.folder, self.key(url))
+        try:
+            if os.stat(response_path).st_mtime < time.time():
+                return None
+            with open(response_path, "rb") as f:
+                meta = json.loads(f.readline())
+                data = f.read()
+        except (OSError, ValueError):
+            return None
+        return CachedResponse(meta["url"], meta["headers"], data)
+
+    def put(self, url: str, res):
+        """
+        Cache a response if its content type is cacheable. A cached response is
+        read and closed, so the returned response should be used instead.
+
+        :param url:
+        :param res: mechanize response
+        :return:
+        """
+        if not is_cacheable_type(res.info().get("Content-Type", "")):
+            return res
+        self.requests += 1
+        with closing(res):
+            data = res.read()
+            headers = list(res.info().items())
+            cached_res = CachedResponse(res.geturl(), headers, data)
+        max_age = get_max_age(cached_res.info().get("Cache-Control", ""))
+        ttl = self.ttl if max_age is None else min(self.ttl, max_age)
+        if (
+            (getattr(res, "code", None) or 200) != 200
+            or ttl <= 0
+            or len(data) > max_response_size
+        ):
+            return cached_res
+        meta = {
+            "url": res.geturl(),
+            # e.g. session cookies
+            "headers": [
+                (name, value)
+                for name, value in headers
+                if name.lower() not in private_headers
+            ],
+        }
+        os.makedirs(self.folder, exist_ok=True)
+        response_path = os.path.join(self.folder, self.key(url))
+        # write to a temp file first since articles are fetched concurrently
+        temp_response_path = (
+            f"{response_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        )
+        try:
+            with open(temp_response_path, "wb") as f:
+                f.write(json.dumps(meta).encode("utf-8") + b"\n")
+                f.write(data)
+            expires = time.time() + ttl
+            os.utime(temp_response_path, (expires, expires))
+            os.replace(temp_response_path, response_path)
+        except OSError:
+            pass
+        return cached_res
+
+    def open(self, open_func: Callable, url, *args, **kwargs):
+        """
+        Open a url with the cache. Only GET requests of http(s) urls are cached,
+        and urls of other content, e.g. images, skip the cache.
+
+        :param open_func: e.g. the browser's open_novisit
+        :param url:
+        :param args:
+        :param kwargs:
+        :return:
+        """
+        if (
+            args
+            or set(kwargs) - {"timeout"}
+            or not isinstance(url, str)
+            or urlsplit(url).scheme not in ("http", "https")
+        ):
+            return open_func(url, *args, **kwargs)
+        guessed_type, _ = mimetypes.guess_type(urlsplit(url).path)
+        if guessed_type and not is_cacheable_type(guessed_type):
+            return open_func(url, *args, **kwargs)
+        res = self.get(url)
+        if res is not None:
+            self.requests += 1
+            self.hits += 1
+            return res
+        return self.put(url, open_func(url, *args, **kwargs))
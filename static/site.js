@@ -192,11 +192,28 @@ https://opensource.org/licenses/GPL-3.0
         contents.classList.toggle("hide");   // content
         const publication_id = this.parentElement.dataset["pubId"];
         if (contents.childElementCount <= 0 && RECIPE_DESCRIPTIONS[publication_id] !== undefined) {
-            if (RECIPE_COVERS[publication_id] !== undefined) {
+            const cover = RECIPE_COVERS[publication_id];
+            if (cover !== undefined) {
+                // the cover is displayed at most 20rem wide, see p.cover img
+                const sizes = '(max-width: 20rem) 100vw, 20rem';
+                let sources = "";
+                let imgAttributes = "";
+                const coverSources = cover["sources"] || [];
+                for (let j = 0; j < coverSources.length; j++) {
+                    if (coverSources[j]["type"] === "image/jpeg") {
+                        imgAttributes += ' srcset="' + coverSources[j]["srcset"] + '" sizes="' + sizes + '"';
+                    } else {
+                        sources += '<source type="' + coverSources[j]["type"] + '" srcset="'
+                            + coverSources[j]["srcset"] + '" sizes="' + sizes + '">';
+                    }
+                }
+                if (cover["width"] !== undefined) {
+                    imgAttributes += ' width="' + cover["width"] + '" height="' + cover["height"] + '"';
+                }
                 contents.innerHTML = '<p class="cover">'
-                    + '<a href="' + RECIPE_COVERS[publication_id]["cover"] + '">'
-                    + '<img alt="Cover" src="'
-                    + RECIPE_COVERS[publication_id]["thumbnail"] + '"></a></p>';
+                    + '<a href="' + cover["cover"] + '"><picture>' + sources
+                    + '<img alt="Cover" src="' + cover["thumbnail"] + '"' + imgAttributes + '>'
+                    + '</picture></a></p>';
             }
             contents.innerHTML += RECIPE_DESCRIPTIONS[publication_id];
         }
@@ -1,2 +1,25 @@
 # flake8: noqa
 from .tests_recipe_utils import RecipeUtilsTests
+from .tests_planner import PlannerTests
+from .tests_history import HistoryTests
+from .tests_ebook_meta import EbookMetaTests
+from .tests_artifacts import ArtifactStoreTests
+from .tests_index import IndexTests
+from .tests_http import HttpClientTests
+from .tests_utils import (
+    LogoCacheTests,
+    CoverRendererTests,
+    SiteCoverTests,
+    ArticleImageCacheTests,
+    RecipeResponseCacheTests,
+)
+from .tests_generate import (
+    ScheduleRecipesTests,
+    HistoryEntryTests,
+    RecipeEnvTests,
+    PlanCacheTests,
+    DownloadFileTests,
+)
+from .tests_calibre import CalibreWorkerTests
+from .tests_response_cache import ResponseCacheTests
+from .tests_image_dedupe import ImageDedupeTests
@@ -0,0 +1,59 @@
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from _artifacts import ArtifactStore, hash_file
+
+
+class ArtifactStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.store = ArtifactStore(Path(self.temp_dir.name, "artifacts"), max_size=20)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _file(self, name: str, content: bytes) -> Path:
+        file_path = Path(self.temp_dir.name, name)
+        with file_path.open("wb") as f:
+            f.write(content)
+        return file_path
+
+    def test_add_and_restore(self):
+        book_path = self._file("a.mobi", b"0123456789")
+        digest = self.store.add(book_path)
+        self.assertEqual(digest, hash_file(book_path))
+        self.store.save()
+
+        store = ArtifactStore(self.store.folder).load()
+        target_path = Path(self.temp_dir.name, "restored.mobi")
+        self.assertTrue(store.restore(digest, target_path))
+        with target_path.open("rb") as f:
+            self.assertEqual(f.read(), b"0123456789")
+        self.assertFalse(store.restore("0" * 64, target_path))
+        self.assertEqual((store.hits, store.misses), (1, 1))
+
+    def test_corrupted(self):
+        book_path = self._file("a.mobi", b"0123456789")
+        digest = self.store.add(book_path)
+        # modified through the hardlink
+        with book_path.open("ab") as f:
+            f.write(b"!")
+        self.assertFalse(
+            self.store.restore(digest, Path(self.temp_dir.name, "restored.mobi"))
+        )
+        self.assertNotIn(digest, self.store.objects)
+
+    def test_evict_least_recently_used(self):
+        digests = []
+        for i in range(3):
+            digests.append(
+                self.store.add(self._file(f"{i}.mobi", f"{i}".encode() * 9 + b"!"))
+            )
+            time.sleep(0.01)
+        # use the oldest one so that the second one is evicted instead
+        self.store.restore(digests[0], Path(self.temp_dir.name, "restored.mobi"))
+        self.assertEqual(self.store.evict(), 1)
+        self.assertEqual(sorted(self.store.objects), sorted([digests[0], digests[2]]))
+        self.assertEqual(self.store.size, 20)
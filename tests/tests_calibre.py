@@ -0,0 +1,59 @@
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import _calibre
+from _calibre import CalibreWorker
+
+# stands in for calibre-debug executing the worker loop
+FAKE_WORKER = """
+import json
+import sys
+import time
+
+print(json.dumps({"ready": True}), flush=True)
+for line in sys.stdin:
+    cmd = json.loads(line)["cmd"]
+    if cmd[1] == "sleep":
+        time.sleep(float(cmd[2]))
+    print(json.dumps({"exit_code": 0, "output": " ".join(cmd)}), flush=True)
+"""
+
+
+class CalibreWorkerTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        worker_path = Path(self.temp_dir.name, "worker.py")
+        worker_path.write_text(FAKE_WORKER, encoding="utf-8")
+        self.worker = CalibreWorker([sys.executable, str(worker_path)])
+
+    def tearDown(self):
+        self.worker.stop()
+        self.temp_dir.cleanup()
+
+    def test_reused(self):
+        for i in range(3):
+            response = self.worker.execute(["ebook-meta", str(i)], timeout=10)
+            self.assertEqual(response, {"exit_code": 0, "output": f"ebook-meta {i}"})
+        self.assertEqual(self.worker.starts, 1)
+        self.assertGreater(self.worker.startup_saved, 0)
+
+    def test_timeout(self):
+        with self.assertRaises(subprocess.TimeoutExpired):
+            self.worker.execute(["ebook-convert", "sleep", "10"], timeout=0.5)
+        self.assertIsNone(self.worker.proc)
+        # the killed worker does not affect its replacement
+        for i in range(3):
+            response = self.worker.execute(["ebook-meta", str(i)], timeout=10)
+            self.assertEqual(response["output"], f"ebook-meta {i}")
+        self.assertEqual(self.worker.starts, 2)
+
+    def test_recycle(self):
+        with patch.object(_calibre, "max_jobs_per_worker", 2):
+            for i in range(5):
+                response = self.worker.execute(["ebook-meta", str(i)], timeout=10)
+                self.assertEqual(response["output"], f"ebook-meta {i}")
+        self.assertEqual(self.worker.starts, 3)
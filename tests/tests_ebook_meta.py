@@ -0,0 +1,180 @@
+import io
+import struct
+import tempfile
+import unittest
+import zipfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+from PIL import Image  # type: ignore
+
+from _ebook_meta import UnsupportedBook, read_cover, read_metadata, write_metadata
+
+COMMENTS = "Articles in this issue:\n\nA1\n\nA2\n\nSome description"
+
+CONTAINER_XML = """<?xml version="1.0"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+   <rootfiles>
+      <rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>
+   </rootfiles>
+</container>"""
+
+CONTENT_OPF = f"""<?xml version='1.0' encoding='utf-8'?>
+<package xmlns="http://www.idpf.org/2007/opf" version="2.0" unique-identifier="uuid_id">
+  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:opf="http://www.idpf.org/2007/opf">
+    <dc:title>The Economist: 18 Oct, 2026</dc:title>
+    <dc:publisher>calibre</dc:publisher>
+    <dc:date>2026-10-18T03:00:00+00:00</dc:date>
+    <dc:description>{COMMENTS}</dc:description>
+    <meta name="cover" content="cover"/>
+  </metadata>
+  <manifest>
+    <item id="cover" href="images/cover%20image.jpg" media-type="image/jpeg"/>
+  </manifest>
+</package>"""
+
+
+def _image(size=(60, 80), image_format="JPEG") -> bytes:
+    output = io.BytesIO()
+    Image.new("RGB", size, (255, 0, 0)).save(output, format=image_format)
+    return output.getvalue()
+
+
+def _exth(records) -> bytes:
+    exth = b"".join([struct.pack(">II", t, len(v) + 8) + v for t, v in records])
+    exth = struct.pack(">4sII", b"EXTH", len(exth) + 12, len(records)) + exth
+    return exth + b"\0" * ((4 - len(exth) % 4) % 4)
+
+
+def _mobi(title: bytes, records, images) -> bytes:
+    mobi_header_length = 232
+    exth = _exth(records)
+    record0 = bytearray(16 + mobi_header_length)
+    record0[16:20] = b"MOBI"
+    struct.pack_into(">I", record0, 20, mobi_header_length)
+    struct.pack_into(">I", record0, 28, 65001)
+    struct.pack_into(">II", record0, 84, len(record0) + len(exth), len(title))
+    struct.pack_into(">I", record0, 108, 1)  # first image index
+    struct.pack_into(">I", record0, 128, 0x40)
+    sections = [bytes(record0) + exth + title + b"\0\0"] + images
+    header = bytearray(78)
+    header[60:68] = b"BOOKMOBI"
+    struct.pack_into(">H", header, 76, len(sections))
+    offset = 78 + len(sections) * 8 + 2
+    section_list = b""
+    for i, section in enumerate(sections):
+        section_list += struct.pack(">II", offset, i * 2)
+        offset += len(section)
+    return bytes(header) + section_list + b"\0\0" + b"".join(sections)
+
+
+class EbookMetaTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cover_path = Path(self.temp_dir.name, "cover.png")
+        with self.cover_path.open("wb") as f:
+            f.write(_image((600, 800), "PNG"))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_epub(self):
+        book_path = Path(self.temp_dir.name, "book.epub")
+        with zipfile.ZipFile(book_path, "w") as book:
+            book.writestr("mimetype", "application/epub+zip")
+            book.writestr(
+                "META-INF/container.xml",
+                CONTAINER_XML,
+                compress_type=zipfile.ZIP_DEFLATED,
+            )
+            book.writestr(
+                "OEBPS/content.opf", CONTENT_OPF, compress_type=zipfile.ZIP_DEFLATED
+            )
+            book.writestr("OEBPS/images/cover image.jpg", _image())
+
+        metadata = read_metadata(book_path)
+        self.assertEqual(metadata.title, "The Economist: 18 Oct, 2026")
+        self.assertEqual(
+            metadata.published, datetime(2026, 10, 18, 3, tzinfo=timezone.utc)
+        )
+        self.assertEqual(metadata.comments, COMMENTS)
+        self.assertEqual(read_cover(book_path), _image())
+
+        write_metadata(
+            book_path, "The Economist", 2026291, "https://example.com", self.cover_path
+        )
+        metadata = read_metadata(book_path)
+        self.assertEqual(metadata.title, "The Economist: 18 Oct, 2026")
+        self.assertEqual(metadata.publisher, "https://example.com")
+        self.assertEqual(metadata.series, "The Economist")
+        self.assertEqual(metadata.series_index, 2026291)
+        with zipfile.ZipFile(book_path) as book:
+            self.assertEqual(book.infolist()[0].filename, "mimetype")
+            self.assertEqual(book.infolist()[0].compress_type, zipfile.ZIP_STORED)
+            with Image.open(
+                io.BytesIO(book.read("OEBPS/images/cover image.jpg"))
+            ) as img:
+                self.assertEqual(img.format, "JPEG")
+                self.assertEqual(img.size, (600, 800))
+
+    def test_mobi(self):
+        book_path = Path(self.temp_dir.name, "book.mobi")
+        other_image = _image((10, 10))
+        with book_path.open("wb") as f:
+            f.write(
+                _mobi(
+                    b"The Economist",
+                    [
+                        (101, b"calibre"),
+                        (103, COMMENTS.encode("utf-8")),
+                        (106, b"2026-10-18T03:00:00+00:00"),
+                        (201, struct.pack(">I", 0)),
+                        (202, struct.pack(">I", 1)),
+                    ],
+                    [_image(), _image(), other_image],
+                )
+            )
+
+        metadata = read_metadata(book_path)
+        self.assertEqual(metadata.title, "The Economist")
+        self.assertEqual(
+            metadata.published, datetime(2026, 10, 18, 3, tzinfo=timezone.utc)
+        )
+        self.assertEqual(metadata.comments, COMMENTS)
+        self.assertEqual(metadata.publisher, "calibre")
+        self.assertEqual(read_cover(book_path), _image())
+
+        write_metadata(
+            book_path, "The Economist", 2026291, "https://example.com", self.cover_path
+        )
+        metadata = read_metadata(book_path)
+        # full name is after the EXTH header so it has moved
+        self.assertEqual(metadata.title, "The Economist")
+        self.assertEqual(metadata.publisher, "https://example.com")
+        self.assertEqual(metadata.comments, COMMENTS)
+
+        with book_path.open("rb") as f:
+            data = f.read()
+        offsets = [struct.unpack_from(">I", data, 78 + i * 8)[0] for i in range(4)]
+        offsets.append(len(data))
+        with Image.open(io.BytesIO(data[offsets[1] : offsets[2]])) as img:
+            self.assertEqual(img.size, (600, 800))
+        with Image.open(io.BytesIO(data[offsets[2] : offsets[3]])) as img:
+            self.assertEqual(img.size, (180, 240))
+        self.assertEqual(data[offsets[3] : offsets[4]], other_image)
+
+        # JPEG covers are used as is
+        cover = _image((600, 800))
+        write_metadata(book_path, cover=cover)
+        with book_path.open("rb") as f:
+            data = f.read()
+        offsets = [struct.unpack_from(">I", data, 78 + i * 8)[0] for i in range(3)]
+        self.assertEqual(data[offsets[1] : offsets[2]], cover)
+
+    def test_unsupported(self):
+        book_path = Path(self.temp_dir.name, "book.pdf")
+        book_path.touch()
+        with self.assertRaises(UnsupportedBook):
+            read_metadata(book_path)
+        with self.assertRaises(UnsupportedBook):
+            read_cover(book_path)
@@ -0,0 +1,253 @@
+import hashlib
+import http.server
+import re
+import tempfile
+import threading
+import time
+import unittest
+from datetime import timedelta
+from pathlib import Path
+from typing import Dict, List
+
+from _generate import (
+    IncompleteDownload,
+    RecipeFetchResult,
+    _download_file,
+    _get_history_entry,
+    _get_part_file_path,
+    _get_recipe_env,
+    _load_plan_cache,
+    _schedule_recipes,
+    meta_folder,
+)
+from _http import HttpClient
+from _index import BookRecord, write_index
+from _recipe_utils import Recipe
+
+BOOK = bytes(range(256)) * 40
+
+
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+    supports_range = True
+    ranges_requested: List[str] = []
+
+    def do_GET(self):
+        requested_range = self.headers.get("Range", "")
+        self.ranges_requested.append(requested_range)
+        match = re.match(r"bytes=(\d+)-", requested_range)
+        start = int(match.group(1)) if match and self.supports_range else 0
+        if start >= len(BOOK):
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{len(BOOK)}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = BOOK[start:]
+        self.send_response(206 if start else 200)
+        if start:
+            self.send_header(
+                "Content-Range", f"bytes {start}-{len(BOOK) - 1}/{len(BOOK)}"
+            )
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ScheduleRecipesTests(unittest.TestCase):
+    def test_schedule(self):
+        recipes = [
+            Recipe(recipe=slug, slug=slug, src_ext="epub", category="News", **kwargs)
+            for slug, kwargs in [
+                ("nytimes-global", {"concurrency_group": "nytimes"}),
+                ("nytimes-print", {"concurrency_group": "nytimes"}),
+                ("new-republic-magazine", {}),
+                ("newyorker", {}),
+                ("nytimes-books", {"concurrency_group": "nytimes"}),
+                ("wired", {}),
+            ]
+        ]
+        lock = threading.Lock()
+        running: Dict[str, int] = {}
+        max_running: Dict[str, int] = {}
+        completed: List[str] = []
+
+        def execute(recipe: Recipe) -> str:
+            group = recipe.get_concurrency_group()
+            with lock:
+                running[group] = running.get(group, 0) + 1
+                running["*"] = running.get("*", 0) + 1
+                for key in (group, "*"):
+                    max_running[key] = max(max_running.get(key, 0), running[key])
+            # earlier recipes take longer so that they complete out of order
+            time.sleep(0.05 * (len(recipes) - recipes.index(recipe)))
+            with lock:
+                running[group] -= 1
+                running["*"] -= 1
+            return recipe.slug
+
+        results = _schedule_recipes(recipes, execute, 3, completed.append)
+
+        self.assertEqual(results, [r.slug for r in recipes])
+        self.assertEqual(sorted(completed), sorted(results))
+        self.assertNotEqual(completed, results)
+        self.assertEqual(max_running["nytimes"], 1)
+        # not grouped by the slug prefix
+        self.assertEqual(max_running["*"], 3)
+        self.assertEqual(
+            [r.get_concurrency_group() for r in recipes[2:4]],
+            ["new-republic-magazine", "newyorker"],
+        )
+
+
+class HistoryEntryTests(unittest.TestCase):
+    def _fetch_result(self, **kwargs) -> RecipeFetchResult:
+        values = dict(
+            recipe=None,
+            status="",
+            duration=timedelta(seconds=250),
+            source_file=None,
+            exit_code=0,
+            last_run=1792296000.0,
+            log_output="",
+            recipe_exit_code=0,
+            timed_out=False,
+            retries=1,
+            cache_hit=False,
+            attempt_durations=[100.0, 140.0],
+        )
+        values.update(kwargs)
+        return RecipeFetchResult(**values)
+
+    def test_duration_of_successful_attempt(self):
+        entry = _get_history_entry(self._fetch_result(), "1")
+        # not the total of the attempts and the wait between them
+        self.assertEqual(entry["duration"], 140.0)
+        self.assertEqual(entry["attempts"], [100.0, 140.0])
+
+        entry = _get_history_entry(
+            self._fetch_result(attempt_durations=[60.0], retries=0), "1"
+        )
+        self.assertEqual(entry["duration"], 60.0)
+        self.assertNotIn("attempts", entry)
+
+    def test_duration_timed_out(self):
+        entry = _get_history_entry(
+            self._fetch_result(last_run=None, timed_out=True, recipe_exit_code=None),
+            "1",
+        )
+        # the retry's timeout was increased
+        self.assertEqual(entry["duration"], 100.0)
+        entry = _get_history_entry(
+            self._fetch_result(last_run=None, attempt_durations=[], cache_hit=True),
+            "1",
+        )
+        self.assertIsNone(entry["duration"])
+
+
+class RecipeEnvTests(unittest.TestCase):
+    def test_response_cache_folder(self):
+        recipe = Recipe(recipe="wsj", slug="wsj", src_ext="epub", category="News")
+        env = _get_recipe_env(recipe, False)
+        response_cache_folder = Path(env["newsrack_response_cache_folder"])
+        self.assertEqual(response_cache_folder.name, "wsj")
+        # meta/ is uploaded as an artifact
+        self.assertNotIn(meta_folder.absolute(), response_cache_folder.parents)
+
+        env = _get_recipe_env(recipe, False, has_account=True)
+        self.assertNotIn("newsrack_response_cache_folder", env)
+
+
+class PlanCacheTests(unittest.TestCase):
+    def test_local_index(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            index_path = Path(temp_dir, "index.json")
+            record = BookRecord(filename="wsj.epub", published=1792296000.0)
+            write_index({"wsj": [record]}, index_path)
+            # not fetched from the site
+            cached = _load_plan_cache(index_path, "http://127.0.0.1:1/")
+            self.assertEqual(cached["wsj"][0].filename, "wsj.epub")
+
+    def test_no_index(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            index_path = Path(temp_dir, "index.json")
+            self.assertEqual(_load_plan_cache(index_path), {})
+            start_time = time.time()
+            # nothing listening, not retried
+            self.assertEqual(_load_plan_cache(index_path, "http://127.0.0.1:1/"), {})
+            self.assertLess(time.time() - start_time, 1)
+
+
+class DownloadFileTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}/book.epub"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.file_path = Path(self.temp_dir.name, "book.epub")
+        self.part_file_path = _get_part_file_path(self.file_path)
+        self.record = BookRecord(
+            filename="book.epub",
+            published=1792296000.0,
+            size=len(BOOK),
+            sha256=hashlib.sha256(BOOK).hexdigest(),
+        )
+        RangeHandler.supports_range = True
+        RangeHandler.ranges_requested = []
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _download(self):
+        _download_file(HttpClient(backoff=0), self.url, self.file_path, self.record, 10)
+
+    def test_download(self):
+        self._download()
+        self.assertEqual(self.file_path.read_bytes(), BOOK)
+        self.assertFalse(self.part_file_path.exists())
+        self.assertEqual(RangeHandler.ranges_requested, [""])
+
+    def test_resume(self):
+        self.part_file_path.write_bytes(BOOK[:1000])
+        self._download()
+        self.assertEqual(self.file_path.read_bytes(), BOOK)
+        self.assertEqual(RangeHandler.ranges_requested, ["bytes=1000-"])
+
+    def test_already_downloaded(self):
+        # 416 Range Not Satisfiable
+        self.part_file_path.write_bytes(BOOK)
+        self._download()
+        self.assertEqual(self.file_path.read_bytes(), BOOK)
+        self.assertEqual(RangeHandler.ranges_requested, [f"bytes={len(BOOK)}-"])
+
+    def test_range_ignored(self):
+        RangeHandler.supports_range = False
+        self.part_file_path.write_bytes(b"x" * 1000)
+        self._download()
+        # started over instead of appending the whole file
+        self.assertEqual(self.file_path.read_bytes(), BOOK)
+
+    def test_incomplete(self):
+        self.record.size = len(BOOK) + 10
+        with self.assertRaises(IncompleteDownload):
+            self._download()
+        # kept to resume from
+        self.assertEqual(self.part_file_path.read_bytes(), BOOK)
+        self.assertFalse(self.file_path.exists())
+
+    def test_hash_mismatch(self):
+        self.record.sha256 = "0" * 64
+        with self.assertRaises(IncompleteDownload):
+            self._download()
+        self.assertFalse(self.part_file_path.exists())
+        self.assertFalse(self.file_path.exists())
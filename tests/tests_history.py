@@ -0,0 +1,66 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import _history
+from _history import RecipeHistory, percentile
+
+
+class HistoryTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.history = RecipeHistory(Path(self.temp_dir.name, "history.jsonl"))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_percentile(self):
+        self.assertIsNone(percentile([], 50))
+        self.assertEqual(percentile([5], 95), 5)
+        self.assertEqual(percentile([1, 2, 3, 4], 50), 2.5)
+        self.assertAlmostEqual(percentile(list(range(1, 101)), 95), 95.05)
+
+    def test_stats(self):
+        for duration in [10, 10, 10, 20, 20, 20]:
+            self.history.add("a", duration, exit_code=0, sizes={"mobi": 100})
+        self.history.add("a", cache_hit=True)
+        self.history.add("a", 30, exit_code=None, timed_out=True, retries=1)
+        stats = self.history.stats("a")
+        self.assertEqual(stats.runs, 7)
+        self.assertEqual(stats.p50, 20)
+        self.assertEqual(stats.failures, 1)
+        self.assertEqual(stats.cache_hits, 1)
+        self.assertEqual(stats.last_size, 100)
+        # recent 3 [20, 20, 30] vs previous 3 [10, 10, 20]
+        self.assertEqual(self.history.trend("a"), 2)
+        self.assertIsNone(self.history.stats("unknown").p50)
+
+    def test_conversion_percentile(self):
+        self.history.add("a", 10, conversions={"epub": 4})
+        self.history.add("a", 10, conversions={"epub": 6, "pdf": 20})
+        self.assertEqual(self.history.conversion_percentile("a", "epub", 50), 5)
+        self.assertEqual(self.history.conversion_percentile("a", "pdf", 95), 20)
+        self.assertIsNone(self.history.conversion_percentile("a", "azw3", 50))
+
+    def test_save_and_compact(self):
+        max_entries = _history.max_entries_per_recipe
+        try:
+            _history.max_entries_per_recipe = 3
+            for i in range(5):
+                self.history.add("a", i)
+                self.history.save()
+            self.history.add("b", 1)
+            self.history.save()
+            with self.history.file_path.open("r", encoding="utf-8") as f:
+                self.assertEqual(len(f.readlines()), 6)
+
+            for i in range(5, 8):
+                self.history.add("a", i)
+            self.history.save()
+            with self.history.file_path.open("r", encoding="utf-8") as f:
+                self.assertEqual(len(f.readlines()), 4)
+            history = RecipeHistory(self.history.file_path).load()
+            self.assertEqual(history.durations("a"), [5, 6, 7])
+            self.assertEqual(history.durations("b"), [1])
+        finally:
+            _history.max_entries_per_recipe = max_entries
@@ -0,0 +1,116 @@
+import gzip
+import http.server
+import os
+import threading
+import unittest
+from typing import Dict, List
+from unittest.mock import patch
+
+import requests  # type: ignore
+
+from _http import HttpClient, get_client, get_env_host_timeouts, set_client
+
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    # path: list of status codes to respond with, the last is repeated
+    statuses: Dict[str, List[int]] = {}
+    requests_count: Dict[str, int] = {}
+
+    def do_GET(self):
+        count = self.requests_count.get(self.path, 0)
+        self.requests_count[self.path] = count + 1
+        statuses = self.statuses.get(self.path, [404])
+        status = statuses[min(count, len(statuses) - 1)]
+        body = b"x" * 100
+        self.send_response(status)
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body)
+            self.send_header("Content-Encoding", "gzip")
+        if status == 503:
+            self.send_header("Retry-After", "0")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class HttpClientTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        StandInHandler.statuses = {}
+        StandInHandler.requests_count = {}
+        self.client = HttpClient(retry_attempts=2, backoff=0)
+
+    def test_get(self):
+        StandInHandler.statuses = {"/ok": [200]}
+        res = self.client.get(f"{self.url}/ok")
+        self.assertEqual(res.content, b"x" * 100)
+        self.assertEqual(res.headers["Content-Encoding"], "gzip")
+        self.assertEqual(len(self.client.metrics), 1)
+        self.assertEqual(self.client.metrics[0].status, 200)
+        self.assertEqual(self.client.metrics[0].size, 100)
+        self.assertEqual(self.client.metrics[0].host, "127.0.0.1")
+
+    def test_retry(self):
+        StandInHandler.statuses = {"/flaky": [503, 503, 200]}
+        res = self.client.get(f"{self.url}/flaky")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(
+            [(m.status, m.error) for m in self.client.metrics],
+            [(503, "HTTPError"), (503, "HTTPError"), (200, "")],
+        )
+
+        StandInHandler.statuses = {"/down": [503]}
+        with self.assertRaises(requests.exceptions.HTTPError):
+            self.client.get(f"{self.url}/down", retry_attempts=1)
+        self.assertEqual(StandInHandler.requests_count["/down"], 2)
+
+    def test_no_retry(self):
+        with self.assertRaises(requests.exceptions.HTTPError):
+            self.client.get(f"{self.url}/missing")
+        self.assertEqual(StandInHandler.requests_count["/missing"], 1)
+
+    def test_stream(self):
+        StandInHandler.statuses = {"/ok": [200]}
+        res = self.client.get(
+            f"{self.url}/ok", stream=True, headers={"Accept-Encoding": "identity"}
+        )
+        self.assertEqual(self.client.metrics[0].size, 0)
+        content = b"".join(self.client.iter_content(res, 10))
+        self.assertEqual(content, b"x" * 100)
+        self.assertEqual(self.client.metrics[0].size, 100)
+
+    def test_host_timeouts(self):
+        client = HttpClient(timeout=10, host_timeouts={"example.com": 60})
+        self.assertEqual(client.timeout_for("https://example.com/index.json"), 60)
+        self.assertEqual(client.timeout_for("https://example.net/index.json"), 10)
+
+        with patch.dict(
+            os.environ, {"http_timeouts": "Example.com=60, example.net=x,"}
+        ):
+            self.assertEqual(get_env_host_timeouts(), {"example.com": 60})
+
+    def test_summary(self):
+        StandInHandler.statuses = {"/ok": [200]}
+        self.client.get(f"{self.url}/ok")
+        with self.assertRaises(requests.exceptions.HTTPError):
+            self.client.get(f"{self.url}/missing")
+        summary = self.client.summary()
+        self.assertIn("| 127.0.0.1 | 2 | 1 | 200 Bytes |", summary)
+        self.assertEqual(HttpClient().summary(), "")
+
+    def test_set_client(self):
+        set_client(self.client)
+        self.assertIs(get_client(), self.client)
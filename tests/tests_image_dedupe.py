@@ -0,0 +1,108 @@
+import io
+import sys
+import unittest
+from pathlib import Path
+
+from PIL import Image, ImageDraw  # type: ignore
+
+# recipe includes are not a package, recipes add the folder to sys.path
+sys.path.append(str(Path(__file__).parent.parent.joinpath("recipes", "includes")))
+
+from image_dedupe import (  # noqa: E402
+    ImageSignature,
+    difference_hash,
+    find_duplicates,
+    hash_size,
+    is_same_image,
+    thumbnail_size,
+)
+
+CHART_POINTS = [(40, 400), (300, 300), (500, 350), (780, 100)]
+
+
+def chart(points, marker=False) -> Image.Image:
+    # low-detail image on a white background
+    img = Image.new("L", (800, 500), 255)
+    draw = ImageDraw.Draw(img)
+    draw.line([(40, 20), (40, 460), (780, 460)], fill=0, width=3)
+    draw.line(points, fill=0, width=4)
+    if marker:
+        draw.ellipse((480, 330, 520, 370), fill=0)
+    return img
+
+
+def variant(img: Image.Image, size, quality: int) -> Image.Image:
+    # e.g. a srcset variant
+    with io.BytesIO() as f:
+        img.resize(size, Image.Resampling.BILINEAR).save(f, "JPEG", quality=quality)
+        return Image.open(io.BytesIO(f.getvalue()))
+
+
+def signature(img: Image.Image) -> ImageSignature:
+    # same as recipes_shared.image_signature, with PIL instead of calibre
+    grayscale = img.convert("L")
+    return ImageSignature(
+        bits=difference_hash(
+            grayscale.resize(hash_size, Image.Resampling.LANCZOS).tobytes()
+        ),
+        width=img.width,
+        height=img.height,
+        thumbnail=grayscale.resize(thumbnail_size, Image.Resampling.LANCZOS).tobytes(),
+    )
+
+
+def distance(a: ImageSignature, b: ImageSignature) -> int:
+    return bin(a.bits ^ b.bits).count("1")
+
+
+class ImageDedupeTests(unittest.TestCase):
+    def test_difference_hash(self):
+        # brighter to the right: no pixel is brighter than its right neighbour
+        gradient = bytes(x * 28 for _ in range(8) for x in range(9))
+        self.assertEqual(difference_hash(gradient), 0)
+        self.assertEqual(difference_hash(gradient[::-1]), 2**64 - 1)
+        # the top row alone is reversed
+        self.assertEqual(difference_hash(gradient[:9][::-1] + gradient[9:]), 0xFF << 56)
+
+    def test_resized_and_recompressed(self):
+        original = chart(CHART_POINTS)
+        for size, quality in [((400, 250), 60), ((800, 500), 30), ((1600, 1000), 80)]:
+            self.assertTrue(
+                is_same_image(
+                    signature(original), signature(variant(original, size, quality)), 4
+                ),
+                size,
+            )
+
+    def test_near_miss(self):
+        original = signature(chart(CHART_POINTS))
+        for near_miss in [
+            chart([(40, 400), (300, 300), (500, 350), (780, 130)]),
+            chart([(40, 400), (300, 280), (500, 350), (780, 100)]),
+            chart(CHART_POINTS, marker=True),
+        ]:
+            near_miss_signature = signature(near_miss)
+            # the hashes alone would match
+            self.assertLessEqual(distance(original, near_miss_signature), 4)
+            self.assertFalse(is_same_image(original, near_miss_signature, 4))
+
+    def test_aspect_ratio(self):
+        original = chart(CHART_POINTS)
+        self.assertFalse(
+            is_same_image(
+                signature(original), signature(original.resize((800, 400))), 64
+            )
+        )
+
+    def test_find_duplicates(self):
+        original = chart(CHART_POINTS)
+        signatures = [
+            ("large", signature(variant(original, (1600, 1000), 80))),
+            ("near-miss", signature(chart(CHART_POINTS, marker=True))),
+            ("small", signature(variant(original, (400, 250), 60))),
+            ("medium", signature(original)),
+        ]
+        self.assertEqual(
+            find_duplicates(signatures, 4), {"small": "large", "medium": "large"}
+        )
+        self.assertEqual(find_duplicates([], 4), {})
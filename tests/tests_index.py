@@ -0,0 +1,62 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from _index import BookRecord, index_version, read_index, write_index
+
+
+class IndexTests(unittest.TestCase):
+    def test_read_version1(self):
+        index = read_index(
+            {
+                "wsj": [
+                    {"filename": "wsj-2026-10-18.mobi", "published": 1792296000.0},
+                    {"filename": "wsj-2026-10-18.epub", "published": 1792296000.0},
+                ],
+                "economist": [],
+                "_generated": 1792296000,
+            }
+        )
+        self.assertEqual(sorted(index), ["economist", "wsj"])
+        self.assertEqual(index["wsj"][0].filename, "wsj-2026-10-18.mobi")
+        self.assertEqual(index["wsj"][0].published, 1792296000.0)
+        self.assertIsNone(index["wsj"][0].sha256)
+        self.assertFalse(index["wsj"][0].complete)
+
+    def test_write_and_read(self):
+        record = BookRecord(
+            filename="wsj-2026-10-18.mobi",
+            published=1792296000.0,
+            size=10,
+            sha256="0" * 64,
+            title="WSJ",
+            description="<ul><li>A1</li></ul>",
+            articles=["A1"],
+            thumbnails=[
+                {
+                    "file_name": "wsj-2026-10-18.thumb.webp",
+                    "media_type": "image/webp",
+                    "width": 375,
+                    "height": 500,
+                }
+            ],
+            tags=["news"],
+        )
+        with tempfile.TemporaryDirectory() as temp_dir:
+            index_path = Path(temp_dir, "index.json")
+            write_index({"wsj": [record]}, index_path)
+            with index_path.open("r", encoding="utf-8") as f:
+                data = json.load(f)
+
+        self.assertEqual(data["_version"], index_version)
+        self.assertIn("_generated", data)
+        # unset values are not written
+        self.assertNotIn("cover", data["wsj"][0])
+        # readable by the original reader
+        self.assertEqual(data["wsj"][0]["filename"], "wsj-2026-10-18.mobi")
+        self.assertEqual(data["wsj"][0]["published"], 1792296000.0)
+
+        index = read_index(dict(data, wsj=data["wsj"] + [{"unknown": 1}]))
+        self.assertEqual(index, {"wsj": [record]})
+        self.assertTrue(index["wsj"][0].complete)
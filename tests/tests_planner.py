@@ -0,0 +1,171 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from _history import RecipeHistory
+from _planner import (
+    adaptive_timeout,
+    default_cache_estimate,
+    format_plan,
+    min_recipe_timeout,
+    plan_run,
+)
+from _recipe_utils import Recipe
+
+
+class PlannerTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.history = RecipeHistory(Path(self.temp_dir.name, "history.jsonl"))
+        self.recipes = [
+            Recipe(recipe="a", slug="a", src_ext="mobi", category="News", name="A"),
+            Recipe(recipe="b", slug="b", src_ext="mobi", category="News", name="B"),
+            Recipe(
+                recipe="nytimes-global",
+                slug="nytimes-global",
+                concurrency_group="nytimes",
+                src_ext="mobi",
+                category="News",
+                name="NYT",
+            ),
+            Recipe(
+                recipe="nytimes-paper",
+                slug="nytimes-print",
+                concurrency_group="nytimes",
+                src_ext="mobi",
+                category="News",
+                name="NYT Print",
+            ),
+        ]
+        for slug, duration in [
+            ("a", 10),
+            ("b", 60),
+            ("nytimes-global", 100),
+            ("nytimes-print", 50),
+        ]:
+            self.history.add(slug, duration)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_history_persistence(self):
+        self.history.save()
+        history = RecipeHistory(self.history.file_path).load()
+        self.assertEqual(history.durations("b"), [60])
+        self.assertEqual(history.estimate_duration("nytimes-global"), 100)
+        self.assertIsNone(history.estimate_duration("unknown"))
+
+    def test_longest_first(self):
+        plan = plan_run(
+            self.recipes,
+            should_execute=lambda _: True,
+            can_defer=lambda _: True,
+            history=self.history,
+            max_workers=2,
+        )
+        self.assertEqual(
+            [p.recipe.slug for p in plan.recipes],
+            ["nytimes-global", "b", "nytimes-print", "a"],
+        )
+        # nytimes-print cannot start until nytimes-global is done
+        self.assertEqual(plan.recipes[2].start, 100)
+        self.assertEqual(plan.predicted_duration, 150)
+        self.assertFalse(plan.deferred)
+
+    def test_unknown_recipe_uses_timeout(self):
+        recipe = Recipe(
+            recipe="c", slug="c", src_ext="mobi", category="News", timeout=300
+        )
+        plan = plan_run(
+            [recipe],
+            should_execute=lambda _: True,
+            can_defer=lambda _: True,
+            history=self.history,
+        )
+        self.assertEqual(plan.recipes[0].estimate, 300)
+
+    def test_defer_over_budget(self):
+        plan = plan_run(
+            self.recipes,
+            should_execute=lambda _: True,
+            can_defer=lambda r: r.slug != "a",
+            history=self.history,
+            max_workers=2,
+            budget=120,
+        )
+        self.assertEqual([p.recipe.slug for p in plan.deferred], ["nytimes-print"])
+        self.assertEqual(plan.deferred[0].estimate, default_cache_estimate)
+        self.assertLessEqual(plan.predicted_duration, 120)
+        self.assertEqual(plan.deferred[0].reason, "Over budget")
+        plan.deferred[0].download_size = 2000
+        summary = format_plan(plan, details=True)
+        self.assertIn("| Over budget |", summary)
+        self.assertIn("2.0 kB to download from cache", summary)
+
+    def test_deferred_recipe_is_planned_next(self):
+        plans = []
+        for _ in range(3):
+            plan = plan_run(
+                self.recipes,
+                should_execute=lambda _: True,
+                can_defer=lambda r: r.slug != "a",
+                history=self.history,
+                max_workers=2,
+                budget=120,
+            )
+            plans.append([p.recipe.slug for p in plan.deferred])
+            for p in plan.recipes:
+                if p.deferred:
+                    self.history.add(p.recipe.slug, cache_hit=True, deferred=True)
+                else:
+                    self.history.add(p.recipe.slug, p.estimate)
+        # the recipes in the same group take turns to be deferred
+        self.assertEqual(
+            plans, [["nytimes-print"], ["nytimes-global"], ["nytimes-print"]]
+        )
+        self.assertEqual(self.history.deferred_runs("nytimes-print"), 1)
+        self.assertEqual(self.history.deferred_runs("nytimes-global"), 0)
+
+    def test_cached_recipes(self):
+        plan = plan_run(
+            self.recipes,
+            should_execute=lambda r: r.slug == "a",
+            can_defer=lambda _: True,
+            history=self.history,
+        )
+        self.assertEqual(plan.recipes[0].recipe.slug, "a")
+        self.assertTrue(all(not p.execute for p in plan.recipes[1:]))
+
+    def test_cached_and_executed_recipes(self):
+        # deferred in the previous run, so planned first, but restored from cache
+        self.history.add("b", cache_hit=True, deferred=True)
+        plan = plan_run(
+            self.recipes,
+            should_execute=lambda r: r.slug in ("a", "nytimes-global"),
+            can_defer=lambda _: True,
+            history=self.history,
+            budget=110,
+        )
+        planned = {p.recipe.slug: p for p in plan.recipes}
+        # cache restores do not take up the worker or the nytimes group
+        self.assertFalse(plan.deferred)
+        self.assertEqual(planned["nytimes-global"].start, 0)
+        self.assertEqual(planned["a"].start, 100)
+        self.assertEqual([planned[s].start for s in ("b", "nytimes-print")], [0, 0])
+        self.assertEqual(plan.predicted_duration, 110)
+
+    def test_adaptive_timeout(self):
+        recipe = Recipe(
+            recipe="c", slug="c", src_ext="mobi", category="News", timeout=600
+        )
+        # not enough history
+        self.history.add("c", 100)
+        self.assertEqual(adaptive_timeout(recipe, self.history), 600)
+        self.history.add("c", 100)
+        self.history.add("c", 200)
+        self.assertEqual(adaptive_timeout(recipe, self.history), 285)
+        # bounded by the remaining budget
+        self.assertEqual(adaptive_timeout(recipe, self.history, remaining=120), 120)
+        self.assertEqual(
+            adaptive_timeout(recipe, self.history, remaining=-10), min_recipe_timeout
+        )
@@ -0,0 +1,174 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+from email.message import Message
+from pathlib import Path
+from unittest.mock import patch
+
+# recipe includes are not a package, recipes add the folder to sys.path
+sys.path.append(str(Path(__file__).parent.parent.joinpath("recipes", "includes")))
+
+from response_cache import (  # noqa: E402
+    ResponseCache,
+    get_max_age,
+    is_cacheable_type,
+)
+
+
+class FakeResponse(object):
+    def __init__(self, url: str, data: bytes, headers: dict, code: int = 200):
+        self.url = url
+        self.data = data
+        self.headers = Message()
+        for name, value in headers.items():
+            self.headers[name] = value
+        self.code = code
+        self.closed = False
+
+    def read(self) -> bytes:
+        return self.data
+
+    def geturl(self) -> str:
+        return self.url
+
+    def info(self) -> Message:
+        return self.headers
+
+    def close(self):
+        self.closed = True
+
+
+class ResponseCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(self.temp_dir.name, 600)
+        self.opened = []
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _open_func(self, headers: dict, code: int = 200):
+        def open_func(url, *args, **kwargs):
+            self.opened.append(url)
+            return FakeResponse(
+                url, f"<html>{url}</html>".encode("utf-8"), headers, code
+            )
+
+        return open_func
+
+    def test_get_max_age(self):
+        self.assertEqual(get_max_age("public, max-age=300"), 300)
+        self.assertEqual(get_max_age('max-age="60"'), 60)
+        self.assertEqual(get_max_age("max-age=-1"), 0)
+        self.assertEqual(get_max_age("no-store"), 0)
+        self.assertEqual(get_max_age("max-age=300, no-cache"), 0)
+        self.assertEqual(get_max_age("private, max-age=300"), 0)
+        self.assertIsNone(get_max_age("public"))
+        self.assertIsNone(get_max_age("max-age=soon"))
+        self.assertIsNone(get_max_age(""))
+
+    def test_is_cacheable_type(self):
+        for content_type in (
+            "text/html; charset=utf-8",
+            "application/json",
+            "application/rss+xml",
+            "application/vnd.api+json",
+        ):
+            self.assertTrue(is_cacheable_type(content_type), content_type)
+        for content_type in ("image/jpeg", "text/css", "application/javascript", ""):
+            self.assertFalse(is_cacheable_type(content_type), content_type)
+
+    def test_open(self):
+        url = "https://example.com/index.html"
+        open_func = self._open_func({"Content-Type": "text/html"})
+        with self.cache.open(open_func, url, timeout=30) as f:
+            self.assertEqual(f.read(), f"<html>{url}</html>".encode("utf-8"))
+        with self.cache.open(open_func, url, timeout=30) as f:
+            self.assertEqual(f.read(), f"<html>{url}</html>".encode("utf-8"))
+            self.assertEqual(f.geturl(), url)
+            self.assertEqual(f.info()["Content-Type"], "text/html")
+        self.assertEqual(self.opened, [url])
+        self.assertEqual((self.cache.requests, self.cache.hits), (2, 1))
+
+    def test_expiry(self):
+        url = "https://example.com/feed"
+        open_func = self._open_func(
+            {"Content-Type": "application/rss+xml", "Cache-Control": "max-age=60"}
+        )
+        self.cache.open(open_func, url)
+        # the entry's mtime is when it expires, within the max-age
+        response_path = Path(self.temp_dir.name, self.cache.key(url))
+        self.assertLessEqual(response_path.stat().st_mtime, time.time() + 60)
+        self.assertIsNotNone(self.cache.get(url))
+
+        expired = time.time() - 1
+        os.utime(response_path, (expired, expired))
+        self.assertIsNone(self.cache.get(url))
+        self.cache.open(open_func, url)
+        self.assertEqual(self.opened, [url, url])
+
+    def test_not_stored(self):
+        for url, headers, code in [
+            ("https://example.com/a", {"Content-Type": "image/jpeg"}, 200),
+            (
+                "https://example.com/b",
+                {"Content-Type": "text/html", "Cache-Control": "no-store"},
+                200,
+            ),
+            ("https://example.com/c", {"Content-Type": "text/html"}, 203),
+        ]:
+            self.cache.open(self._open_func(headers, code), url)
+            self.assertIsNone(self.cache.get(url), url)
+        self.assertEqual(os.listdir(self.temp_dir.name), [])
+
+    def test_private_headers_not_stored(self):
+        url = "https://example.com/index.html"
+        headers = {
+            "Content-Type": "text/html",
+            "Set-Cookie": "session=secret",
+            "WWW-Authenticate": "Basic",
+        }
+        res = self.cache.open(self._open_func(headers), url)
+        self.assertEqual(res.info()["Set-Cookie"], "session=secret")
+        response_path = Path(self.temp_dir.name, self.cache.key(url))
+        self.assertNotIn(b"secret", response_path.read_bytes())
+        self.assertEqual(
+            self.cache.get(url).info().items(), [("Content-Type", "text/html")]
+        )
+
+    def test_from_recipe(self):
+        class Recipe(object):
+            response_cache_ttl = 600
+            username = None
+            password = None
+
+        with patch.dict(
+            os.environ, {"newsrack_response_cache_folder": self.temp_dir.name}
+        ):
+            self.assertIsNotNone(ResponseCache.from_recipe(Recipe()))
+            recipe = Recipe()
+            recipe.username = "user"
+            recipe.password = "pass"
+            # pages fetched with a login are not cached
+            self.assertIsNone(ResponseCache.from_recipe(recipe))
+        with patch.dict(os.environ, {"newsrack_response_cache_folder": ""}):
+            self.assertIsNone(ResponseCache.from_recipe(Recipe()))
+
+    def test_not_cacheable_returned_as_is(self):
+        url = "https://example.com/a"
+        res = self.cache.open(self._open_func({"Content-Type": "image/png"}), url)
+        self.assertIsInstance(res, FakeResponse)
+        self.assertFalse(res.closed)
+        self.assertEqual(self.cache.requests, 0)
+
+    def test_bypassed(self):
+        open_func = self._open_func({"Content-Type": "text/html"})
+        self.cache.open(open_func, "https://example.com/a", data=b"q=1")
+        self.cache.open(open_func, "https://example.com/a", b"q=1")
+        # not looked up by the url of an image
+        self.cache.open(open_func, "https://example.com/image.jpg")
+        self.cache.open(open_func, "file:///tmp/index.html")
+        self.assertEqual(os.listdir(self.temp_dir.name), [])
+        self.assertEqual(self.cache.requests, 0)
@@ -0,0 +1,287 @@
+import http.server
+import io
+import os
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from typing import List, Tuple
+from unittest.mock import patch
+
+import requests  # type: ignore
+from PIL import Image  # type: ignore
+
+import _http
+import _utils
+from _http import HttpClient, set_client
+from _recipe_utils import CoverOptions
+from _utils import (
+    ArticleImageCache,
+    CoverCache,
+    CoverRenderer,
+    LogoCache,
+    RecipeResponseCache,
+    get_thumbnail_formats,
+    save_site_cover,
+)
+
+
+def _logo() -> bytes:
+    output = io.BytesIO()
+    Image.new("RGB", (400, 200), (255, 0, 0)).save(output, format="PNG")
+    return output.getvalue()
+
+
+class LogoHandler(http.server.BaseHTTPRequestHandler):
+    etag = '"v1"'
+    requests_received: List[str] = []
+
+    def do_GET(self):
+        self.requests_received.append(self.headers.get("If-None-Match", ""))
+        if self.headers.get("If-None-Match") == self.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = _logo()
+        self.send_response(200)
+        self.send_header("ETag", self.etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class LogoCacheTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), LogoHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}/logo.png"
+        set_client(HttpClient(backoff=0))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        LogoHandler.requests_received = []
+        self.prepared = 0
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _prepare(self, logo: Image.Image) -> Image.Image:
+        self.prepared += 1
+        return logo.convert("RGBA").resize((100, 50))
+
+    def test_cached(self):
+        logo_cache = LogoCache(Path(self.temp_dir.name))
+        logo = logo_cache.get(self.url, (100, 100), self._prepare)
+        self.assertEqual((logo.mode, logo.size), ("RGBA", (100, 50)))
+        logo = logo_cache.get(self.url, (100, 100), self._prepare)
+        self.assertEqual((logo.mode, logo.size), ("RGBA", (100, 50)))
+        self.assertEqual(LogoHandler.requests_received, [""])
+        self.assertEqual(self.prepared, 1)
+
+        # different size
+        logo_cache.get(self.url, (200, 200), self._prepare)
+        self.assertEqual(len(LogoHandler.requests_received), 2)
+        self.assertEqual(self.prepared, 2)
+
+    def test_host_timeout(self):
+        logo_cache = LogoCache(Path(self.temp_dir.name))
+        session_request = requests.Session.request
+        # a new client, as in a process pool worker
+        with patch.object(_http, "_client", None), patch.dict(
+            os.environ, {"http_timeouts": "127.0.0.1=7"}
+        ), patch.object(
+            requests.Session, "request", autospec=True, side_effect=session_request
+        ) as request:
+            logo_cache.get(self.url, (100, 100), self._prepare)
+        self.assertEqual(request.call_args.kwargs["timeout"], 7)
+
+    def test_revalidate(self):
+        logo_cache = LogoCache(Path(self.temp_dir.name), max_age=0)
+        logo_cache.get(self.url, (100, 100), self._prepare)
+        logo = logo_cache.get(self.url, (100, 100), self._prepare)
+        self.assertEqual(logo.size, (100, 50))
+        self.assertEqual(LogoHandler.requests_received, ["", '"v1"'])
+        self.assertEqual(self.prepared, 1)
+
+
+class CoverRendererTests(unittest.TestCase):
+    def test_render(self):
+        renderer = CoverRenderer()
+        cover_options = CoverOptions()
+        cover = renderer.render("The Economist: 18 Oct, 2026", cover_options)
+        with Image.open(io.BytesIO(cover)) as img:
+            self.assertEqual((img.format, img.size), ("PNG", (889, 1186)))
+        cover = renderer.render("The Economist: 18 Oct, 2026", cover_options, "JPEG")
+        with Image.open(io.BytesIO(cover)) as img:
+            self.assertEqual(img.format, "JPEG")
+
+        # fonts and layouts are reused
+        self.assertEqual(len(renderer._fonts), 2)
+        self.assertEqual(len(renderer._layouts), 1)
+        lines, total_height = renderer.layout(
+            "The Economist: 18 Oct, 2026", cover_options
+        )
+        self.assertEqual([line[0] for line in lines], ["The Economist", "18 Oct, 2026"])
+        self.assertGreater(total_height, 0)
+        renderer.layout("The Economist [Sun, 18 Oct 2026]", cover_options)
+        self.assertEqual(len(renderer._layouts), 2)
+        self.assertEqual(len(renderer._fonts), 2)
+
+    def test_cover_cache(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cover_cache = CoverCache(Path(temp_dir))
+            renderer = CoverRenderer(cover_cache=cover_cache)
+            cover = renderer.render("Guardian: 18 Oct, 2026", CoverOptions())
+            self.assertEqual((renderer.cache_hits, renderer.cache_misses), (0, 1))
+
+            renderer = CoverRenderer(cover_cache=cover_cache)
+            self.assertEqual(
+                renderer.render("Guardian: 18 Oct, 2026", CoverOptions()), cover
+            )
+            renderer.render("Guardian: 18 Oct, 2026", CoverOptions(border_width=1))
+            self.assertEqual((renderer.cache_hits, renderer.cache_misses), (1, 1))
+
+            self.assertEqual(cover_cache.evict(), 0)
+            self.assertEqual(CoverCache(Path(temp_dir), max_age=-1).evict(), 2)
+
+
+class SiteCoverTests(unittest.TestCase):
+    def test_save_site_cover(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cover_path = Path(temp_dir, "cover.jpg")
+            thumbnail_path = Path(temp_dir, "cover.thumb.jpg")
+            output = io.BytesIO()
+            Image.new("RGBA", (1200, 1600), (255, 0, 0, 255)).save(output, format="PNG")
+            thumbnails = save_site_cover(output.getvalue(), cover_path, thumbnail_path)
+            with Image.open(cover_path) as img:
+                self.assertEqual((img.format, img.size), ("JPEG", (768, 1024)))
+                self.assertNotIn("exif", img.info)
+            with Image.open(thumbnail_path) as img:
+                self.assertEqual((img.format, img.size), ("JPEG", (375, 500)))
+
+            image_formats = get_thumbnail_formats()
+            self.assertIn("JPEG", image_formats)
+            self.assertEqual(len(thumbnails), 2 * len(image_formats))
+            self.assertEqual(
+                [(t.file_name, t.width, t.height) for t in thumbnails][-1],
+                ("cover.thumb-187w.jpg", 187, 250),
+            )
+            for thumbnail in thumbnails:
+                with Image.open(Path(temp_dir, thumbnail.file_name)) as img:
+                    self.assertEqual(img.size, (thumbnail.width, thumbnail.height))
+                    self.assertEqual(Image.MIME[img.format], thumbnail.media_type)
+
+    def test_sharpened_once(self):
+        sharpened: List[Tuple] = []
+
+        def unsharp(img: Image.Image) -> Image.Image:
+            sharpened.append((img.size, img.getpixel((0, 0))))
+            return Image.new(img.mode, img.size, (0, 0, 255))
+
+        with tempfile.TemporaryDirectory() as temp_dir, patch.object(
+            _utils, "_unsharp", side_effect=unsharp
+        ):
+            output = io.BytesIO()
+            Image.new("RGB", (1200, 1600), (255, 0, 0)).save(output, format="PNG")
+            save_site_cover(
+                output.getvalue(),
+                Path(temp_dir, "cover.jpg"),
+                Path(temp_dir, "cover.thumb.jpg"),
+            )
+        # the thumbnails are made from the cover before it was sharpened
+        self.assertEqual(
+            sharpened,
+            [
+                ((768, 1024), (255, 0, 0)),
+                ((375, 500), (255, 0, 0)),
+                ((187, 250), (255, 0, 0)),
+            ],
+        )
+
+    def test_small_cover(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cover_path = Path(temp_dir, "cover.jpg")
+            thumbnail_path = Path(temp_dir, "cover.thumb.jpg")
+            output = io.BytesIO()
+            Image.new("RGB", (150, 200)).save(output, format="JPEG")
+            thumbnails = save_site_cover(output.getvalue(), cover_path, thumbnail_path)
+            # not enlarged, and no variant of the same size
+            with Image.open(cover_path) as img:
+                self.assertEqual(img.size, (150, 200))
+            self.assertEqual({(t.width, t.height) for t in thumbnails}, {(150, 200)})
+            self.assertEqual(
+                sorted(p.name for p in Path(temp_dir).iterdir()),
+                sorted(["cover.jpg"] + [t.file_name for t in thumbnails]),
+            )
+
+
+class ArticleImageCacheTests(unittest.TestCase):
+    def test_evict(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            images_folder = Path(temp_dir, "images")
+            keys_folder = Path(temp_dir, "keys")
+            images_folder.mkdir()
+            keys_folder.mkdir()
+            for i in range(3):
+                image_path = images_folder.joinpath(f"{i}.jpg")
+                image_path.write_bytes(b"x" * 100)
+                # least recently used first
+                os.utime(image_path, (1000 + i, 1000 + i))
+                keys_folder.joinpath(f"key{i}").write_text(f"{i}.jpg")
+            images_folder.joinpath("3.jpg.123.tmp").write_bytes(b"x")
+
+            self.assertEqual(ArticleImageCache(Path(temp_dir), 300).evict(), 0)
+            self.assertEqual(ArticleImageCache(Path(temp_dir), 250).evict(), 1)
+            self.assertEqual(
+                sorted(p.name for p in images_folder.iterdir()), ["1.jpg", "2.jpg"]
+            )
+            self.assertEqual(
+                sorted(p.name for p in keys_folder.iterdir()), ["key1", "key2"]
+            )
+            self.assertEqual(ArticleImageCache(Path(temp_dir), 0).evict(), 2)
+            self.assertEqual(list(keys_folder.iterdir()), [])
+            self.assertEqual(ArticleImageCache(Path(temp_dir, "missing")).evict(), 0)
+
+
+class RecipeResponseCacheTests(unittest.TestCase):
+    def test_evict(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            recipe_folder = Path(temp_dir, "wsj")
+            recipe_folder.mkdir()
+            now = time.time()
+            # mtime is when the entry expires
+            for key, expires in [("expired", now - 60), ("fresh", now + 600)]:
+                response_path = recipe_folder.joinpath(key)
+                response_path.write_bytes(b'{"url": "", "headers": []}\n')
+                os.utime(response_path, (expires, expires))
+            recipe_folder.joinpath("fresh.123.tmp").write_bytes(b"x")
+
+            self.assertEqual(RecipeResponseCache(Path(temp_dir)).evict(), 2)
+            self.assertEqual([p.name for p in recipe_folder.iterdir()], ["fresh"])
+            self.assertEqual(RecipeResponseCache(Path(temp_dir, "missing")).evict(), 0)
+
+    def test_evict_max_size(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            now = time.time()
+            for slug, key, expires in [
+                ("wsj", "later", now + 900),
+                ("wsj", "soonest", now + 300),
+                ("ft", "sooner", now + 600),
+            ]:
+                response_path = Path(temp_dir, slug, key)
+                response_path.parent.mkdir(exist_ok=True)
+                response_path.write_bytes(b"x" * 100)
+                os.utime(response_path, (expires, expires))
+
+            self.assertEqual(RecipeResponseCache(Path(temp_dir), 150).evict(), 2)
+            self.assertEqual([p.name for p in Path(temp_dir).glob("*/*")], ["later"])